@@ -1874,9 +1874,13 @@ async function refreshSignals() {
             return;
         }
 
-        // Progress Tracking (1d, 1w, 1mo) - 3 segments for swing
+        // Progress Tracking: stocks computed so far, then (1d, 1w, 1mo) - 3 segments for swing
         const tfs = (mode === 'swing') ? ['1d', '1w', '1mo'] : ['5m', '15m', '30m', '60m'];
         let progress = 0;
+        const chunkMatch = event.data.match(/(\d+)\/(\d+) stocks computed/);
+        if (chunkMatch && Number(chunkMatch[2]) > 0) {
+            progress = Math.min(99, Math.floor((Number(chunkMatch[1]) / Number(chunkMatch[2])) * 100));
+        }
         tfs.forEach((t, idx) => {
             if (event.data.includes(`${t} completed`)) {
                 progress = Math.floor(((idx + 1) / tfs.length) * 100);
@@ -2878,6 +2882,7 @@ function renderEnrichedChart(chartInput, symbol, opts, tfDisplay, overrides = {}
         const color = c.c >= c.o ? '#089981' : '#F23645';
         let ohlcText = `${c.t} | O:${c.o.toFixed(1)} H:${c.h.toFixed(1)} L:${c.l.toFixed(1)} C:<tspan fill="${color}">${c.c.toFixed(1)}</tspan>`;
         if (showRSI && c[rsiKey]) ohlcText += ` | RSI: <tspan fill="#A855F7">${c[rsiKey].toFixed(1)}</tspan>`;
+        if (c.rank !== undefined && c.rank !== null) ohlcText += ` | Rank: ${c.rank > 0 ? '+' : ''}${c.rank}`;
         chOhlc.innerHTML = ohlcText;
 
         const snapX = (idx * (barWidth + gap)) + (barWidth / 2) + 5;
@@ -3599,7 +3604,11 @@ const STRAT_ALIASES = {
     "PB": "PB",
     "ROE": "ROE",
     "High": "High",
-    "Low": "Low"
+    "Low": "Low",
+    "Support": "Support",
+    "Resistance": "Resistance",
+    "Pivot": "Pivot",
+    "POC": "POC"
 };
 
 const STRAT_KEYWORDS = [
@@ -3607,6 +3616,7 @@ const STRAT_KEYWORDS = [
     "Price", "RSI", "Trend", "SuperTrendValue", "Volume", "VolumeRatio",
     "EMA_Fast", "EMA_Slow", "EMA_Cross", "PE", "PB", "ROE",
     "High", "Low", "Pattern", "PatternScore", "Bullish", "Bearish",
+    "Support", "Resistance", "Pivot", "POC",
 
     // Timeframes
     "[5m]", "[15m]", "[30m]", "[1h]", "[Daily]", "[Weekly]", "[Monthly]",
@@ -4831,10 +4841,14 @@ function resolveLevelQuery(query, type, ltp, side, stock, tfDataMap) {
                 'RSI': 'rsi', 'PRICE': 'ltp', 'LTP': 'ltp',
                 'HIGH': 'prev_high', 'LOW': 'prev_low',
                 'PATTERNSCORE': 'pattern_score', 'PATTERN_SCORE': 'pattern_score',
-                'ROE': 'roe', 'PE': 'pe'
+                'ROE': 'roe', 'PE': 'pe',
+                'PIVOT': 'pp', 'SUPPORT': 'support', 'RESISTANCE': 'resistance'
             };
             const col = mappedInd[indicatorKey.toUpperCase()] || indicatorKey.toLowerCase();
-            baseValue = s[col] !== undefined && s[col] !== null ? s[col] : ltp;
+            // Pivots, previous range and VPVR levels come precomputed from the calc run (sr_levels)
+            let val = s[col];
+            if ((val === undefined || val === null) && s.sr_levels) val = s.sr_levels[col];
+            baseValue = val !== undefined && val !== null ? val : ltp;
         }
     }
 
@@ -5,7 +5,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from config import Config
-from indicator_engine import process_profile, get_enriched_chart_data
+from indicator_engine import process_timeframes, get_enriched_chart_data, preview_settings
+from settings_cache import settings_cache
+from universe_snapshot import universe
+from live_candle import live_sessions
+from storage import as_storage
+from compute_pool import get_executor, shutdown_pool
 from scenario_engine import run_scenario_backtest
 from chat_engine import chat_with_assistant
 from pydantic import BaseModel
@@ -68,6 +73,13 @@ async def startup_db_setup():
                 try: await cur.execute("ALTER TABLE app_sg_active_trades ADD COLUMN side VARCHAR(10) DEFAULT 'BUY'")
                 except: pass
 
+                # Return, support/resistance, rank history and cross-sectional feature columns of the signal board
+                for column in ("ret_pct DECIMAL(10, 4)", "sr_levels JSON", "support DECIMAL(10, 4)", "resistance DECIMAL(10, 4)", "rank_history JSON",
+                               "rsi_sector_pct DECIMAL(7, 2)", "ret_rank INT",
+                               "ret_group_pct DECIMAL(7, 2)", "beta DECIMAL(10, 4)", "rel_strength DECIMAL(10, 4)"):
+                    try: await cur.execute(f"ALTER TABLE app_sg_calculated_signals ADD COLUMN {column}")
+                    except: pass
+
                 # Global Settings Profile
                 await cur.execute("INSERT IGNORE INTO app_sg_profiles (profile_id) VALUES ('global')")
                 await cur.execute("INSERT IGNORE INTO app_sg_indicator_settings (profile_id, indicator_key, params_json) VALUES ('global', 'session', '{\"hours\": 24}')")
@@ -90,6 +102,86 @@ async def startup_db_setup():
                         UNIQUE KEY unique_log (isin, profile_id, timeframe, timestamp)
                     )
                 """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_settings_version (
+                        profile_id VARCHAR(20) PRIMARY KEY,
+                        version BIGINT NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_indicator_state (
+                        isin VARCHAR(20) NOT NULL,
+                        timeframe VARCHAR(10) NOT NULL,
+                        settings_hash CHAR(16) NOT NULL,
+                        last_bar_ts DATETIME NOT NULL,
+                        state_json MEDIUMTEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (isin, timeframe, settings_hash)
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_node_memo (
+                        isin VARCHAR(20) NOT NULL,
+                        timeframe VARCHAR(10) NOT NULL,
+                        node_id CHAR(16) NOT NULL,
+                        data_version CHAR(32) NOT NULL,
+                        output_json TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (isin, timeframe, node_id)
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_vpvr (
+                        isin VARCHAR(20) NOT NULL,
+                        timeframe VARCHAR(10) NOT NULL,
+                        bins INT NOT NULL,
+                        last_bar_ts DATETIME NOT NULL,
+                        levels_json MEDIUMTEXT NOT NULL,
+                        state_json MEDIUMTEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (isin, timeframe)
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_ohlcv_changes (
+                        isin VARCHAR(20) NOT NULL,
+                        timeframe VARCHAR(10) NOT NULL,
+                        changed_at DATETIME NOT NULL,
+                        PRIMARY KEY (isin, timeframe),
+                        INDEX idx_changed (timeframe, changed_at)
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_dma (
+                        isin VARCHAR(20) NOT NULL,
+                        period INT NOT NULL,
+                        as_of DATE NOT NULL,
+                        value DOUBLE,
+                        computed_at DATETIME NOT NULL,
+                        PRIMARY KEY (isin, period, as_of)
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_tod_volume (
+                        isin VARCHAR(20) NOT NULL PRIMARY KEY,
+                        sessions INT NOT NULL,
+                        through DATE,
+                        forming DATE,
+                        slots_json TEXT NOT NULL,
+                        computed_at DATETIME NOT NULL
+                    )
+                """)
+                await cur.execute("""
+                    CREATE TABLE IF NOT EXISTS app_sg_calc_watermark (
+                        profile_id VARCHAR(20) NOT NULL,
+                        timeframe VARCHAR(10) NOT NULL,
+                        settings_version BIGINT NOT NULL DEFAULT 0,
+                        settings_key CHAR(16) NOT NULL,
+                        calc_started_at DATETIME NOT NULL,
+                        PRIMARY KEY (profile_id, timeframe)
+                    )
+                """)
                 await cur.execute("""
                     CREATE TABLE IF NOT EXISTS app_sg_system_status (
                         mode VARCHAR(20) PRIMARY KEY,
@@ -105,6 +197,14 @@ async def startup_db_setup():
     except Exception as e:
         print(f"Startup DB Setup Error: {e}")
 
+    # Spawn indicator workers up front so the first calc/chart request doesn't pay for it
+    get_executor()
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    """Stop the indicator worker processes."""
+    shutdown_pool()
+
 # --- Auth Models & Logic ---
 def get_session_token(request: Request):
     return request.cookies.get("session_token")
@@ -290,6 +390,9 @@ async def load_settings(profile: str):
         return {"status": "success", "settings": settings}
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 
+# Settings panel keys -> indicator_key rows of app_sg_indicator_settings
+SETTINGS_KEYS = {'rsi': 'RSI', 'ema': 'EMA', 'st': 'SUPERTREND', 'vol': 'VOLUME', 'dma': 'DMA', 'patterns': 'patterns', 'fundamentals': 'FUNDAMENTALS', 'localization': 'localization'}
+
 @app.post("/api/settings/save", dependencies=[Depends(check_auth)])
 async def save_settings(data: dict):
     profile = data.get("profile")
@@ -298,7 +401,7 @@ async def save_settings(data: dict):
     if profile == 'global':
         mapping = {'session': 'session'}
     else:
-        mapping = {'rsi': 'RSI', 'ema': 'EMA', 'st': 'SUPERTREND', 'vol': 'VOLUME', 'dma': 'DMA', 'patterns': 'patterns', 'fundamentals': 'FUNDAMENTALS', 'localization': 'localization'}
+        mapping = SETTINGS_KEYS
     
     try:
         app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
@@ -310,11 +413,37 @@ async def save_settings(data: dict):
                         params = {k: v for k, v in val.items() if k != 'enabled'}
                         is_enabled = val.get('enabled', True)
                         await cur.execute("INSERT INTO app_sg_indicator_settings (profile_id, indicator_key, is_enabled, params_json) VALUES (%s, %s, %s, %s) ON DUPLICATE KEY UPDATE is_enabled=VALUES(is_enabled), params_json=VALUES(params_json)", (profile, be_key, is_enabled, json.dumps(params)))
+                # Other workers/engine runs notice the new version and reload their cached settings
+                await cur.execute("INSERT INTO app_sg_settings_version (profile_id, version) VALUES (%s, 1) ON DUPLICATE KEY UPDATE version = version + 1", (profile,))
                 await conn.commit()
         app_pool.close()
+        settings_cache.invalidate(profile)
         return {"status": "success"}
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/settings/preview", dependencies=[Depends(check_auth)])
+async def preview_settings_api(data: dict):
+    """Board changes under unsaved settings (same payload as /api/settings/save, plus timeframe)."""
+    profile = data.get("profile")
+    if profile not in ('swing', 'intraday'):
+        raise HTTPException(status_code=400, detail="Preview needs profile 'swing' or 'intraday'")
+    timeframe = data.get("timeframe") or ('1d' if profile == 'swing' else '5m')
+    overrides = {}
+    for fe_key, be_key in SETTINGS_KEYS.items():
+        if fe_key in (data.get("settings") or {}):
+            val = data["settings"][fe_key]
+            overrides[be_key] = {**{k: v for k, v in val.items() if k != 'enabled'}, 'enabled': bool(val.get('enabled', True))}
+    try:
+        app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
+        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
+        try:
+            preview = await preview_settings(app_pool, datamart_pool, profile, timeframe, overrides)
+        finally:
+            app_pool.close()
+            datamart_pool.close()
+        return {"status": "success", "data": preview}
+    except Exception as e: raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/strategies/list", dependencies=[Depends(check_auth)])
 async def list_strategies():
     try:
@@ -358,13 +487,9 @@ async def delete_strategy_api(strat_id: int):
 async def get_signals(mode: str = "swing", timeframe: str = None, token: str = Depends(get_session_token)):
     if not token: raise HTTPException(status_code=401)
     try:
+        symbols_map = (await universe.get()).symbol_map()
         app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
-        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
         signals = []
-        async with datamart_pool.acquire() as dm_conn:
-            async with dm_conn.cursor() as dm_cur:
-                await dm_cur.execute("SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all WHERE BINARY bs_Status = 'Active'")
-                symbols_map = {row[0]: row[1] for row in await dm_cur.fetchall()}
         async with app_pool.acquire() as app_conn:
             async with app_conn.cursor(aiomysql.DictCursor) as app_cur:
                 await app_cur.execute("SELECT isin, timeframe, supertrend_dir FROM app_sg_calculated_signals WHERE profile_id = %s", (mode,))
@@ -384,7 +509,7 @@ async def get_signals(mode: str = "swing", timeframe: str = None, token: str = D
                                 processed_row[k] = float(v)
                             except:
                                 processed_row[k] = v
-                        elif k in ['last_5_candles', 'dma_data'] and isinstance(v, str):
+                        elif k in ['last_5_candles', 'dma_data', 'sr_levels', 'rank_history'] and isinstance(v, str):
                             try:
                                 processed_row[k] = json.loads(v)
                             except:
@@ -395,7 +520,7 @@ async def get_signals(mode: str = "swing", timeframe: str = None, token: str = D
                     processed_row['symbol'] = symbols_map.get(row['isin'], row['isin'])
                     processed_row['mtf_data'] = mtf_map.get(row['isin'], {})
                     signals.append(processed_row)
-        app_pool.close(); datamart_pool.close()
+        app_pool.close()
         return {"status": "success", "data": signals}
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 
@@ -578,7 +703,7 @@ async def api_chart_details(isin: str, timeframe: str, profile: str = "swing", b
         return {"status": "success", "data": data}
     except Exception as e: raise HTTPException(status_code=500, detail=str(e))
 @app.get("/api/stream/calculate", dependencies=[Depends(check_auth)])
-async def stream_calculate(mode: str, fundamentals: bool = False):
+async def stream_calculate(mode: str, fundamentals: bool = False, calc_mode: str = None):
     async def event_generator():
         yield f"data: ⚙️ Starting Signal Calculation for {mode.upper()} mode...\n\n"
         global_start = time.perf_counter()
@@ -590,16 +715,31 @@ async def stream_calculate(mode: str, fundamentals: bool = False):
             # Determine timeframes based on mode
             tfs = ['1d', '1w', '1mo'] if mode == 'swing' else ['5m', '15m', '30m', '60m']
             
-            shared_cache = {}
-            for tf in tfs:
-                yield f"data: 🔄 Calculating {tf} indicators...\n\n"
-                tf_start = time.perf_counter()
-                
-                count = await process_profile(app_pool, datamart_pool, mode, tf, shared_cache=shared_cache, use_fundamentals=fundamentals)
-                
-                tf_duration = time.perf_counter() - tf_start
-                yield f"data: ✅ {tf} completed: {count} stocks processed in {tf_duration:.2f}s.\n\n"
-                await asyncio.sleep(0.1)
+            # All timeframes are derived from one load of the base series per stock; progress events
+            # (per chunk, then per timeframe with its own compute/write seconds) stream as they arrive
+            yield f"data: 🔄 Calculating {', '.join(tfs)} indicators...\n\n"
+            calc_start = time.perf_counter()
+            events = asyncio.Queue()
+
+            async def run_calc():
+                try:
+                    return await process_timeframes(app_pool, datamart_pool, mode, tfs, shared_cache={}, use_fundamentals=fundamentals,
+                                                    mode=calc_mode, progress=events.put)
+                finally:
+                    await events.put(None)
+
+            calc = asyncio.ensure_future(run_calc())
+            while (event := await events.get()) is not None:
+                if event['event'] == 'chunk':
+                    written = ', '.join(f"{tf}: {n}" for tf, n in event['written'].items()) or 'none yet'
+                    yield f"data: 📦 {event['stocks']}/{event['total']} stocks computed (signals written: {written}) after {event['elapsed']:.2f}s.\n\n"
+                else:
+                    yield (f"data: ✅ {event['timeframe']} completed: {event['count']} stocks processed in "
+                           f"{event['compute'] + event['write']:.2f}s ({event['compute']:.2f}s compute, {event['write']:.2f}s write).\n\n")
+            await calc
+
+            calc_duration = time.perf_counter() - calc_start
+            yield f"data: ⏱️ {', '.join(tfs)} computed in a single pass in {calc_duration:.2f}s.\n\n"
                 
             # Update system status with IST time
             async with app_pool.acquire() as conn:
@@ -654,29 +794,10 @@ async def stream_fetch(mode: str = "swing"):
             app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
             datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
             
-            # ... (holdings fetching) ...
-            holdings_isins = set()
-            try:
-                async with app_pool.acquire() as conn:
-                    async with conn.cursor() as cur:
-                        await cur.execute("SELECT DISTINCT isin FROM tb_app_sf_holdings")
-                        h_rows = await cur.fetchall()
-                        holdings_isins = {r[0] for r in h_rows if r[0]}
-            except Exception as e:
-                logging.warning(f"Stream Fetch: Failed to fetch holdings: {e}")
-
-            async with datamart_pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cur:
-                    target_dim = 1 if mode == 'intraday' else 2
-                    
-                    await cur.execute("""
-                        SELECT DISTINCT c.bs_ISIN as isin, c.bs_SYMBOL as symbol, c.bs_Available_ON as exchange
-                        FROM vw_e_bs_companies_all c
-                        LEFT JOIN vw_e_bs_companies_favourite_indices f ON c.bs_SYMBOL = f.bs_symbol
-                        WHERE BINARY c.bs_Status = 'Active' 
-                        AND (f.dim_favourites = %s OR (c.bs_ISIN IS NOT NULL AND %s = 2 AND c.bs_ISIN IN %s))
-                    """, (target_dim, target_dim, tuple(holdings_isins) if holdings_isins else ('',)))
-                    companies = await cur.fetchall()
+            # A data fetch is the change signal for the universe: reload the shared snapshot
+            storage = as_storage(app_pool, datamart_pool)
+            snapshot = await universe.get(storage, refresh=True)
+            companies = snapshot.target_companies('intraday' if mode == 'intraday' else 'swing')
             
             if not companies:
                 yield "data: ⚠️ No favourite companies found for this mode.\n\n"
@@ -725,18 +846,12 @@ async def stream_fetch(mode: str = "swing"):
                                 if data.get("status") == "success":
                                     candles = data["data"]["candles"]
                                     total_candles += len(candles)
-                                    async with app_pool.acquire() as conn:
-                                        async with conn.cursor() as cur:
-                                            rows = []
-                                            for c in candles:
-                                                ts = c[0].split('+')[0].replace('T', ' ')
-                                                rows.append((isin, tf_key, ts, c[1], c[2], c[3], c[4], c[5]))
-                                            if rows:
-                                                await cur.executemany("""
-                                                    INSERT INTO app_sg_ohlcv_prices (isin, timeframe, timestamp, open, high, low, close, volume)
-                                                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                                                    ON DUPLICATE KEY UPDATE open=VALUES(open), high=VALUES(high), low=VALUES(low), close=VALUES(close), volume=VALUES(volume)
-                                                """, rows)
+                                    rows = []
+                                    for c in candles:
+                                        ts = c[0].split('+')[0].replace('T', ' ')
+                                        rows.append((isin, tf_key, ts, c[1], c[2], c[3], c[4], c[5]))
+                                    # Storage upsert also records the pair in the change log (dirty calc runs)
+                                    await storage.upsert_ohlcv(rows)
                         
                         stock_duration = time.perf_counter() - stock_start
                         yield "data: ✅ {} - {} candles updated (took {:.2f}s).\n\n".format(symbol, total_candles, stock_duration)
@@ -745,6 +860,9 @@ async def stream_fetch(mode: str = "swing"):
                     
                     await asyncio.sleep(0.05) 
 
+            # New 5m bars: cached live sessions (daily candle synthesis) are stale
+            live_sessions.invalidate()
+
             # Update system status
             async with app_pool.acquire() as conn:
                 async with conn.cursor() as cur:
@@ -0,0 +1,68 @@
+import argparse
+import logging
+import time
+import tracemalloc
+from bench_panel import synthetic_bars, _same
+from indicator_engine import DEFAULT_CONFIGS, calculate_indicators, resample_bars
+
+# Benchmark: memory of the per-ISIN indicator step.
+# "frame" builds the full indicator frame and takes its last row (what every calc run used to
+# do; the chart modal still does); "lean" is the calc-run path (indicator_graph, no memo).
+# Peaks are tracemalloc peaks above the starting allocation: per ISIN (one call) and per run
+# (all ISINs of a timeframe, keeping every latest row like a calc chunk does). Synthetic bars,
+# no database; also checks that both paths return the same latest-row values.
+# Usage: python bench_memory.py --isins 200 > bench_memory.txt
+
+PATHS = {
+    'frame': lambda f, s, p: calculate_indicators(f, s, return_df=True, profile_id=p)[1],
+    'lean': lambda f, s, p: calculate_indicators(f, s, profile_id=p),
+}
+
+def measure(fn, frames, settings, profile_id):
+    """(rows, per-ISIN peak bytes list, run peak bytes, retained bytes, seconds)."""
+    per_isin = []
+    fn(frames[0], settings, profile_id)  # warm-up: kernel compilation and pandas caches
+    tracemalloc.start()
+    try:
+        for f in frames[:20]:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(f, settings, profile_id)
+            per_isin.append(tracemalloc.get_traced_memory()[1] - base)
+
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        rows = [fn(f, settings, profile_id) for f in frames]
+        elapsed = time.perf_counter() - t0
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return rows, per_isin, peak - base, current - base, elapsed
+
+def run(profile_id, timeframe, frames):
+    settings = {**DEFAULT_CONFIGS[profile_id], 'patterns': {'enabled': False}}
+    frames = [resample_bars(f.copy(), timeframe) for f in frames]
+    results = {name: measure(fn, frames, settings, profile_id) for name, fn in PATHS.items()}
+
+    lean_rows, frame_rows = results['lean'][0], results['frame'][0]
+    mismatches = sum(1 for lean, full in zip(lean_rows, frame_rows) for k in lean
+                     if not (lean[k] == full[k] if k == 'timestamp' else _same(lean[k], full.get(k))))
+    line = f"{profile_id:9s} {timeframe:4s} isins={len(frames):4d} bars~{max(len(f) for f in frames):5d}"
+    for name, (_, per_isin, peak, retained, elapsed) in results.items():
+        line += (f" | {name}: isin={sum(per_isin) / len(per_isin) / 1024:7.1f}KiB (max {max(per_isin) / 1024:7.1f})"
+                 f" run={peak / 2**20:6.1f}MiB kept={retained / 2**20:5.2f}MiB {elapsed:6.2f}s")
+    print(line + f" | mismatches={mismatches}")
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--isins", type=int, default=200)
+    args = parser.parse_args()
+
+    daily = synthetic_bars(args.isins, 1250, '1d')
+    intraday = synthetic_bars(args.isins, 3000, '5m')
+    for profile_id, timeframe, frames in [('swing', '1d', daily), ('swing', '1w', daily), ('swing', '1mo', daily),
+                                          ('intraday', '5m', intraday), ('intraday', '15m', intraday),
+                                          ('intraday', '30m', intraday), ('intraday', '60m', intraday)]:
+        run(profile_id, timeframe, frames)
@@ -0,0 +1,83 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+import logging
+from config import Config
+from indicator_engine import DEFAULT_CONFIGS, calculate_indicators, resample_bars
+from panel_engine import latest_rows, min_bars
+
+# Benchmark: per-ISIN calculate_indicators vs the cross-sectional panel engine.
+# Uses synthetic random-walk bars so it runs without a database; also checks that
+# both paths produce the same latest-row values.
+# Usage: python bench_panel.py --isins 200 > bench_output.txt
+
+COMPARE_KEYS = ('close', 'day_high', 'day_low', 'recent_20_high', 'recent_20_low',
+                'RSI_day_high', 'RSI_day_low', 'RSI_MTF_15', 'RSI_MTF_30', 'RSI_MTF_W', 'RSI_MTF_M',
+                'ema_signal', 'ST_value', 'ST_dir', 'vol_ratio', 'vol_signal', 'rev_bull_conf', 'rev_bear_conf')
+
+def synthetic_bars(n_isins, n_bars, freq, seed=7):
+    """Random-walk OHLCV frames with slightly different lengths per ISIN."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(n_isins):
+        n = int(n_bars * rng.uniform(0.6, 1.0))
+        if freq == '1d':
+            ts = pd.bdate_range(end='2026-03-13', periods=n)
+        else:
+            days = pd.bdate_range(end='2026-03-13', periods=n // 75 + 1)
+            ts = pd.DatetimeIndex([d + pd.Timedelta(minutes=555 + 5 * i) for d in days for i in range(75)])[-n:]
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(ts))))
+        open_ = close * (1 + rng.normal(0, 0.003, len(ts)))
+        high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.004, len(ts))))
+        low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, len(ts))))
+        volume = rng.integers(1_000, 100_000, len(ts)).astype(float)
+        frames.append(pd.DataFrame({'timestamp': ts, 'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}))
+    return frames
+
+def _same(a, b):
+    if a is None or b is None or (isinstance(a, float) and np.isnan(a)) or (isinstance(b, float) and np.isnan(b)):
+        return pd.isna(a) and pd.isna(b)
+    if isinstance(a, (str, bool, np.bool_)) or isinstance(b, (str, bool, np.bool_)):
+        return a == b
+    return abs(float(a) - float(b)) <= 1e-7 * max(1.0, abs(float(b)))
+
+def run(profile_id, timeframe, frames):
+    settings = DEFAULT_CONFIGS[profile_id]
+    settings = {**settings, 'patterns': {'enabled': False}}
+    frames = [resample_bars(f.copy(), timeframe) for f in frames]
+    frames = [f for f in frames if len(f) >= min_bars(settings)]
+
+    t0 = time.perf_counter()
+    series = [calculate_indicators(f, settings, profile_id=profile_id) for f in frames]
+    t_series = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    panel = latest_rows(frames, settings, profile_id)
+    t_panel = time.perf_counter() - t0
+
+    mismatches = 0
+    keys = [k for k in COMPARE_KEYS if k in series[0]] + [
+        f"RSI_{settings['RSI']['period']}", f"EMA_{settings['EMA']['fast_period']}", f"EMA_{settings['EMA']['slow_period']}"]
+    for s_row, p_row in zip(series, panel):
+        for k in keys:
+            if not _same(p_row.get(k), s_row.get(k)):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  mismatch {k}: series={s_row.get(k)} panel={p_row.get(k)}")
+    print(f"{profile_id:9s} {timeframe:4s} isins={len(frames):4d} bars~{max(len(f) for f in frames):5d} "
+          f"series={t_series:7.3f}s panel={t_panel:7.3f}s speedup={t_series / t_panel:5.1f}x mismatches={mismatches}"
+          f"{' (calc runs it on the series engine)' if timeframe in Config.PANEL_SERIES_TIMEFRAMES else ''}")
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--isins", type=int, default=200)
+    args = parser.parse_args()
+
+    daily = synthetic_bars(args.isins, 1250, '1d')
+    intraday = synthetic_bars(args.isins, 3000, '5m')
+    for profile_id, timeframe, frames in [('swing', '1d', daily), ('swing', '1w', daily), ('swing', '1mo', daily),
+                                          ('intraday', '5m', intraday), ('intraday', '15m', intraday),
+                                          ('intraday', '30m', intraday), ('intraday', '60m', intraday)]:
+        run(profile_id, timeframe, frames)
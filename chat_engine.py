@@ -4,6 +4,7 @@ import openai
 import aiomysql
 from dotenv import load_dotenv
 from config import Config
+from universe_snapshot import universe
 from datetime import datetime, timezone, timedelta
 
 load_dotenv()
@@ -12,13 +13,8 @@ openai.api_key = os.getenv("OPENAI_API_KEY")
 async def get_top_signals(mode: str = 'swing', limit: int = 5):
     """Retrieve top technical signals from the database based on confluence rank."""
     try:
+        symbols_map = (await universe.get()).symbol_map(active_only=False)
         app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
-        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
-        
-        async with datamart_pool.acquire() as dm_conn:
-            async with dm_conn.cursor() as dm_cur:
-                await dm_cur.execute("SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all")
-                symbols_map = {row[0]: row[1] for row in await dm_cur.fetchall()}
                 
         async with app_pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
@@ -54,9 +50,7 @@ async def get_top_signals(mode: str = 'swing', limit: int = 5):
                     r['expected_duration'] = "1-15 days" if mode == 'swing' else "Intraday (Same Day)"
                     
         app_pool.close()
-        datamart_pool.close()
         await app_pool.wait_closed()
-        await datamart_pool.wait_closed()
         return json.dumps(rows)
     except Exception as e:
         return json.dumps({"error": str(e)})
@@ -64,16 +58,10 @@ async def get_top_signals(mode: str = 'swing', limit: int = 5):
 async def get_stock_status(symbol: str, mode: str = 'swing'):
     """Fetch status for a specific stock by symbol."""
     try:
+        isin = (await universe.get()).isin_for_symbol(symbol)
+        if not isin:
+            return json.dumps({"error": f"Symbol {symbol} not found."})
         app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
-        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
-        
-        async with datamart_pool.acquire() as dm_conn:
-            async with dm_conn.cursor() as dm_cur:
-                await dm_cur.execute("SELECT bs_ISIN FROM vw_e_bs_companies_all WHERE bs_SYMBOL = %s", (symbol,))
-                res = await dm_cur.fetchone()
-                if not res:
-                    return json.dumps({"error": f"Symbol {symbol} not found."})
-                isin = res[0]
                 
         async with app_pool.acquire() as conn:
             async with conn.cursor(aiomysql.DictCursor) as cur:
@@ -108,9 +96,7 @@ async def get_stock_status(symbol: str, mode: str = 'swing'):
                     r['expected_duration'] = "1-15 days" if mode == 'swing' else "Intraday (Same Day)"
                     
         app_pool.close()
-        datamart_pool.close()
         await app_pool.wait_closed()
-        await datamart_pool.wait_closed()
         if not rows:
             return json.dumps({"message": "No calculated signals found for this stock in this profile."})
         return json.dumps(rows)
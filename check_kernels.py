@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import sys
+import time
+import numpy as np
+import logging
+import kernels
+from bench_panel import synthetic_bars
+from ohlcv_loader import read_ohlcv, to_frame
+from storage import EmbeddedStorage, MySQLStorage
+
+# Parity checks and micro-benchmarks for kernels.py against pandas-ta.
+# Every kernel is compared element by element with the pandas-ta reference on synthetic
+# random walks (plus flat stretches and gaps, which exercise the zero-range and ratchet
+# branches) and, optionally, on recorded bars from a database. Exits non-zero on a mismatch.
+# Usage: python check_kernels.py [--isins 50] [--duckdb signals.duckdb | --mysql] [--timeframe 1d]
+
+KERNELS = {
+    'rsi': lambda f, p: kernels.rsi(f['close'], length=p['RSI']),
+    'ema': lambda f, p: kernels.ema(f['close'], length=p['EMA']),
+    'sma': lambda f, p: kernels.sma(f['close'], length=p['SMA']),
+    'atr': lambda f, p: kernels.atr(f['high'], f['low'], f['close'], length=p['ATR']),
+    'supertrend': lambda f, p: kernels.supertrend(f['high'], f['low'], f['close'], length=p['ST'], multiplier=p['MULT']),
+}
+PARAMS = [
+    {'RSI': 14, 'EMA': 9, 'SMA': 20, 'ATR': 14, 'ST': 10, 'MULT': 3.0},
+    {'RSI': 7, 'EMA': 200, 'SMA': 200, 'ATR': 5, 'ST': 7, 'MULT': 2.5},
+]
+# Exact for every backend except the numpy SMA (convolution order), hence a relative tolerance
+TOLERANCE = 1e-12
+
+def edge_cases(frames, seed=11):
+    """Copies of some frames with flat stretches (zero ranges) and very short histories."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for f in frames[:10]:
+        f = f.copy()
+        k = int(rng.integers(0, len(f) - 10))
+        for c in ('open', 'high', 'low', 'close'):
+            f.loc[f.index[k:k + 8], c] = f['close'].iloc[k]
+        out.append(f)
+    out += [f.iloc[:n].copy() for f, n in zip(frames, (1, 2, 7, 8, 15, 21))]
+    return out
+
+async def recorded_bars(storage, timeframe, isins, limit):
+    frames = []
+    try:
+        for c in (await storage.get_companies())[:isins]:
+            bars = await read_ohlcv(storage, c['isin'], timeframe, limit=limit)
+            if bars is not None:
+                frames.append(to_frame(bars))
+    finally:
+        await storage.close()
+    return frames
+
+def _values(out):
+    if out is None:
+        return None
+    return out.iloc[:, :2].to_numpy(dtype=float) if out.ndim == 2 else out.to_numpy(dtype=float)
+
+def compare(frames, backends, label):
+    """Counts elements that differ from pandas-ta beyond TOLERANCE, per backend and kernel."""
+    failures = 0
+    for params in PARAMS:
+        kernels.use('pandas_ta')
+        reference = {name: [_values(fn(f, params)) for f in frames] for name, fn in KERNELS.items()}
+        for backend in backends:
+            kernels.use(backend)
+            for name, fn in KERNELS.items():
+                bad = worst = 0
+                for f, ref in zip(frames, reference[name]):
+                    got = _values(fn(f, params))
+                    if ref is None or got is None:
+                        bad += (ref is None) != (got is None)
+                        continue
+                    both_nan = np.isnan(ref) & np.isnan(got)
+                    err = np.where(both_nan, 0.0, np.abs(ref - got) / np.maximum(1.0, np.abs(ref)))
+                    err = np.where(np.isnan(err), np.inf, err)
+                    bad += int((err > TOLERANCE).sum())
+                    worst = max(worst, float(err.max()) if err.size else 0.0)
+                failures += bad
+                print(f"{label:9s} {backend:6s} {name:10s} {params}: mismatches={bad} max_rel_err={worst:.1e}")
+    return failures
+
+def benchmark(frames, backends, repeat):
+    """Average time per call on each frame, per kernel and backend (first call warms the JIT)."""
+    params = PARAMS[0]
+    for name, fn in KERNELS.items():
+        line = f"{name:10s}"
+        base = None
+        for backend in ('pandas_ta',) + tuple(backends):
+            kernels.use(backend)
+            fn(frames[0], params)
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                for f in frames:
+                    fn(f, params)
+            per_call = (time.perf_counter() - t0) / (repeat * len(frames)) * 1e3
+            base = base or per_call
+            line += f" {backend}={per_call:7.3f}ms ({base / per_call:5.1f}x)"
+        print(line)
+
+if __name__ == "__main__":
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--isins", type=int, default=50)
+    parser.add_argument("--bars", type=int, default=1250)
+    parser.add_argument("--duckdb", help="Also check recorded bars from this embedded database")
+    parser.add_argument("--mysql", action="store_true", help="Also check recorded bars from the Datamart")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    backends = tuple(dict.fromkeys(kernels.use(b) for b in ('numpy', 'numba')))
+    daily = synthetic_bars(args.isins, args.bars, '1d')
+    intraday = synthetic_bars(args.isins, args.bars, '5m', seed=8)
+    failures = compare(daily + intraday + edge_cases(daily), backends, 'synthetic')
+
+    recorded = []
+    if args.duckdb or args.mysql:
+        storage = EmbeddedStorage(args.duckdb) if args.duckdb else asyncio.run(MySQLStorage.connect())
+        recorded = asyncio.run(recorded_bars(storage, args.timeframe, args.isins, args.bars))
+        failures += compare(recorded, backends, 'recorded')
+
+    print(f"\nBenchmark ({args.bars} bars, {len(daily)} series, per call):")
+    benchmark(daily, backends, args.repeat)
+    print(f"\n{'FAILED' if failures else 'OK'}: {failures} mismatching values "
+          f"({len(daily) + len(intraday) + len(recorded)} series, backends: {', '.join(backends)})")
+    sys.exit(1 if failures else 0)
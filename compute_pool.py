@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+# --- Shared Process Pool ---
+# Indicator math is pure pandas/numpy work that holds the GIL, so it runs in
+# worker processes to keep the API event loop free while a calc is in flight.
+_executor = None
+
+def get_executor():
+    """Lazily creates the shared worker pool. Returns None when CALC_WORKERS is 0."""
+    global _executor
+    if _executor is None and Config.CALC_WORKERS > 0:
+        _executor = ProcessPoolExecutor(max_workers=Config.CALC_WORKERS)
+        logging.info(f"Started indicator worker pool ({Config.CALC_WORKERS} processes)")
+    return _executor
+
+def run_in_pool(func, *args):
+    """
+    Schedules func(*args) on the worker pool and returns an awaitable.
+    func and its arguments must be picklable (module-level functions, plain data).
+    Falls back to a direct call when the pool is disabled.
+    """
+    executor = get_executor()
+    loop = asyncio.get_running_loop()
+    if executor is None:
+        future = loop.create_future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return loop.run_in_executor(executor, functools.partial(func, *args))
+
+def shutdown_pool():
+    """Stops the worker processes (called on app shutdown / end of CLI run)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
@@ -19,6 +19,70 @@ class Config:
     DATAMART_DB_NAME = os.getenv("DATAMART_DB_NAME", "stock_datamart")
     DATAMART_DB_PORT = int(os.getenv("DATAMART_DB_PORT", 3306))
 
+    # --- ENGINE TUNING ---
+    # ISINs per batched OHLCV statement (bounded IN list / window-function scan)
+    OHLCV_BATCH_SIZE = int(os.getenv("OHLCV_BATCH_SIZE", 200))
+    # Worker processes for indicator math (0 = run inline on the event loop)
+    CALC_WORKERS = int(os.getenv("CALC_WORKERS", os.cpu_count() or 1))
+    # ISINs handed to a worker per task
+    CALC_CHUNK_SIZE = int(os.getenv("CALC_CHUNK_SIZE", 25))
+    # Indicator engine: "series" (per-ISIN pandas-ta), "panel" (cross-sectional NumPy panels)
+    # or "incremental" (persisted per-ISIN indicator state, advanced by new bars only)
+    CALC_ENGINE = os.getenv("CALC_ENGINE", "series")
+    # "full" recomputes every stock; "dirty" only those whose bars changed since the last run
+    # (or all when the settings changed) and carries the other signal rows forward
+    CALC_MODE = os.getenv("CALC_MODE", "full")
+    # Signal rows per staged merge; the calc run writes finished chunks while computing the rest
+    SIGNAL_WRITE_CHUNK = int(os.getenv("SIGNAL_WRITE_CHUNK", 500))
+    # ISINs per panel in "panel" mode (wider panels amortise the per-row loop better)
+    PANEL_CHUNK_SIZE = int(os.getenv("PANEL_CHUNK_SIZE", 200))
+    # Timeframes "panel" mode hands to the series engine: on long intraday histories the panel's
+    # per-row loop runs slower than the per-ISIN numba kernels (see bench_panel.py)
+    PANEL_SERIES_TIMEFRAMES = tuple(t for t in os.getenv("PANEL_SERIES_TIMEFRAMES", "5m,15m").split(',') if t)
+    # Indicator kernels (kernels.py): "numba" (JIT, falls back to numpy without numba),
+    # "numpy" or "pandas_ta" (the reference implementation)
+    INDICATOR_KERNEL = os.getenv("INDICATOR_KERNEL", "numba")
+    # Lookback planner: bars are read until a recursive indicator's seed weighs less than this
+    WARMUP_TOLERANCE = float(os.getenv("WARMUP_TOLERANCE", 0.001))
+    # Engine pipelines (profiles / timeframes) run concurrently by `python indicator_engine.py`
+    CALC_PARALLELISM = int(os.getenv("CALC_PARALLELISM", 2))
+    # Seconds a cached profile settings object is trusted before its version is re-checked
+    SETTINGS_VERSION_TTL = float(os.getenv("SETTINGS_VERSION_TTL", 5))
+    # Seconds a universe/holdings/fundamentals snapshot is reused before it is reloaded
+    UNIVERSE_TTL = float(os.getenv("UNIVERSE_TTL", 300))
+    # Seconds a cached 5m session (live daily candle) is reused by calc runs and charts
+    LIVE_SESSION_TTL = float(os.getenv("LIVE_SESSION_TTL", 60))
+    # Trading days of DMA rows (re)written when an ISIN's stored DMAs are refreshed
+    DMA_BACKFILL = int(os.getenv("DMA_BACKFILL", 10))
+    # Indicator graph node outputs memoized per process (0 disables, including the app_sg_node_memo
+    # store); a settings change then recomputes only the nodes whose params moved for unchanged bars
+    GRAPH_MEMO_SIZE = int(os.getenv("GRAPH_MEMO_SIZE", 50000))
+    # Cross-sectional features: bars of the signal timeframe the return ranks cover, base bars
+    # (1d / 5m) of the beta regression, and the e_bs_indices_nse index relative strength is against
+    RS_LOOKBACK = int(os.getenv("RS_LOOKBACK", 20))
+    BETA_WINDOW = int(os.getenv("BETA_WINDOW", 60))
+    BENCHMARK_INDEX = os.getenv("BENCHMARK_INDEX", "NIFTY 50")
+    # Intraday volume spikes compare a bar with the median volume of its 5m time-of-day slots over
+    # the last TOD_VOLUME_SESSIONS completed sessions (0 = rolling VOLUME period mean); slots with
+    # fewer than TOD_VOLUME_MIN_SESSIONS samples fall back to the rolling mean
+    TOD_VOLUME_SESSIONS = int(os.getenv("TOD_VOLUME_SESSIONS", 20))
+    TOD_VOLUME_MIN_SESSIONS = int(os.getenv("TOD_VOLUME_MIN_SESSIONS", 5))
+    # Support / resistance levels (sr_levels.py): bars scanned for swing points, bars on each side a
+    # swing high/low must top, % within which swing points merge into one level, swing levels kept
+    # per side, and the share of volume the VPVR value area holds
+    SR_LOOKBACK = int(os.getenv("SR_LOOKBACK", 120))
+    SR_SWING_BARS = int(os.getenv("SR_SWING_BARS", 3))
+    SR_CLUSTER_PCT = float(os.getenv("SR_CLUSTER_PCT", 0.5))
+    SR_MAX_LEVELS = int(os.getenv("SR_MAX_LEVELS", 3))
+    SR_VALUE_AREA = float(os.getenv("SR_VALUE_AREA", 0.7))
+    # Bars of rank history (rank_history.py) each signal row keeps, as rank change points
+    RANK_HISTORY_BARS = int(os.getenv("RANK_HISTORY_BARS", 100))
+    # Volume profile: price bins, bars of the signal timeframe it covers (0 = whole loaded window),
+    # and what charts draw: "lookback" (profile stored by the calc run) or "visible" (bars on screen)
+    VPVR_BINS = int(os.getenv("VPVR_BINS", 24))
+    VPVR_LOOKBACK = int(os.getenv("VPVR_LOOKBACK", 250))
+    VPVR_RANGE_MODE = os.getenv("VPVR_RANGE_MODE", "lookback")
+
     # --- API ENDPOINTS ---
     UPSTOX_HISTORICAL_URL = "https://api.upstox.com/v3/historical-candle/{prefix}|{isin}/days/1/{to_date}/{from_date}"
     UPSTOX_INTRADAY_URL = "https://api.upstox.com/v3/historical-candle/{prefix}|{isin}/minutes/5/{to_date}/{from_date}"
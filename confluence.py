@@ -0,0 +1,180 @@
+import numpy as np
+
+# Confluence scoring and trade plan.
+# Pure functions over arrays of latest values, one element per ISIN, so a whole calc chunk
+# is scored with a few array expressions instead of per-stock branching. The calc run and
+# the chart modal (score_one(), a batch of one) both read their inputs through
+# latest_columns(), so the stored rank and the chart's rank cannot drift apart.
+# Missing values are NaN; a missing or zero price level never scores or anchors a stop.
+
+SMALL_BODY_PATTERNS = ('Spinningtop', 'Doji', 'Hammer', 'Star')
+
+def floats(values):
+    """Float array from optional numbers (None / NaN / non-numeric -> NaN)."""
+    out = np.full(len(values), np.nan)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+def flags(values):
+    return np.array([bool(v) if v is not None else False for v in values], dtype=bool)
+
+def present(values):
+    """Mask of usable price levels (finite and non-zero)."""
+    return np.isfinite(values) & (values != 0)
+
+def latest_columns(rows, patterns, settings, profile_id):
+    """
+    Scoring inputs from a list of latest indicator rows (dicts / Series) and their
+    pattern strings. Intraday reads the 15m/30m RSI and the day's range, swing the
+    weekly/monthly RSI and the 20-bar range.
+    """
+    def col(name):
+        return floats([r.get(name) for r in rows])
+    missing = np.full(len(rows), np.nan)
+
+    if profile_id == 'intraday':
+        mtf, extremes = ('RSI_MTF_15', 'RSI_MTF_30'), ('day_low', 'day_high')
+    else:
+        mtf, extremes = ('RSI_MTF_W', 'RSI_MTF_M'), ('recent_20_low', 'recent_20_high')
+
+    return {
+        'ltp': col('close'),
+        'rsi': col(f"RSI_{settings['RSI']['period']}") if settings['RSI']['enabled'] else missing,
+        'rsi_mtf': (col(mtf[0]), col(mtf[1])),
+        'low_ref': col(extremes[0]),
+        'high_ref': col(extremes[1]),
+        'day_low': col('day_low'),
+        'day_high': col('day_high'),
+        'st_value': col('ST_value') if settings['SUPERTREND']['enabled'] else missing,
+        'ema_slow': col(f"EMA_{settings['EMA']['slow_period']}") if settings['EMA']['enabled'] else missing,
+        'rev_bull': flags([r.get('rev_bull_conf') for r in rows]),
+        'rev_bear': flags([r.get('rev_bear_conf') for r in rows]),
+        'patterns': np.array([p or '' for p in patterns], dtype=str),
+    }
+
+# --- Confluence Rank ---
+def location_tolerance(profile_id, timeframe):
+    """Intraday: 0.1% of the day's extreme. Swing: Daily 5%, Weekly 15%, Monthly 20% of the 20-bar extreme."""
+    if profile_id == 'intraday':
+        return 0.001
+    return 0.05 if timeframe == '1d' else (0.15 if timeframe == '1w' else 0.20)
+
+def confluence_rank(cols, profile_id, timeframe, rsi_os=30, rsi_ob=70):
+    """
+    Rank per ISIN: MTF RSI exhaustion (+-3), location at the range extreme (+-1),
+    candlestick/reversal pattern (+-1) and its confirmation bonus (+-1).
+    Returns (rank, exhaustion_buy, exhaustion_sell).
+    """
+    ltp, rsi = cols['ltp'], cols['rsi']
+    mtf_a, mtf_b = cols['rsi_mtf']
+    rev_bull, rev_bear = cols['rev_bull'], cols['rev_bear']
+
+    # A. MTF RSI Exhaustion (NaN compares False, so any missing timeframe blocks it)
+    ex_buy = (rsi < rsi_os) & (mtf_a < rsi_os) & (mtf_b < rsi_os)
+    ex_sell = (rsi > rsi_ob) & (mtf_a > rsi_ob) & (mtf_b > rsi_ob)
+    rank = np.where(ex_buy, 3, np.where(ex_sell, -3, 0))
+
+    # B. Location
+    tol = location_tolerance(profile_id, timeframe)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at_low = present(cols['low_ref']) & (np.abs(ltp - cols['low_ref']) / cols['low_ref'] < tol)
+        at_high = present(cols['high_ref']) & (np.abs(ltp - cols['high_ref']) / cols['high_ref'] < tol)
+    rank = rank + at_low - at_high
+
+    # C. Pattern (the named pattern wins over the reversal sequence) + confirmation bonus
+    patterns = cols['patterns']
+    has_pattern = patterns != ''
+    bullish = np.char.find(patterns, 'Bullish') >= 0
+    bearish = ~bullish & (np.char.find(patterns, 'Bearish') >= 0)
+    small_body = np.zeros(len(patterns), dtype=bool)
+    for name in SMALL_BODY_PATTERNS:
+        small_body |= np.char.find(patterns, name) >= 0
+
+    triggered = has_pattern | rev_bull | rev_bear
+    base = np.where(has_pattern, bullish * 1 - bearish, np.where(rev_bull, 1, np.where(rev_bear, -1, 0)))
+    rank = rank + np.where(triggered, base, 0)
+    bonus = np.where((rank > 0) & (small_body | rev_bull), 1, np.where((rank < 0) & (small_body | rev_bear), -1, 0))
+    rank = rank + np.where(triggered, bonus, 0)
+    return rank, ex_buy, ex_sell
+
+# --- Trade Plan ---
+def trade_plan(cols, rank, exhausted, profile_id, timeframe):
+    """
+    Stop-loss and target per ISIN, plus the base strategy label.
+    Intraday exhaustion trades stop just beyond the day's extreme (0.16%, 0.21% on 30m)
+    with a 0.5% minimum target. Everything else trades in the rank's direction with the
+    tighter of Supertrend / slow EMA as stop (fallback 3% swing, 0.5% intraday) and a
+    2.0 (swing) / 1.5 R:R target.
+    """
+    ltp = cols['ltp']
+    day_low, day_high = cols['day_low'], cols['day_high']
+    has_low, has_high = present(day_low), present(day_high)
+
+    # Exhaustion override
+    override = exhausted & (has_low | has_high) if profile_id == 'intraday' else np.zeros(len(ltp), dtype=bool)
+    offset = 0.0021 if timeframe == '30m' else 0.0016
+    is_long = cols['rsi'] < 31
+    ex_sl = np.where(is_long,
+                     np.where(has_low, day_low * (1 - offset), ltp * 0.99),
+                     np.where(has_high, day_high * (1 + offset), ltp * 1.01))
+    ex_move = np.maximum(np.where(is_long, ltp - ex_sl, ex_sl - ltp), ltp * 0.005)
+    ex_target = np.where(is_long, ltp + ex_move, ltp - ex_move)
+
+    # Standard plan, aligned with the rank
+    rr = 2.0 if profile_id == 'swing' else 1.5
+    sl_pct = 0.03 if profile_id == 'swing' else 0.005
+    st, ema = cols['st_value'], cols['ema_slow']
+    has_st, has_ema = present(st), present(ema)
+    is_buy = rank > 0
+
+    anchor = np.where(is_buy, np.fmin(np.where(has_st, st, np.nan), np.where(has_ema, ema, np.nan)),
+                      np.fmax(np.where(has_st, st, np.nan), np.where(has_ema, ema, np.nan)))
+    # Safety: the stop must sit below LTP for longs and above it for shorts
+    valid = np.where(is_buy, anchor < ltp, anchor > ltp)
+    std_sl = np.where(valid, anchor, np.where(is_buy, ltp * (1 - sl_pct), ltp * (1 + sl_pct)))
+    std_move = np.where(valid, np.where(is_buy, ltp - anchor, anchor - ltp) * rr, ltp * sl_pct * rr)
+    std_target = np.where(is_buy, ltp + std_move, ltp - std_move)
+
+    sl = np.where(override, ex_sl, std_sl)
+    target = np.where(override, ex_target, std_target)
+    strategy = np.where(override, 'MTF_EXHAUSTION', 'NORMAL').astype(object)
+    return sl, target, strategy
+
+def strategy_labels(strategy, ltp, rank, vol_signal, ema_signal, st_dir, dma):
+    """
+    Final labels: PERFECT_BUY / PERFECT_SELL (rank >= 4 with volume spike, EMA and
+    Supertrend agreeing), else DMA_BOUNCE / DMA_RESISTANCE when price is within 1.5%
+    of any DMA in the Supertrend's direction. `dma` is an (isin x period) array, NaN padded.
+    """
+    vol_signal, ema_signal, st_dir = (np.asarray(a, dtype=object) for a in (vol_signal, ema_signal, st_dir))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = ltp[:, None] / dma
+    near_dma = ((ratio >= 0.985) & (ratio <= 1.015)).any(axis=1)
+    return np.select(
+        [(rank >= 4) & (vol_signal == 'BULL_SPIKE') & (ema_signal == 'BUY') & (st_dir == 'BUY'),
+         (rank <= -4) & (vol_signal == 'BEAR_SPIKE') & (ema_signal == 'SELL') & (st_dir == 'SELL'),
+         (st_dir == 'BUY') & near_dma,
+         (st_dir == 'SELL') & near_dma],
+        ['PERFECT_BUY', 'PERFECT_SELL', 'DMA_BOUNCE', 'DMA_RESISTANCE'],
+        default=strategy)
+
+def dma_matrix(dma_maps):
+    """(isin x period) array from per-ISIN {period: value} dicts, NaN padded."""
+    width = max((len(d) for d in dma_maps if d), default=0)
+    out = np.full((len(dma_maps), width), np.nan)
+    for i, d in enumerate(dma_maps):
+        if d:
+            out[i, :len(d)] = floats(list(d.values()))
+    return out
+
+# --- Scalar Wrapper ---
+def score_one(latest, pattern_str, settings, profile_id, timeframe):
+    """Confluence rank of a single latest row (chart modal)."""
+    cols = latest_columns([latest], [pattern_str], settings, profile_id)
+    rank, _, _ = confluence_rank(cols, profile_id, timeframe,
+                                 settings.get('RSI', {}).get('os', 30), settings.get('RSI', {}).get('ob', 70))
+    return int(rank[0])
@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+import pandas as pd
+import lookback
+from config import Config
+from live_candle import live_candle, live_sessions
+from ohlcv_loader import iter_latest_bars
+
+# Cross-sectional signal features.
+# After a calc run has written its signals, one pass per base timeframe ranks every stored row of
+# the board against the rest of the universe (rows carried forward by a dirty run included):
+#   rsi_sector_pct  RSI percentile within the stock's sector (0-100)
+#   ret_rank        rank of the RS_LOOKBACK-bar return (ret_pct) across the universe, 1 = best
+#   ret_group_pct   return percentile within the stock's industry group (bs_IGroup)
+#   beta            beta of the base-bar returns over BETA_WINDOW bars against the equal-weighted
+#                   universe (the index snapshot holds no price series to regress on)
+#   rel_strength    today's % change minus BENCHMARK_INDEX's day change from e_bs_indices_nse
+# Groups come from the universe snapshot, so they work whether or not the profile stores
+# fundamentals. Each timeframe is ranked with pandas groupby ranks and beta is one masked
+# (time x isin) array pass; the results are written back with storage.update_signal_features().
+
+BETA_MIN_BARS = 20  # return pairs below which a beta is left empty
+
+def board_ranks(board, fundamentals):
+    """Percentiles / ranks of one timeframe's stored rows ([{isin, rsi, ret_pct}]), indexed by isin."""
+    df = pd.DataFrame(board, columns=['isin', 'rsi', 'ret_pct']).set_index('isin')
+    rsi = df['rsi'].astype(float)
+    ret = df['ret_pct'].astype(float)
+    sector = pd.Series([fundamentals.get(isin, {}).get('bs_Sector') for isin in df.index], index=df.index)
+    group = pd.Series([fundamentals.get(isin, {}).get('bs_IGroup') for isin in df.index], index=df.index)
+    return pd.DataFrame({
+        'rsi_sector_pct': rsi.groupby(sector).rank(pct=True) * 100,
+        'ret_rank': ret.rank(ascending=False, method='min'),
+        'ret_group_pct': ret.groupby(group).rank(pct=True) * 100,
+    }, index=df.index)
+
+def betas(returns):
+    """Beta of every column of a (time x isin) return frame against the row-wise mean."""
+    r = returns.to_numpy(dtype=float)
+    finite = np.isfinite(r)
+    count = finite.sum(axis=1)
+    market = np.where(count > 0, np.where(finite, r, 0.0).sum(axis=1) / np.maximum(count, 1), np.nan)
+    valid = finite & np.isfinite(market)[:, None]
+    n = valid.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(valid, market[:, None], 0.0)
+        x = np.where(valid, r, 0.0)
+        dm = np.where(valid, m - m.sum(axis=0) / n, 0.0)
+        dx = np.where(valid, x - x.sum(axis=0) / n, 0.0)
+        beta = (dm * dx).sum(axis=0) / (dm * dm).sum(axis=0)
+    beta[(n < BETA_MIN_BARS) | ~np.isfinite(beta)] = np.nan
+    return pd.Series(beta, index=returns.columns)
+
+def day_change(ts, close):
+    """% change of the last close against the previous session's last close (None without one)."""
+    days = ts.astype('datetime64[D]')
+    prev = int(np.searchsorted(days, days[-1])) - 1
+    if prev < 0 or not close[prev]:
+        return None
+    return (close[-1] / close[prev] - 1) * 100
+
+async def base_features(storage, isins, base_timeframe, index_change):
+    """(beta Series, {isin: rel_strength}) from the latest base bars (live daily candle applied)."""
+    limit = Config.BETA_WINDOW + 1
+    if base_timeframe in lookback.MINUTES:
+        limit += lookback.SESSION_BARS  # reach back to the previous session's close
+    sessions = await live_sessions.get(storage, isins) if base_timeframe == '1d' else {}
+    closes = {}
+    rel_strength = {}
+    async for isin, bars in iter_latest_bars(storage, isins, base_timeframe, limit):
+        ts, close = bars['timestamp'], bars['close']
+        if not len(ts):
+            continue
+        live = live_candle(ts[-1], sessions.get(isin)) if base_timeframe == '1d' else None
+        if live:
+            drop_last, candle = live
+            if drop_last:
+                ts, close = ts[:-1], close[:-1]
+            ts = np.append(ts, np.datetime64(candle['timestamp'], 'ns'))
+            close = np.append(close, candle['close'])
+        closes[isin] = pd.Series(close, index=pd.DatetimeIndex(ts))
+        if index_change is not None:
+            change = day_change(ts, close)
+            rel_strength[isin] = None if change is None else change - index_change
+    if not closes:
+        return pd.Series(dtype=float), rel_strength
+    panel = pd.DataFrame(closes).sort_index().iloc[-(Config.BETA_WINDOW + 1):]
+    return betas(panel.pct_change(fill_method=None).iloc[1:]), rel_strength
+
+def _value(v):
+    return None if v is None or pd.isna(v) else float(v)
+
+async def update_features(storage, profile_id, base_timeframe, timeframes, isins, fundamentals):
+    """Computes and stores the cross-sectional features of `timeframes`' rows. Returns rows updated."""
+    try:
+        index_change = await storage.get_index_change(Config.BENCHMARK_INDEX)
+    except Exception as e:
+        logging.warning(f"Benchmark index {Config.BENCHMARK_INDEX} unavailable, skipping relative strength: {e}")
+        index_change = None
+    beta, rel_strength = await base_features(storage, isins, base_timeframe, index_change)
+
+    rows = []
+    for timeframe in timeframes:
+        board = await storage.get_signal_columns(profile_id, timeframe, ['rsi', 'ret_pct'])
+        if not board:
+            continue
+        ranks = board_ranks(board, fundamentals)
+        for isin, r in ranks.iterrows():
+            rank = _value(r['ret_rank'])
+            rows.append((isin, profile_id, timeframe, _value(r['rsi_sector_pct']), None if rank is None else int(rank),
+                         _value(r['ret_group_pct']), _value(beta.get(isin)), _value(rel_strength.get(isin))))
+    await storage.update_signal_features(rows)
+    return len(rows)
@@ -0,0 +1,41 @@
+import hashlib
+import json
+import logging
+
+# Dirty-set recalculation.
+# Every OHLCV upsert stamps the (isin, timeframe) pairs whose bars actually changed in
+# app_sg_ohlcv_changes, and every calc run stamps its start time and settings per
+# profile/timeframe in app_sg_calc_watermark. A "dirty" run recomputes only the ISINs whose
+# inputs changed since the last run and leaves everyone else's signal rows as they are.
+# Everything is recomputed when a timeframe has never run or its settings changed.
+# Carried-forward rows keep the universe flags and fundamentals of their last full run.
+
+CALC_MODES = ('full', 'dirty')
+
+# Raw series a signal of each base timeframe reads: daily signals follow today's 5m bars
+# through the live candle, intraday signals read the daily closes for their DMAs
+DEPENDS_ON = {'1d': ('1d', '5m'), '5m': ('5m', '1d')}
+
+def settings_key(settings, profile_id):
+    """Stable key for the effective settings of a run (including runtime overrides)."""
+    payload = {'profile': profile_id, 'settings': settings}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+async def select_dirty(storage, isins, profile_id, base_timeframe, timeframes, watermarks, key):
+    """
+    ISINs of `isins` to recompute for `timeframes` (all derived from `base_timeframe`):
+    bars changed since the oldest of their watermarks, or no stored signal row yet.
+    """
+    marks = [watermarks.get(tf) for tf in timeframes]
+    if any(m is None or m['settings_key'] != key for m in marks):
+        logging.info(f"Dirty set {profile_id} ({', '.join(timeframes)}): first run or settings changed, recomputing all.")
+        return isins
+    since = min(m['calc_started_at'] for m in marks)
+    changed = await storage.get_changed_isins(DEPENDS_ON.get(base_timeframe, (base_timeframe,)), since)
+    stored = set(isins)
+    for tf in timeframes:
+        stored &= await storage.get_signal_isins(profile_id, tf)
+    dirty = [isin for isin in isins if isin in changed or isin not in stored]
+    logging.info(f"Dirty set {profile_id} ({', '.join(timeframes)}): {len(dirty)} of {len(isins)} stocks "
+                 f"changed since {since}; carrying forward {len(isins) - len(dirty)}.")
+    return dirty
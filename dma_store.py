@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import kernels
+from config import Config
+from live_candle import live_candle, live_sessions
+from ohlcv_loader import iter_latest_bars, load_latest_bars
+
+# Daily DMA store.
+# Anchored DMAs are plain SMAs of daily closes, so they move at most once per session. They
+# are kept in app_sg_dma, one row per (isin, period, trading day). A lookup recomputes an ISIN
+# only when a period is missing, a newer daily bar exists, or its daily bars changed
+# (app_sg_ohlcv_changes) after its rows were computed. The recompute writes the last
+# DMA_BACKFILL trading days, so missed days and revised closes are rewritten too.
+# dma_values() is the single reader for the calc run and the chart modal. With live=True, ISINs
+# whose 5m session runs ahead of the daily series get the value including the synthesized
+# daily candle instead; that value is computed on the fly and never stored.
+
+def _stale(stored, periods, last_bar, changed_at):
+    if any(p not in stored for p in periods):
+        return True
+    as_of = min(stored[p]['as_of'] for p in periods)
+    if last_bar is not None and pd.Timestamp(last_bar).date() > pd.Timestamp(as_of).date():
+        return True
+    computed_at = min(stored[p]['computed_at'] for p in periods)
+    return changed_at is not None and changed_at >= computed_at
+
+async def refresh(storage, isins, periods):
+    """Recomputes and stores the DMAs of `isins`. Returns their newest rows like get_latest_dma()."""
+    computed_at = await storage.get_db_time()
+    backfill = max(1, Config.DMA_BACKFILL)
+    rows, latest = [], {}
+    async for isin, bars in iter_latest_bars(storage, isins, '1d', max(periods) + backfill - 1):
+        close = bars['close']
+        days = bars['timestamp'][-backfill:].astype('datetime64[D]').astype(object)
+        latest[isin] = {}
+        for p in periods:
+            sma = kernels.sma_values(close, p)[-backfill:] if len(close) >= p else np.full(len(days), np.nan)
+            for day, value in zip(days, sma):
+                rows.append((isin, p, day, None if np.isnan(value) else float(value), computed_at))
+            latest[isin][p] = {'as_of': days[-1], 'value': rows[-1][3], 'computed_at': computed_at}
+    await storage.save_dma(rows)
+    return latest
+
+async def live_values(storage, isins, periods):
+    """{isin: {period: value}} including today's synthesized daily candle, for ISINs that have one."""
+    sessions = await live_sessions.get(storage, isins)
+    ahead = [isin for isin in isins if sessions.get(isin)]
+    if not ahead:
+        return {}
+    out = {}
+    for isin, bars in (await load_latest_bars(storage, ahead, '1d', max(periods))).items():
+        live = live_candle(bars['timestamp'][-1], sessions[isin])
+        if not live:
+            continue
+        drop_last, candle = live
+        close = np.append(bars['close'][:-1] if drop_last else bars['close'], candle['close'])
+        out[isin] = {p: float(kernels.sma_values(close, p)[-1]) if len(close) >= p else None for p in periods}
+    return out
+
+async def dma_values(storage, isins, periods, live=False):
+    """
+    Latest anchored DMAs as {isin: {"SMA_<period>": value}} (periods without enough closes are
+    left out), refreshing stale ISINs in the store first.
+    """
+    isins = list(isins)
+    periods = list(periods)
+    if not periods or not isins:
+        return {isin: {} for isin in isins}
+    stored = await storage.get_latest_dma(isins)
+    last_bars = await storage.get_latest_timestamps(isins, '1d')
+    changes = await storage.get_change_times(isins, '1d')
+    stale = [isin for isin in isins if _stale(stored.get(isin, {}), periods, last_bars.get(isin), changes.get(isin))]
+    if stale:
+        stored.update(await refresh(storage, stale, periods))
+
+    values = {isin: {p: (stored.get(isin, {}).get(p) or {}).get('value') for p in periods} for isin in isins}
+    if live:
+        values.update(await live_values(storage, isins, periods))
+    return {isin: {f"SMA_{p}": float(v) for p, v in by_period.items() if v is not None} for isin, by_period in values.items()}
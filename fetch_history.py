@@ -4,6 +4,8 @@ import aiomysql
 from datetime import datetime, timedelta
 import argparse
 from config import Config
+from storage import as_storage
+from universe_snapshot import universe
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -56,31 +58,29 @@ async def process_company(app_pool, client, isin, symbol, exchange='NSE', fetch_
     # 30-day strict cap max for Upstox intraday API
     from_date_intraday = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d")
 
+    storage = as_storage(app_pool)
+
     # Dynamic Delta Fetch Logic - only download what we are missing
     try:
-        async with app_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                # 1. Delta fetch for Swing (Daily)
-                if fetch_swing:
-                    await cur.execute("SELECT MAX(timestamp) FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = '1d'", (isin,))
-                    latest_1d = await cur.fetchone()
-                    if latest_1d and latest_1d[0]:
-                        from_date = latest_1d[0].strftime("%Y-%m-%d")
-                        logging.info(f"Last available date (1d): {from_date}. Fetching missing data from {from_date} to {to_date}...")
-                    else:
-                        logging.info(f"No previous data found. Fetching full history from {from_date} to {to_date}...")
-                
-                # 2. Delta fetch for Intraday (5m)
-                if fetch_intraday:
-                    await cur.execute("SELECT MAX(timestamp) FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = '5m'", (isin,))
-                    latest_5m = await cur.fetchone()
-                    if latest_5m and latest_5m[0]:
-                        db_latest_5m = latest_5m[0].strftime("%Y-%m-%d")
-                        # We must fetch the max (most recent) between the Database's latest date and the 30-day Upstox limit
-                        from_date_intraday = max(from_date_intraday, db_latest_5m)
-                        logging.info(f"Last available date (5m): {db_latest_5m}. Fetching missing data from {from_date_intraday} to {to_date}...")
-                    else:
-                        logging.info(f"No previous data found (5m). Fetching full history from {from_date_intraday} to {to_date}...")
+        # 1. Delta fetch for Swing (Daily)
+        if fetch_swing:
+            latest_1d = await storage.get_latest_timestamp(isin, '1d')
+            if latest_1d:
+                from_date = latest_1d.strftime("%Y-%m-%d")
+                logging.info(f"Last available date (1d): {from_date}. Fetching missing data from {from_date} to {to_date}...")
+            else:
+                logging.info(f"No previous data found. Fetching full history from {from_date} to {to_date}...")
+        
+        # 2. Delta fetch for Intraday (5m)
+        if fetch_intraday:
+            latest_5m = await storage.get_latest_timestamp(isin, '5m')
+            if latest_5m:
+                db_latest_5m = latest_5m.strftime("%Y-%m-%d")
+                # We must fetch the max (most recent) between the Database's latest date and the 30-day Upstox limit
+                from_date_intraday = max(from_date_intraday, db_latest_5m)
+                logging.info(f"Last available date (5m): {db_latest_5m}. Fetching missing data from {from_date_intraday} to {to_date}...")
+            else:
+                logging.info(f"No previous data found (5m). Fetching full history from {from_date_intraday} to {to_date}...")
     except Exception as e:
          logging.warning(f"Delta fetch check failed for {symbol}: {e}")
 
@@ -104,40 +104,30 @@ async def process_company(app_pool, client, isin, symbol, exchange='NSE', fetch_
         intraday_candles.extend(historical_candles)
     
     # Write OHLCV data to APP DATABASE
-    async with app_pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            insert_query = """
-                INSERT INTO app_sg_ohlcv_prices (isin, timeframe, timestamp, open, high, low, close, volume)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    open=VALUES(open), high=VALUES(high), low=VALUES(low), 
-                    close=VALUES(close), volume=VALUES(volume)
-            """
+    # --- Insert Daily Data ---
+    daily_rows = []
+    for c in daily_candles:
+        try:
+            # Clean the ISO timestamp and convert to MySQL DATETIME
+            ts_clean = c[0].split('+')[0].replace('T', ' ')
+            daily_rows.append((isin, '1d', ts_clean, c[1], c[2], c[3], c[4], c[5]))
+        except Exception as e:
+            logging.warning(f"Failed parsing daily candle for {symbol}: {e}")
             
-            # --- Insert Daily Data ---
-            daily_rows = []
-            for c in daily_candles:
-                try:
-                    # Clean the ISO timestamp and convert to MySQL DATETIME
-                    ts_clean = c[0].split('+')[0].replace('T', ' ')
-                    daily_rows.append((isin, '1d', ts_clean, c[1], c[2], c[3], c[4], c[5]))
-                except Exception as e:
-                    logging.warning(f"Failed parsing daily candle for {symbol}: {e}")
-                    
-            if daily_rows:
-                await cur.executemany(insert_query, daily_rows)
-
-            # --- Insert Intraday Data ---
-            intraday_rows = []
-            for c in intraday_candles:
-                try:
-                    ts_clean = c[0].split('+')[0].replace('T', ' ')
-                    intraday_rows.append((isin, '5m', ts_clean, c[1], c[2], c[3], c[4], c[5]))
-                except Exception as e:
-                    logging.warning(f"Failed parsing 5m candle for {symbol}: {e}")
-                    
-            if intraday_rows:
-                await cur.executemany(insert_query, intraday_rows)
+    if daily_rows:
+        await storage.upsert_ohlcv(daily_rows)
+
+    # --- Insert Intraday Data ---
+    intraday_rows = []
+    for c in intraday_candles:
+        try:
+            ts_clean = c[0].split('+')[0].replace('T', ' ')
+            intraday_rows.append((isin, '5m', ts_clean, c[1], c[2], c[3], c[4], c[5]))
+        except Exception as e:
+            logging.warning(f"Failed parsing 5m candle for {symbol}: {e}")
+            
+    if intraday_rows:
+        await storage.upsert_ohlcv(intraday_rows)
                 
     if daily_rows or intraday_rows:
          logging.info(f"✅ [{symbol}] Data saved (Daily: {len(daily_rows)}, Intraday: {len(intraday_rows)})")
@@ -161,49 +151,19 @@ async def main():
         logging.error(f"Failed to connect to databases. Please check your .env credentials: {e}")
         return
 
-    # 1.5 Fetch Portfolio holdings from APP DB
-    holdings_isins = set()
+    # 1.5 / 2. Universe snapshot (active companies, favourites and portfolio holdings, loaded together)
     try:
-        async with app_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT DISTINCT isin FROM tb_app_sf_holdings")
-                h_rows = await cur.fetchall()
-                holdings_isins = {r[0] for r in h_rows if r[0]}
-                logging.info(f"Integrity Check: Found {len(holdings_isins)} unique portfolio ISINs.")
+        snapshot = await universe.get(as_storage(app_pool, datamart_pool), refresh=True)
     except Exception as e:
-        logging.warning(f"Failed to fetch holdings: {e}. Proceeding with default watchlist.")
+        logging.error(f"Failed to read companies from Datamart DB: {e}")
+        return
+    logging.info(f"Integrity Check: Found {len(snapshot.holdings)} unique portfolio ISINs.")
 
-    # 2. Fetch companies from DATAMART DB
-    async with datamart_pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            
-            # Fetch all Active companies
-            try:
-                await cur.execute("""
-                    SELECT c.bs_ISIN as isin, c.bs_SYMBOL as symbol, c.bs_Available_ON as exchange, f.dim_favourites
-                    FROM vw_e_bs_companies_all c
-                    LEFT JOIN vw_e_bs_companies_favourite_indices f ON c.bs_SYMBOL = f.bs_symbol
-                    WHERE BINARY c.bs_Status = 'Active'
-                """)
-                active_companies = await cur.fetchall()
-            except Exception as e:
-                logging.error(f"Failed to read companies from Datamart DB: {e}")
-                return
-            
-            # Setup lists based on dim_favourites
-            intraday_symbols = {c['symbol'] for c in active_companies if c['dim_favourites'] == 1}
-            swing_symbols = {c['symbol'] for c in active_companies if c['dim_favourites'] == 2}
-            
-            # Filter the active companies based on mode
-            if mode == "intraday":
-                # Intraday stays exclusive to predefined favourites
-                active_companies = [c for c in active_companies if c['symbol'] in intraday_symbols]
-            elif mode == "swing":
-                # Swing = Predefined Swing Favourites + Portfolio Holdings (Deduplicated)
-                active_companies = [c for c in active_companies if c['symbol'] in swing_symbols or c['isin'] in holdings_isins]
-            else:
-                # "all" mode: fetch both universes
-                active_companies = [c for c in active_companies if c['symbol'] in intraday_symbols or c['symbol'] in swing_symbols or c['isin'] in holdings_isins]
+    # Intraday stays exclusive to predefined favourites; Swing = Predefined Swing Favourites + Portfolio Holdings;
+    # "all" mode: fetch both universes
+    active_companies = snapshot.target_companies(mode)
+    intraday_symbols = snapshot.favourites.get(1, frozenset())
+    swing_symbols = snapshot.favourites.get(2, frozenset())
             
     if not active_companies:
         logging.warning("No active companies found in Datamart DB.")
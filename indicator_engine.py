@@ -1,13 +1,31 @@
 import asyncio
-import aiomysql
-from datetime import datetime
+import argparse
 import pandas as pd
 import numpy as np
-# Fix for pandas_ta compatibility with NumPy 2.0+
-np.NaN = np.nan
-import pandas_ta as ta
 import json
 import logging
+import time
+from storage import MySQLStorage, EmbeddedStorage, HISTORY_MIN_RANK, as_storage, mirror
+from ohlcv_loader import OHLCV_FIELDS, iter_latest_bars, read_ohlcv, to_frame
+from compute_pool import run_in_pool, shutdown_pool
+from panel_engine import latest_rows, min_bars
+from indicator_state import advance, settings_hash
+from indicator_graph import evaluate, changed_nodes, node_ids, node_memo, NodeMemo, NODES
+from patterns import frame_patterns, summarize_patterns
+import kernels
+from confluence import latest_columns, confluence_rank, trade_plan, strategy_labels, dma_matrix, score_one
+from settings_cache import settings_cache, deep_merge, freeze
+from universe_snapshot import universe
+from vpvr import frame_advance, frame_profile, volume_profile
+from lookback import fetch_limit
+from dirty_set import CALC_MODES, settings_key, select_dirty
+from signal_writer import SignalWriter
+from live_candle import live_candle, apply_live_candle, live_sessions
+from dma_store import dma_values
+from cross_section import update_features
+from tod_volume import tod_profiles, apply_baseline
+from sr_levels import sr_levels
+from rank_history import rank_series, encode as encode_rank_history
 from config import Config
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -41,7 +59,7 @@ DEFAULT_CONFIGS = {
         'EMA': {'fast_period': 9, 'slow_period': 21, 'enabled': True},
         'SUPERTREND': {'period': 10, 'mult': 2.5, 'enabled': True},
         'ATR': {'period': 14, 'enabled': True},
-        'DMA': {'periods': [10, 20], 'enabled': False},
+        'DMA': {'periods': [10, 20], 'enabled': False, 'live': False},
         'VOLUME': {'period': 20, 'threshold': 1.5, 'enabled': True},
         'patterns': {'enabled': True, 'bullish': True, 'bearish': True, 'neutral': False},
         'FUNDAMENTALS': {'enabled': True}
@@ -51,94 +69,79 @@ DEFAULT_CONFIGS = {
         'EMA': {'fast_period': 9, 'slow_period': 20, 'enabled': True},
         'SUPERTREND': {'period': 10, 'mult': 3.0, 'enabled': True},
         'ATR': {'period': 14, 'enabled': True},
-        'DMA': {'periods': [10, 20, 50, 200], 'enabled': True},
+        'DMA': {'periods': [10, 20, 50, 200], 'enabled': True, 'live': False},
         'VOLUME': {'period': 20, 'threshold': 2.0, 'enabled': True},
         'patterns': {'enabled': True, 'bullish': True, 'bearish': True, 'neutral': False},
         'FUNDAMENTALS': {'enabled': True}
     }
 }
 
-async def synthesize_live_candle(cur, isin, rows):
+async def synthesize_live_candle(storage, isin, df):
     """Synthesizes Today's Daily Candle from 5m data if 1d data is stale."""
-    if not rows:
-        return rows
-    
-    # Rows are ordered by timestamp DESC, so rows[0] is the latest
-    latest_1d_ts = rows[0]['timestamp']
-    
-    # 1. Find the absolute latest date present in 5m data for this stock
-    await cur.execute(
-        "SELECT MAX(timestamp) as max_5m FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = '5m'",
-        (isin,)
-    )
-    res_5m = await cur.fetchone()
-    if res_5m and res_5m['max_5m']:
-        latest_5m_ts = res_5m['max_5m']
-        
-        # 2. If 5m data is NEWER than our 1d data (even on same day), synthesize that day
-        if latest_5m_ts > latest_1d_ts:
-            # If they are on the same day, remove the 1d candle first to avoid duplicates
-            if latest_5m_ts.date() == latest_1d_ts.date():
-                rows.pop(0)
-            
-            latest_5m_date = latest_5m_ts.strftime("%Y-%m-%d")
-            await cur.execute(
-                """
-                SELECT timestamp, open, high, low, close, volume 
-                FROM app_sg_ohlcv_prices 
-                WHERE isin = %s AND timeframe = '5m' AND DATE(timestamp) = %s
-                ORDER BY timestamp ASC
-                """,
-                (isin, latest_5m_date)
-            )
-            intra_rows = await cur.fetchall()
-            if intra_rows:
-                live_candle = {
-                    'timestamp': datetime.strptime(latest_5m_date + " 00:00:00", "%Y-%m-%d %H:%M:%S"),
-                    'open': float(intra_rows[0]['open']),
-                    'high': max(float(r['high']) for r in intra_rows),
-                    'low': min(float(r['low']) for r in intra_rows),
-                    'close': float(intra_rows[-1]['close']),
-                    'volume': sum(int(r['volume']) for r in intra_rows)
-                }
-                rows.insert(0, live_candle)
-    return rows
+    if df.empty:
+        return df
+    sessions = await live_sessions.get(storage, [isin])
+    return apply_live_candle(df, live_candle(df['timestamp'].iloc[-1], sessions[isin]))
+
+async def get_dma_data(storage, isins, settings, shared_cache):
+    """
+    Anchored DMA values (always strictly Daily timeframe) per ISIN from the DMA store,
+    memoised per ISIN and period set in shared_cache. DMA.live adds today's synthesized candle.
+    """
+    if not settings['DMA']['enabled']:
+        return {isin: {} for isin in isins}
+    # Keyed by periods so concurrent profiles with different DMA settings never see each other's values
+    live = bool(settings['DMA'].get('live'))
+    cache_key = ('dma_data', tuple(settings['DMA']['periods']), live)
+    missing = [isin for isin in isins if cache_key not in shared_cache.get(isin, {})]
+    if missing:
+        for isin, dma_data in (await dma_values(storage, missing, settings['DMA']['periods'], live)).items():
+            shared_cache.setdefault(isin, {})[cache_key] = dma_data
+    return {isin: shared_cache[isin][cache_key] for isin in isins}
 
 async def get_profile_settings(pool, profile_id):
-    """Retrieve indicator settings for a profile, or use defaults."""
-    settings = DEFAULT_CONFIGS[profile_id].copy()
-    
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute(
-                "SELECT indicator_key, is_enabled, params_json FROM app_sg_indicator_settings WHERE profile_id = %s",
-                (profile_id,)
-            )
-            rows = await cur.fetchall()
-            
-            for row in rows:
-                key = row['indicator_key']
-                if key in settings:
-                    settings[key]['enabled'] = bool(row['is_enabled'])
-                    if row['params_json']:
-                        try:
-                            params = json.loads(row['params_json'])
-                            settings[key].update(params)
-                        except json.JSONDecodeError:
-                            pass
-    return settings
-
-def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
-    """Calculate technical indicators using pandas-ta."""
-    # Ensure dataframe is sorted by timestamp
-    df = df.sort_values(by='timestamp').copy()
+    """
+    Indicator settings for a profile: defaults deep-merged with the DB overrides.
+    Returned object is read-only and shared; it is cached until the profile's settings version moves.
+    """
+    storage = as_storage(pool)
+
+    async def build():
+        settings = DEFAULT_CONFIGS[profile_id]
+        rows = await storage.get_settings_rows(profile_id)
+        for row in rows:
+            key = row['indicator_key']
+            if key in settings:
+                override = {'enabled': bool(row['is_enabled'])}
+                if row['params_json']:
+                    try:
+                        override.update(json.loads(row['params_json']))
+                    except json.JSONDecodeError:
+                        pass
+                settings = deep_merge(settings, {key: override})
+        return settings
+
+    return await settings_cache.get(storage, profile_id, build)
+
+def calculate_indicators(df, settings, return_df=False, profile_id='swing', key=None):
+    """
+    Calculate technical indicators (kernels.py, pandas-ta formulas).
+    Returns the latest indicator row from the indicator graph (memoized per node when `key`,
+    (isin, timeframe), is given); with return_df=True, the full indicator frame the chart
+    renders and its last row as (df, latest row).
+    """
+    if not return_df:
+        return evaluate(df, settings, profile_id, key)
+
+    # Ensure dataframe is sorted by timestamp (sort_values returns a new frame)
+    df = df.sort_values(by='timestamp')
     
     # Track Day High/Low (from available bars)
+    day_mask = None
     if not df.empty and 'timestamp' in df.columns:
         if not pd.api.types.is_datetime64_any_dtype(df['timestamp']):
             df['timestamp'] = pd.to_datetime(df['timestamp'])
-        latest_date = df['timestamp'].max().date()
-        day_mask = df['timestamp'].dt.date == latest_date
+        day_mask = df['timestamp'].dt.normalize() == df['timestamp'].max().normalize()
         df['day_high'] = df.loc[day_mask, 'high'].max()
         df['day_low'] = df.loc[day_mask, 'low'].min()
         
@@ -156,13 +159,11 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
     # RSI
     if settings['RSI']['enabled']:
         rsi_len = settings['RSI']['period']
-        df[f'RSI_{rsi_len}'] = ta.rsi(df['close'], length=rsi_len)
+        df[f'RSI_{rsi_len}'] = kernels.rsi(df['close'], length=rsi_len)
         
         # Calculate RSI Day High/Low
         # Filter for the latest day available in the df
-        if not df.empty and 'timestamp' in df.columns:
-            latest_date = df['timestamp'].max().date()
-            day_mask = df['timestamp'].dt.date == latest_date
+        if day_mask is not None:
             rsi_today = df.loc[day_mask, f'RSI_{rsi_len}']
             if not rsi_today.dropna().empty:
                 df['RSI_day_high'] = rsi_today.max()
@@ -172,7 +173,7 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
                 df['RSI_day_low'] = None
         
         # --- MTF RSI Logic ---
-        df_temp = df.set_index('timestamp').copy()
+        df_temp = df.set_index('timestamp')
         if profile_id == 'intraday':
             # Resample for 15m and 30m if we have 5m data
             for tf_m in [15, 30]:
@@ -180,7 +181,7 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
                     'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
                 }).dropna()
                 if not df_res.empty:
-                    rsi_mtf = ta.rsi(df_res['close'], length=rsi_len)
+                    rsi_mtf = kernels.rsi(df_res['close'], length=rsi_len)
                     if rsi_mtf is not None:
                         df[f'RSI_MTF_{tf_m}'] = rsi_mtf.reindex(df_temp.index, method='ffill').values
         
@@ -193,7 +194,7 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
                     'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
                 }).dropna()
                 if not df_res.empty:
-                    rsi_mtf = ta.rsi(df_res['close'], length=rsi_len)
+                    rsi_mtf = kernels.rsi(df_res['close'], length=rsi_len)
                     if rsi_mtf is not None:
                         df[f'RSI_MTF_{label}'] = rsi_mtf.reindex(df_temp.index, method='ffill').values
     
@@ -203,8 +204,8 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
         fast_len = settings['EMA']['fast_period']
         slow_len = settings['EMA']['slow_period']
         
-        df[f'EMA_{fast_len}'] = ta.ema(df['close'], length=fast_len)
-        df[f'EMA_{slow_len}'] = ta.ema(df['close'], length=slow_len)
+        df[f'EMA_{fast_len}'] = kernels.ema(df['close'], length=fast_len)
+        df[f'EMA_{slow_len}'] = kernels.ema(df['close'], length=slow_len)
         
         # Determine signal based on current values
         fast_s = pd.to_numeric(df[f'EMA_{fast_len}'], errors='coerce')
@@ -223,7 +224,7 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
         st_len = settings['SUPERTREND']['period']
         st_mult = settings['SUPERTREND']['mult']
         # Pandas-TA Supertrend returns a DataFrame with dynamic column names
-        st_df = ta.supertrend(df['high'], df['low'], df['close'], length=st_len, multiplier=st_mult)
+        st_df = kernels.supertrend(df['high'], df['low'], df['close'], length=st_len, multiplier=st_mult)
         if st_df is not None and not st_df.empty:
             # Use iloc to get the columns by position to avoid dynamic name issues
             # Col 0: Supertrend, Col 1: Direction
@@ -232,7 +233,7 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
     # ATR (Average True Range)
     if settings.get('ATR', {}).get('enabled'):
         atr_len = settings['ATR']['period']
-        df['ATR_value'] = ta.atr(df['high'], df['low'], df['close'], length=atr_len)
+        df['ATR_value'] = kernels.atr(df['high'], df['low'], df['close'], length=atr_len)
 
     # VOLUME SPIKE
     if settings.get('VOLUME', {}).get('enabled'):
@@ -253,920 +254,976 @@ def calculate_indicators(df, settings, return_df=False, profile_id='swing'):
     df['rev_bull_conf'] = df['is_green'] & df['is_red'].shift(1) & df['is_red'].shift(2) & df['is_red'].shift(3)
     df['rev_bear_conf'] = df['is_red'] & df['is_green'].shift(1) & df['is_green'].shift(2) & df['is_green'].shift(3)
 
-    # CANDLESTICK PATTERNS
-    if settings.get('patterns', {}).get('enabled'):
+    # CANDLESTICK PATTERNS are evaluated separately on the last bars only (see patterns.py)
+
+    return df, df.iloc[-1]
+
+def get_base_timeframe(timeframe):
+    """Raw timeframe stored in the DB that a requested timeframe is resampled from."""
+    if timeframe in ['1w', '1mo']:
+        return '1d'
+    if timeframe in ['15m', '30m', '60m']:
+        return '5m'
+    return timeframe
+
+def get_fetch_limit(settings, profile_id, timeframe, extra=0):
+    """Base bars to load for a timeframe: the warmup the active settings need (see lookback.py) + `extra` bars."""
+    return fetch_limit(settings, profile_id, timeframe, get_base_timeframe(timeframe), extra)
+
+def resample_bars(df, timeframe):
+    """Resamples base-timeframe bars (1d / 5m) up to the requested timeframe."""
+    base_timeframe = get_base_timeframe(timeframe)
+    # Resampling Logic
+    if timeframe != base_timeframe:
+        df.set_index('timestamp', inplace=True)
+    
+        resample_rule = {
+            '1w': 'W-FRI',
+            '1mo': 'ME',
+            '15m': '15min',
+            '30m': '30min',
+            '60m': '60min'
+        }.get(timeframe)
+    
+        resample_kwargs = {}
+        if timeframe in ['15m', '30m', '60m'] and pd.to_timedelta('15min') is not None:
+            resample_kwargs['offset'] = '15min'
+    
+        df = df.resample(resample_rule, **resample_kwargs).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'
+        }).dropna()
+        df.reset_index(inplace=True)
+    return df
+
+def prepare_isin(isin, df, settings, profile_id, timeframe):
+    """
+    Pure per-ISIN indicator math (resample -> indicators). Runs in a worker process,
+    so it only touches the bars and settings it is given.
+    Returns (resampled df, latest indicator row), or None if there is nothing to score.
+    """
+    df = resample_bars(df, timeframe)
+    if df.empty:
+        return None
+    try:
+        return df, calculate_indicators(df, settings, profile_id=profile_id, key=(isin, timeframe))
+    except Exception as e:
+        logging.warning(f"Error calculating indicators for {isin} ({timeframe}): {e}")
+        return None
+
+def profile_row(isin, timeframe, df, blob=None):
+    """Advances the stored volume profile of one ISIN/timeframe; returns (its app_sg_vpvr row, levels)."""
+    levels, new_blob, _ = frame_advance(df, blob)
+    return (isin, timeframe, Config.VPVR_BINS, df['timestamp'].iloc[-1].to_pydatetime(), json.dumps(levels), new_blob), levels
+
+def signal_fields(df, latest_data, settings):
+    """Output fields of one ISIN's latest indicator row (None when it has no price/timestamp)."""
+    # Extract values safely
+    try:
+        ltp = to_db_float(latest_data.get('close'))
+        timestamp = latest_data.get('timestamp')
+        if ltp is None or timestamp is None:
+            return None
+    except Exception:
+        return None
+
+    rsi_val = None
+    rsi_day_high = None
+    rsi_day_low = None
+    if settings['RSI']['enabled']:
+        rsi_col = f"RSI_{settings['RSI']['period']}"
+        rsi_val = to_db_float(latest_data.get(rsi_col))
+        rsi_day_high = to_db_float(latest_data.get('RSI_day_high'))
+        rsi_day_low = to_db_float(latest_data.get('RSI_day_low'))
+
+    ema_fast = None
+    ema_slow = None
+    ema_signal = None
+    if settings['EMA']['enabled']:
+        f_len = settings['EMA']['fast_period']
+        s_len = settings['EMA']['slow_period']
+        ema_fast = to_db_float(latest_data.get(f'EMA_{f_len}'))
+        ema_slow = to_db_float(latest_data.get(f'EMA_{s_len}'))
+        ema_signal = latest_data.get('ema_signal')
+
+    vol_signal = 'NORMAL'
+    vol_ratio = 1.0
+    if settings.get('VOLUME', {}).get('enabled'):
+        vol_signal = latest_data.get('vol_signal', 'NORMAL')
+        vol_ratio = to_db_float(latest_data.get('vol_ratio')) or 1.0
+
+    st_value = None
+    st_dir = None
+    if settings['SUPERTREND']['enabled'] and 'ST_value' in latest_data:
+        st_value = float(latest_data['ST_value']) if pd.notna(latest_data['ST_value']) else None
+        st_dir_num = latest_data.get('ST_dir')
+        if pd.notna(st_dir_num):
+            st_dir = 'BUY' if st_dir_num == 1 else 'SELL'
+
+    # --- Candlestick Patterns (latest bar only, configured patterns only) ---
+    pattern_str = None
+    pattern_score = 0
+    patterns_opts = settings.get('patterns', {})
+    if patterns_opts.get('enabled'):
+        pattern_str, pattern_score = summarize_patterns(frame_patterns(df), patterns_opts)
+
+    # Last 5 candles visualizer
+    last_5_candles = None
+    if len(df) >= 5:
+        recent_5 = df.iloc[-5:]
+        candles_list = []
+        for _, r in recent_5.iterrows():
+            candles_list.append({
+                "t": str(r['timestamp']),
+                "o": float(r['open']),
+                "h": float(r['high']),
+                "l": float(r['low']),
+                "c": float(r['close'])
+            })
+        last_5_candles = json.dumps(clean_nan(candles_list))
+
+    # Return over the last RS_LOOKBACK bars, ranked across the universe by cross_section.py
+    ret_pct = None
+    if len(df) > Config.RS_LOOKBACK:
+        ret_pct = to_db_float((df['close'].iloc[-1] / df['close'].iloc[-1 - Config.RS_LOOKBACK] - 1) * 100)
+
+    return {
+        'timestamp': timestamp, 'ltp': ltp, 'rsi_val': rsi_val, 'rsi_day_high': rsi_day_high, 'rsi_day_low': rsi_day_low,
+        'ema_signal': ema_signal, 'ema_fast': ema_fast, 'ema_slow': ema_slow, 'vol_signal': vol_signal, 'vol_ratio': vol_ratio,
+        'st_dir': st_dir, 'st_value': st_value, 'pattern_str': pattern_str, 'pattern_score': pattern_score,
+        'last_5_candles': last_5_candles, 'ret_pct': ret_pct
+    }
+
+# Fields of a signal tuple (build_signals())
+SIGNAL_FIELDS = ('timestamp', 'ltp', 'rsi_val', 'rsi_day_high', 'rsi_day_low',
+                 'ema_signal', 'ema_fast', 'ema_slow', 'vol_signal', 'vol_ratio',
+                 'st_dir', 'st_value', 'rank', 'sl', 'target', 'trade_strategy',
+                 'pattern_str', 'pattern_score', 'last_5_candles', 'ret_pct')
+
+def build_signals(items, settings, profile_id, timeframe):
+    """
+    Confluence rank, trade plan and labels for a batch of (df, latest_data, dma_data) items,
+    scored together by confluence.py. Returns one signal tuple (or None) per item.
+    """
+    fields = [signal_fields(df, latest_data, settings) for df, latest_data, _ in items]
+    ok = [i for i, f in enumerate(fields) if f is not None]
+    out = [None] * len(items)
+    if not ok:
+        return out
+
+    # --- Confluence Ranking + Trade Plan (whole batch at once) ---
+    rsi_os = settings.get('RSI', {}).get('os', 30)
+    rsi_ob = settings.get('RSI', {}).get('ob', 70)
+    cols = latest_columns([items[i][1] for i in ok], [fields[i]['pattern_str'] for i in ok], settings, profile_id)
+    rank, ex_buy, ex_sell = confluence_rank(cols, profile_id, timeframe, rsi_os, rsi_ob)
+    sl, target, strategy = trade_plan(cols, rank, ex_buy | ex_sell, profile_id, timeframe)
+    strategy = strategy_labels(
+        strategy, cols['ltp'], rank,
+        [fields[i]['vol_signal'] for i in ok], [fields[i]['ema_signal'] for i in ok], [fields[i]['st_dir'] for i in ok],
+        dma_matrix([items[i][2] for i in ok]))
+
+    for k, i in enumerate(ok):
+        f = fields[i]
+        out[i] = (
+            f['timestamp'], f['ltp'], f['rsi_val'], f['rsi_day_high'], f['rsi_day_low'],
+            f['ema_signal'], f['ema_fast'], f['ema_slow'], f['vol_signal'], f['vol_ratio'],
+            f['st_dir'], f['st_value'], int(rank[k]), float(sl[k]), float(target[k]), str(strategy[k]),
+            f['pattern_str'], f['pattern_score'], f['last_5_candles'], f['ret_pct']
+        )
+    return out
+
+def build_signal(df, latest_data, settings, profile_id, timeframe, dma_data):
+    """build_signals() for a single ISIN."""
+    return build_signals([(df, latest_data, dma_data)], settings, profile_id, timeframe)[0]
+
+def score_chunk(prepared, settings, profile_id, timeframe, profiles, volume_base=None):
+    """
+    Scores a chunk's (isin, df, latest_data, dma_data) rows in one build_signals() batch
+    (confluence -> trade plan -> labels), advances their volume profiles and derives their
+    support/resistance levels and rank history.
+    volume_base: {isin: (time-of-day volume profile, last 5m bar)} (tod_volume.py).
+    Returns [(isin, res, vpvr_row, (sr_levels JSON, support, resistance), rank_history JSON)].
+    """
+    if volume_base:
+        prepared = [(isin, df, apply_baseline(latest, df, *volume_base.get(isin, (None, None)), settings, timeframe), dma)
+                    for isin, df, latest, dma in prepared]
+    try:
+        signals = build_signals([(df, latest, dma) for _, df, latest, dma in prepared], settings, profile_id, timeframe)
+    except Exception as e:
+        logging.error(f"Batch scoring failed ({timeframe}), falling back to per-ISIN: {e}")
+        signals = []
+        for isin, df, latest, dma_data in prepared:
+            try:
+                signals.append(build_signal(df, latest, settings, profile_id, timeframe, dma_data))
+            except Exception as e:
+                logging.error(f"FATAL error processing {isin} ({timeframe}): {e}")
+                signals.append(None)
+
+    results = []
+    for (isin, df, _, _), res in zip(prepared, signals):
+        if res is None:
+            continue
         try:
-            cdl_df = df.ta.cdl_pattern(name="all")
-            if cdl_df is not None and not cdl_df.empty:
-                for col in cdl_df.columns:
-                    df[col] = cdl_df[col]
-        except Exception:
-            pass
-            
-    if return_df:
-        return df, df.iloc[-1]
-    return df.iloc[-1] # Return the latest row
+            vpvr_row, profile = profile_row(isin, timeframe, df, profiles.get(isin))
+            history = encode_rank_history(df['timestamp'], rank_series(df, settings, profile_id, timeframe))
+            results.append((isin, res, vpvr_row, sr_levels(df, timeframe, profile, res[1]), history))
+        except Exception as e:
+            logging.error(f"FATAL error processing {isin} ({timeframe}): {e}")
+    return results
+
+def compute_chunk(jobs, settings, profile_id, timeframe, profiles, volume_base=None):
+    """
+    Evaluates a chunk of (isin, df, dma_data) jobs: indicators one ISIN at a time,
+    then one batched scoring pass. Returns ([(isin, res, vpvr_row, levels, rank_history)], states).
+    """
+    prepared = []
+    for isin, df, dma_data in jobs:
+        try:
+            out = prepare_isin(isin, df, settings, profile_id, timeframe)
+            if out is not None:
+                prepared.append((isin, *out, dma_data))
+        except Exception as e:
+            logging.error(f"FATAL error processing {isin} ({timeframe}): {e}")
+    return score_chunk(prepared, settings, profile_id, timeframe, profiles, volume_base), []
 
-async def process_profile(pool, datamart_pool, profile_id, timeframe, shared_cache=None, use_fundamentals=None):
+def compute_panel_chunk(jobs, settings, profile_id, timeframe, profiles, volume_base=None):
+    """
+    Panel engine: resamples the chunk, computes every
+    stock's latest indicator row in one cross-sectional pass, then scores them.
+    Series shorter than the panel's warmup go through calculate_indicators.
+    """
+    need = min_bars(settings)
+    latest = {}
+    panel_items = []
+    frames = {}
+    for isin, df, dma_data in jobs:
+        try:
+            df = resample_bars(df, timeframe)
+            if df.empty:
+                continue
+            frames[isin] = df
+            if len(df) >= need:
+                panel_items.append(isin)
+            else:
+                latest[isin] = calculate_indicators(df, settings, profile_id=profile_id)
+        except Exception as e:
+            logging.warning(f"Error calculating indicators for {isin} ({timeframe}): {e}")
+
+    if panel_items:
+        try:
+            rows = latest_rows([frames[isin] for isin in panel_items], settings, profile_id)
+            latest.update(zip(panel_items, rows))
+        except Exception as e:
+            logging.error(f"Panel calculation failed ({timeframe}), falling back to per-ISIN: {e}")
+            for isin in panel_items:
+                try:
+                    latest[isin] = calculate_indicators(frames[isin], settings, profile_id=profile_id)
+                except Exception as e:
+                    logging.warning(f"Error calculating indicators for {isin} ({timeframe}): {e}")
+
+    prepared = [(isin, frames[isin], latest[isin], dma_data) for isin, _, dma_data in jobs if isin in latest]
+    return score_chunk(prepared, settings, profile_id, timeframe, profiles, volume_base), []
+
+def compute_incremental_chunk(jobs, settings, profile_id, timeframe, profiles, states, volume_base=None):
+    """
+    Incremental engine: advances each ISIN's persisted
+    indicator state by the bars that arrived since the last run (full recompute when
+    the state is missing or stale). Returns (results, updated state rows).
+    """
+    need = min_bars(settings)
+    state_key = settings_hash(settings, profile_id)
+    prepared = []
+    new_states = []
+    rebuilt = 0
+    for isin, df, dma_data in jobs:
+        try:
+            df = resample_bars(df, timeframe)
+            if df.empty:
+                continue
+            if len(df) < need:
+                latest_data = calculate_indicators(df, settings, profile_id=profile_id)
+            else:
+                latest_data, blob, recomputed = advance(df, settings, profile_id, states.get(isin))
+                rebuilt += recomputed
+                new_states.append((isin, timeframe, state_key, df['timestamp'].iloc[-2].to_pydatetime(), blob))
+            prepared.append((isin, df, latest_data, dma_data))
+        except Exception as e:
+            logging.error(f"FATAL error processing {isin} ({timeframe}): {e}")
+    if rebuilt:
+        logging.info(f"Rebuilt indicator state for {rebuilt}/{len(jobs)} stocks ({timeframe}).")
+    return score_chunk(prepared, settings, profile_id, timeframe, profiles, volume_base), new_states
+
+def graph_timeframe(engine, timeframe):
+    """True when the engine scores `timeframe` through the indicator graph (compute_chunk)."""
+    if engine == 'incremental':
+        return False
+    return engine != 'panel' or timeframe in Config.PANEL_SERIES_TIMEFRAMES
+
+def compute_timeframes(engine, jobs, settings, profile_id, timeframes, profiles, states, memo_rows=None):
+    """
+    Worker entry point: each (isin, bars, dma_data, live, tod_profile) job carries the base bars
+    loaded once for all requested timeframes. Every timeframe gets the same window of base bars
+    a dedicated fetch would have returned, then runs through the selected engine.
+    memo_rows ({timeframe: stored node outputs}) seed this process's node memo, so only nodes
+    whose params or bars changed since they were stored are computed.
+    Returns ([(isin, timeframe, res, vpvr_row, levels, rank_history)], state rows, {timeframe: seconds},
+    node memo rows computed here).
+    """
+    for timeframe, rows in (memo_rows or {}).items():
+        node_memo.load(timeframe, rows)
+    frames = [(isin, to_frame(bars), dma_data, live) for isin, bars, dma_data, live, _ in jobs]
+    # Time-of-day volume baselines (intraday) and the last 5m bar a forming bar runs up to
+    volume_base = {job[0]: (job[4], df['timestamp'].iloc[-1]) for job, (_, df, _, _) in zip(jobs, frames)
+                   if job[4] is not None and len(df)}
+    results = []
+    new_states = []
+    seconds = {}
+    for timeframe in timeframes:
+        start = time.perf_counter()
+        limit = get_fetch_limit(settings, profile_id, timeframe)
+        tf_jobs = []
+        for isin, df, dma_data, live in frames:
+            df = apply_live_candle(df.iloc[-limit:].reset_index(drop=True), live)
+            if len(df) < 1: # Minimum rows to generate a signal record
+                continue
+            tf_jobs.append((isin, df, dma_data))
+
+        tf_profiles = profiles.get(timeframe, {})
+        if engine == 'incremental':
+            tf_results, tf_states = compute_incremental_chunk(tf_jobs, settings, profile_id, timeframe, tf_profiles, states.get(timeframe, {}), volume_base)
+        elif not graph_timeframe(engine, timeframe):
+            tf_results, tf_states = compute_panel_chunk(tf_jobs, settings, profile_id, timeframe, tf_profiles, volume_base)
+        else:
+            tf_results, tf_states = compute_chunk(tf_jobs, settings, profile_id, timeframe, tf_profiles, volume_base)
+        results.extend((isin, timeframe, *result) for isin, *result in tf_results)
+        new_states.extend(tf_states)
+        seconds[timeframe] = time.perf_counter() - start
+    return results, new_states, seconds, node_memo.drain()
+
+async def submit_chunk(storage, engine, jobs, settings, profile_id, timeframes):
+    """Runs one chunk of ISINs on the worker pool with the selected engine."""
+    isins = [j[0] for j in jobs]
+    profiles = {}
+    states = {}
+    memo_rows = {}
+    for timeframe in timeframes:
+        profiles[timeframe] = await storage.get_vpvr_states(isins, timeframe)
+        if engine == 'incremental':
+            states[timeframe] = await storage.get_indicator_states(isins, timeframe, settings_hash(settings, profile_id))
+        if Config.GRAPH_MEMO_SIZE > 0 and graph_timeframe(engine, timeframe):
+            memo_rows[timeframe] = await storage.get_node_outputs(isins, timeframe, node_ids(settings, profile_id))
+    return await run_in_pool(compute_timeframes, engine, jobs, settings, profile_id, timeframes, profiles, states, memo_rows)
+
+async def process_profile(pool, datamart_pool, profile_id, timeframe, shared_cache=None, use_fundamentals=None, engine=None, mode=None):
     """
     Main entry point for processing a specific profile and timeframe.
     Fetches raw data, calculates indicators, and upserts to signal table.
     """
-    logging.info(f"--- Processing Profile: {profile_id.upper()} (Timeframe: {timeframe}) ---")
-    settings = await get_profile_settings(pool, profile_id)
+    counts = await process_timeframes(pool, datamart_pool, profile_id, [timeframe], shared_cache, use_fundamentals, engine, mode)
+    if counts is None:
+        return None
+    return counts.get(timeframe, 0)
+
+async def process_timeframes(pool, datamart_pool, profile_id, timeframes, shared_cache=None, use_fundamentals=None, engine=None, mode=None, progress=None):
+    """
+    Multi-timeframe pass for a profile: resolves the universe and fundamentals once,
+    loads each ISIN's base series once per base timeframe, derives every requested
+    timeframe from it and streams the signals to the database in chunks (signal_writer.py).
+    mode "dirty" only recomputes ISINs whose bars changed since the last run (dirty_set.py).
+    progress: optional async callable, awaited with
+      {'event': 'chunk', 'stocks', 'total', 'written': {timeframe: rows}, 'elapsed'} after each chunk and
+      {'event': 'timeframe', 'timeframe', 'count', 'compute', 'write'} per timeframe once all are written
+    (compute: worker seconds spent on the timeframe; write: its share of the database merge time).
+    Returns {timeframe: signal count}, or None if no universe could be resolved.
+    """
+    mode = mode or Config.CALC_MODE
+    if mode not in CALC_MODES:
+        raise ValueError(f"Unknown calc mode '{mode}' (expected one of {', '.join(CALC_MODES)})")
+    logging.info(f"--- Processing Profile: {profile_id.upper()} (Timeframes: {', '.join(timeframes)}) ---")
+    storage = as_storage(pool, datamart_pool)
+    if shared_cache is None:
+        shared_cache = {}
+    settings = await get_profile_settings(storage, profile_id)
     
-    # Apply runtime override if provided
+    # Apply runtime override if provided (on a copy; cached settings are shared)
     if use_fundamentals is not None:
-        if 'FUNDAMENTALS' not in settings:
-            settings['FUNDAMENTALS'] = {}
-        settings['FUNDAMENTALS']['enabled'] = use_fundamentals
+        settings = freeze(deep_merge(settings, {'FUNDAMENTALS': {'enabled': use_fundamentals}}))
     
-    # 0. Fetch Portfolio holdings from APP DB
-    holdings_isins = set()
-    try:
-        async with pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT DISTINCT isin FROM tb_app_sf_holdings")
-                h_rows = await cur.fetchall()
-                holdings_isins = {r[0] for r in h_rows if r[0]}
-    except Exception as e:
-        logging.warning(f"Engine: Failed to fetch holdings: {e}")
-
-    # 1. Fetch Target Companies (Intersection of Active + (Favourites OR Holdings))
-    target_companies = []
-    isin_to_symbol = {}
-    favourite_isin_set = set() # Track for flag setting later
-
+    # 0/1. Universe snapshot: Target Companies (Intersection of Active + (Favourites OR Holdings)),
+    # holdings and fundamentals, shared across runs until it expires
     try:
-        async with datamart_pool.acquire() as conn:
-            async with conn.cursor(aiomysql.DictCursor) as cur:
-                target_dim = 1 if profile_id == 'intraday' else 2
-                await cur.execute("""
-                    SELECT a.bs_ISIN as isin, a.bs_SYMBOL as symbol, f.dim_favourites
-                    FROM vw_e_bs_companies_all a
-                    LEFT JOIN vw_e_bs_companies_favourite_indices f ON a.bs_SYMBOL = f.bs_symbol AND f.dim_favourites = %s
-                    WHERE BINARY a.bs_Status = 'Active'
-                """, (target_dim,))
-                active_universe = await cur.fetchall()
-                
-                for c in active_universe:
-                    is_fav = (c['dim_favourites'] == target_dim)
-                    is_holding = (c['isin'] in holdings_isins)
-                    
-                    # Inclusion Rule:
-                    # Intraday: Only Predefined Favorites
-                    # Swing: Predefined Favorites OR Holdings
-                    include = is_fav
-                    if profile_id == 'swing':
-                        include = is_fav or is_holding
-                    
-                    if include:
-                        target_companies.append({
-                            'isin': c['isin'],
-                            'symbol': c['symbol'],
-                            'is_fav': is_fav,
-                            'is_holding': is_holding
-                        })
-                        isin_to_symbol[c['isin']] = c['symbol']
-                        if is_fav: favourite_isin_set.add(c['isin'])
-
+        snapshot = await universe.get(storage)
     except Exception as e:
         logging.error(f"Failed to fetch processing universe: {e}")
         return
 
+    target_companies = snapshot.target_companies(profile_id)
+    isin_to_symbol = snapshot.symbol_map()
+
     if not target_companies:
         logging.warning(f"No stocks identified for processing in {profile_id} mode.")
         return
 
     logging.info(f"Identified {len(target_companies)} stocks to process (Favs + Portfolio merge).")
 
-    # Fetch Fundamental Data if enabled for this profile
-    fundamental_map = {}
-    if settings.get('FUNDAMENTALS', {}).get('enabled'):
-        try:
-            async with datamart_pool.acquire() as dm_conn:
-                async with dm_conn.cursor(aiomysql.DictCursor) as dm_cur:
-                    query = """
-                        SELECT bs_ISIN, bs_SecurityId, bs_Sector, bs_IndustryNew, 
-                               bs_IGroup, bs_ISubGroup,
-                               bs_PE, bs_PB, bs_ROE, bs_EPS, bs_OPM, bs_NPM 
-                        FROM e_bs_header_info_bse
-                    """
-                    await dm_cur.execute(query)
-                    dm_rows = await dm_cur.fetchall()
-                    for r in dm_rows:
-                        fundamental_map[r['bs_ISIN']] = r
-        except Exception as e:
-            logging.error(f"Failed to fetch fundamental data from Datamart: {e}")
-
-    # Determine base timeframe to fetch raw data 
-    if timeframe in ['1w', '1mo']:
-        base_timeframe = '1d'
-    elif timeframe in ['15m', '30m', '60m']:
-        base_timeframe = '5m'
-    else:
-        base_timeframe = timeframe
-
-    # 2. Connect to App DB and process JUST those companies
-    async with pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            # 2. Get list of ISINs to process from our target set
-            target_isins = [c['isin'] for c in target_companies]
-            isin_meta_map = {c['isin']: c for c in target_companies}
+    # Fundamental Data only if enabled for this profile
+    fundamental_map = snapshot.fundamentals if settings.get('FUNDAMENTALS', {}).get('enabled') else {}
+
+    # 2. Get list of ISINs to process from our target set
+    target_isins = [c['isin'] for c in target_companies]
+    isin_meta_map = {c['isin']: c for c in target_companies}
+
+    # "series" evaluates each ISIN with pandas-ta; "panel" computes a whole chunk as 2-D arrays
+    # (PANEL_SERIES_TIMEFRAMES still run per ISIN);
+    # "incremental" advances persisted per-ISIN indicator state by the new bars only
+    engine = engine or Config.CALC_ENGINE
+    chunk_size = Config.PANEL_CHUNK_SIZE if engine == 'panel' else Config.CALC_CHUNK_SIZE
+
+    # The watermark is the start of this run on the DB clock: bars stamped after it are the next run's
+    run_key = settings_key(settings, profile_id)
+    calc_started_at = await storage.get_db_time()
+    watermarks = await storage.get_calc_watermarks(profile_id) if mode == 'dirty' else {}
+
+    # Timeframes resampled from the same raw series share one load (1d -> 1w/1mo, 5m -> 15m/30m/60m)
+    by_base = {}
+    for timeframe in timeframes:
+        by_base.setdefault(get_base_timeframe(timeframe), []).append(timeframe)
+
+    # Finished chunks stream into the signal writer while later chunks are still computing
+    writer = SignalWriter(storage, f"{profile_id} ({', '.join(timeframes)})")
+    states_to_save = []
+    profiles_to_save = []
+    memo_to_save = []
+    counts = {tf: 0 for tf in timeframes}
+    compute_time = {tf: 0.0 for tf in timeframes}
+    run_start = time.perf_counter()
+    stocks = {'done': 0, 'total': 0}
+
+    def signal_rows(chunk_results):
+        """Signal rows (STAGE_COLUMNS: the 41 signal columns + symbol) for one computed chunk."""
+        rows = []
+        for isin, timeframe, res, vpvr_row, (levels_json, support, resistance), rank_history in chunk_results:
+            profiles_to_save.append(vpvr_row)
+            (timestamp, ltp, rsi_val, rsi_day_high, rsi_day_low,
+             ema_signal, ema_fast, ema_slow, vol_signal, vol_ratio,
+             st_dir, st_value, rank, sl, target, trade_strategy,
+             pattern_str, pattern_score, last_5_candles, ret_pct) = res
+            dma_data = dma_by_isin.get(isin, {})
+
+            # --- Fundamentals Integration ---
+            sector = industry = pe = pb = roe = eps = opm = npm = i_group = i_subgroup = None
+            if settings.get('FUNDAMENTALS', {}).get('enabled'):
+                f_data = fundamental_map.get(isin, {})
+                sector = f_data.get('bs_Sector')
+                industry = f_data.get('bs_IndustryNew')
+                i_group = f_data.get('bs_IGroup')
+                i_subgroup = f_data.get('bs_ISubGroup')
             
-            # Intersection: Only process ISINs that actually have price data in the DB
-            await cur.execute("SELECT DISTINCT isin FROM app_sg_ohlcv_prices WHERE timeframe = %s", (base_timeframe,))
-            db_available_isins = {row['isin'] for row in await cur.fetchall()}
-            
-            isins = [isin for isin in target_isins if isin in db_available_isins]
+                # For Intraday, PE/ROE are not meaningful context - skip them to maintain purity
+                if profile_id != 'intraday':
+                    pe = to_db_float(f_data.get('bs_PE'))
+                    roe = to_db_float(f_data.get('bs_ROE'))
             
+                pb = to_db_float(f_data.get('bs_PB'))
+                eps = to_db_float(f_data.get('bs_EPS'))
+                opm = to_db_float(f_data.get('bs_OPM'))
+                npm = to_db_float(f_data.get('bs_NPM'))
+
+            # Get meta flags for signal classification
+            meta = isin_meta_map.get(isin, {'is_fav': False, 'is_holding': False})
+
+            counts[timeframe] += 1
+            rows.append((
+                isin, profile_id, timeframe, timestamp, to_db_float(ltp), to_db_float(rsi_val), 
+                to_db_float(rsi_day_high), to_db_float(rsi_day_low),
+                ema_signal, to_db_float(ema_fast), to_db_float(ema_slow), 
+                vol_signal, to_db_float(vol_ratio),
+                to_db_float(ema_fast), # Using ema_fast as legacy ema_value
+                st_dir, to_db_float(st_value), json.dumps(clean_nan(dma_data)), rank,
+                to_db_float(sl), to_db_float(target), trade_strategy, pattern_str, pattern_score, last_5_candles,
+                sector, industry, to_db_float(pe), to_db_float(pb), to_db_float(roe), to_db_float(eps), to_db_float(opm), to_db_float(npm),
+                i_group, i_subgroup,
+                meta['is_fav'], meta['is_holding'], to_db_float(ret_pct),
+                levels_json, to_db_float(support), to_db_float(resistance), rank_history,
+                isin_to_symbol.get(isin)
+            ))
+        return rows
+
+    async def write_chunk(computing, size):
+        try:
+            chunk_results, chunk_states, chunk_seconds, chunk_memo = await computing
+            states_to_save.extend(chunk_states)
+            memo_to_save.extend(chunk_memo)
+            for timeframe, seconds in chunk_seconds.items():
+                compute_time[timeframe] += seconds
+            await writer.add(signal_rows(chunk_results))
+        finally:
+            gate.release()
+        stocks['done'] += size
+        if progress:
+            await progress({'event': 'chunk', 'stocks': stocks['done'], 'total': stocks['total'],
+                            'written': dict(writer.written), 'elapsed': time.perf_counter() - run_start})
+
+    # Chunks in flight (computing or waiting on the writer) are capped, so a slow pool or database
+    # pauses the bar loader instead of holding every chunk's bars and results in memory at once
+    gate = asyncio.Semaphore(max(1, Config.CALC_WORKERS) * 2)
+
+    async def start_chunk(jobs, base_tfs):
+        await gate.acquire()
+        pending.append(asyncio.ensure_future(write_chunk(submit_chunk(storage, engine, jobs, settings, profile_id, base_tfs), len(jobs))))
+
+    # Bars arrive in batches of ISINs (one statement per chunk) instead of one query per stock.
+    # I/O (bars, live sessions, stored DMAs) stays on the event loop; the indicator math for each
+    # chunk of ISINs is handed to the worker pool while the next chunk is being loaded.
+    pending = []
+    dma_by_isin = {}
+    board_isins = {}
+    for base_timeframe, base_tfs in by_base.items():
+        # Intersection: Only process ISINs that actually have price data in the DB
+        db_available_isins = await storage.get_ohlcv_isins(base_timeframe)
+        isins = [isin for isin in target_isins if isin in db_available_isins]
+
+        if not isins:
+            logging.warning(f"No OHLCV data found for timeframe {base_timeframe}.")
+            continue
+        board_isins[base_timeframe] = isins
+
+        if mode == 'dirty':
+            isins = await select_dirty(storage, isins, profile_id, base_timeframe, base_tfs, watermarks, run_key)
             if not isins:
-                logging.warning(f"No OHLCV data found for timeframe {timeframe}.")
-                return 0
-                
-            logging.info(f"Found {len(isins)} stocks for {profile_id}. Calculating signals...")
-            
-            signals_to_insert = []
-            
-            for isin in isins:
-                try:
-                    # Fetch recent historical data (increase limit to ensure 250 bar warmup AFTER resampling)
-                    if timeframe in ['1w', '1mo']:
-                        limit = 3000 # 250 weeks = ~5 years
-                    elif timeframe == '60m':
-                        limit = 3000 # 250 1-hour candles = 3000 5m candles
-                    elif timeframe == '30m':
-                        limit = 1500 # 250 30-min candles = 1500 5m candles
-                    elif timeframe == '15m':
-                        limit = 2000 # 250 15-min candles = 750 5m candles (using 2000 for extra buffer)
-                    else: 
-                        limit = 1250 # 1d / 5m warmup (generous padding)
-                    await cur.execute(
-                        """
-                        SELECT timestamp, open, high, low, close, volume 
-                        FROM app_sg_ohlcv_prices 
-                        WHERE isin = %s AND timeframe = %s 
-                        ORDER BY timestamp DESC LIMIT %s
-                        """,
-                        (isin, base_timeframe, limit)
-                    )
-                    rows = await cur.fetchall()
-                    
-                    # --- Synthesis Logic for "Live Daily" Candle ---
-                    if base_timeframe == '1d':
-                        rows = await synthesize_live_candle(cur, isin, rows)
-
-                    if len(rows) < 1: # Minimum rows to generate a signal record
-                        continue
-                        
-                    df = pd.DataFrame(rows)
-                    df['timestamp'] = pd.to_datetime(df['timestamp'])
-                    df = df.sort_values('timestamp').reset_index(drop=True)
-                    df[['open', 'high', 'low', 'close']] = df[['open', 'high', 'low', 'close']].astype(float)
-                    
-                    # Resampling Logic
-                    if timeframe != base_timeframe:
-                        df.set_index('timestamp', inplace=True)
-                        
-                        resample_rule = {
-                            '1w': 'W-FRI',
-                            '1mo': 'ME',
-                            '15m': '15min',
-                            '30m': '30min',
-                            '60m': '60min'
-                        }.get(timeframe)
-                        
-                        resample_kwargs = {}
-                        if timeframe in ['15m', '30m', '60m'] and pd.to_timedelta('15min') is not None:
-                            resample_kwargs['offset'] = '15min'
-                        
-                        df = df.resample(resample_rule, **resample_kwargs).agg({
-                            'open': 'first',
-                            'high': 'max',
-                            'low': 'min',
-                            'close': 'last',
-                            'volume': 'sum'
-                        }).dropna()
-                        df.reset_index(inplace=True)
-                    
-                    if df.empty:
-                        continue
+                continue
+        stocks['total'] += len(isins)
+
+        logging.info(f"Found {len(isins)} stocks for {profile_id} ({', '.join(base_tfs)}). Calculating signals...")
+
+        # Load the longest window any of the timeframes needs; each one is sliced back to its own limit
+        limit = max(get_fetch_limit(settings, profile_id, tf) for tf in base_tfs)
+        # Today's 5m session per ISIN for the "live daily" candle, one grouped query per batch
+        sessions = await live_sessions.get(storage, isins) if base_timeframe == '1d' else {}
+        # Anchored DMAs for the whole batch from the DMA store
+        dma_by_isin.update(await get_dma_data(storage, isins, settings, shared_cache))
+        # Time-of-day volume baselines for intraday volume spikes
+        tods = await tod_profiles(storage, isins) if base_timeframe == '5m' and settings.get('VOLUME', {}).get('enabled') else {}
+        jobs = []
+        async for isin, bars in iter_latest_bars(storage, isins, base_timeframe, limit):
+            try:
+                # --- Synthesis Logic for "Live Daily" Candle ---
+                live = None
+                if base_timeframe == '1d' and len(bars['timestamp']):
+                    live = live_candle(bars['timestamp'][-1], sessions.get(isin))
+
+                jobs.append((isin, {c: bars[c] for c in OHLCV_FIELDS}, dma_by_isin[isin], live, tods.get(isin)))
+            except Exception as e:
+                logging.error(f"FATAL error processing {isin} ({base_timeframe}): {e}")
+                continue
+
+            if len(jobs) >= chunk_size:
+                await start_chunk(jobs, base_tfs)
+                jobs = []
+        if jobs:
+            await start_chunk(jobs, base_tfs)
+
+    await asyncio.gather(*pending)
+    written = await writer.close()
+    if written:
+        summary = ", ".join(f"{tf}: {n}" for tf, n in counts.items())
+        logging.info(f"✅ Successfully updated {written} signals for {profile_id} ({summary}).")
+        if writer.history:
+            logging.info(f"📜 Logged {writer.history} high-conviction signals to history.")
+    for tf in timeframes:
+        write_time = writer.timeframe_write_time.get(tf, 0.0)
+        logging.info(f"⏱️ {profile_id} {tf}: {counts[tf]} signals in {compute_time[tf] + write_time:.2f}s "
+                     f"({compute_time[tf]:.2f}s compute, {write_time:.2f}s write).")
+        if progress:
+            await progress({'event': 'timeframe', 'timeframe': tf, 'count': counts[tf],
+                            'compute': compute_time[tf], 'write': write_time})
+
+    if states_to_save:
+        await storage.save_indicator_states(states_to_save)
+    if profiles_to_save:
+        await storage.save_vpvr(profiles_to_save)
+    if memo_to_save:
+        await storage.save_node_outputs(memo_to_save)
+
+    # Cross-sectional ranks, beta and relative strength over the whole board, carried-forward rows included
+    for base_timeframe, isins in board_isins.items():
+        try:
+            ranked = await update_features(storage, profile_id, base_timeframe, by_base[base_timeframe], isins, snapshot.fundamentals)
+            logging.info(f"📊 Cross-sectional features for {ranked} signals ({profile_id} {', '.join(by_base[base_timeframe])}).")
+        except Exception as e:
+            logging.error(f"Cross-sectional features failed for {profile_id} ({base_timeframe}): {e}")
 
-                    try:
-                        latest_data = calculate_indicators(df, settings, profile_id=profile_id)
-                    except Exception as e:
-                        logging.warning(f"Error calculating indicators for {isin} ({timeframe}): {e}")
-                        continue
-                    
-                    # Extract values safely
-                    try:
-                        ltp = to_db_float(latest_data.get('close'))
-                        timestamp = latest_data.get('timestamp')
-                        if ltp is None or timestamp is None:
-                            continue
-                    except Exception:
-                        continue
-                    
-                    rsi_val = None
-                    rsi_day_high = None
-                    rsi_day_low = None
-                    if settings['RSI']['enabled']:
-                        rsi_col = f"RSI_{settings['RSI']['period']}"
-                        rsi_val = to_db_float(latest_data.get(rsi_col))
-                        rsi_day_high = to_db_float(latest_data.get('RSI_day_high'))
-                        rsi_day_low = to_db_float(latest_data.get('RSI_day_low'))
-
-                    # --- VPVR (Volume Profile) ---
-                    vpvr_data = []
-                    if not df.empty:
-                        prices_min = df['low'].min()
-                        prices_max = df['high'].max()
-                        num_bins = 24
-                        if prices_max > prices_min:
-                            bin_size = (prices_max - prices_min) / num_bins
-                            for i in range(num_bins):
-                                b_start = prices_min + (i * bin_size)
-                                b_end = b_start + bin_size
-                                # Volume in this price range
-                                v = df[(df['close'] >= b_start) & (df['close'] < b_end)]['volume'].sum()
-                                vpvr_data.append({
-                                    "price": float(round(b_start, 2)),
-                                    "volume": int(v)
-                                })
-                    
-                    ema_fast = None
-                    ema_slow = None
-                    ema_signal = None
-                    if settings['EMA']['enabled']:
-                        f_len = settings['EMA']['fast_period']
-                        s_len = settings['EMA']['slow_period']
-                        ema_fast = to_db_float(latest_data.get(f'EMA_{f_len}'))
-                        ema_slow = to_db_float(latest_data.get(f'EMA_{s_len}'))
-                        ema_signal = latest_data.get('ema_signal')
-
-                    vol_signal = 'NORMAL'
-                    vol_ratio = 1.0
-                    if settings.get('VOLUME', {}).get('enabled'):
-                        vol_signal = latest_data.get('vol_signal', 'NORMAL')
-                        vol_ratio = to_db_float(latest_data.get('vol_ratio')) or 1.0
-                    
-                    st_value = None
-                    st_dir = None
-                    if settings['SUPERTREND']['enabled'] and 'ST_value' in latest_data:
-                        st_value = float(latest_data['ST_value']) if pd.notna(latest_data['ST_value']) else None
-                        st_dir_num = latest_data.get('ST_dir')
-                        if pd.notna(st_dir_num):
-                            st_dir = 'BUY' if st_dir_num == 1 else 'SELL'
-                            
-                    # --- Anchored DMA Calculation (Always strictly Daily timeframe) ---
-                    dma_data = {}
-                    if settings['DMA']['enabled']:
-                        # Check memory cache first to avoid repeating Pandas math for the exact same company
-                        if isin in shared_cache and 'dma_data' in shared_cache[isin]:
-                            dma_data = shared_cache[isin]['dma_data']
-                        else:
-                            await cur.execute(
-                                "SELECT close FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = '1d' ORDER BY timestamp DESC LIMIT 250",
-                                (isin,)
-                            )
-                            rows_1d = await cur.fetchall()
-                            if rows_1d:
-                                df_1d = pd.DataFrame(rows_1d)
-                                df_1d['close'] = df_1d['close'].astype(float)
-                                # Reverse so oldest data is first (required for accurate moving average calculations)
-                                df_1d = df_1d.iloc[::-1].reset_index(drop=True)
-                                for p in settings['DMA']['periods']:
-                                    if len(df_1d) >= p:
-                                        sma_series = ta.sma(df_1d['close'], length=p)
-                                        if sma_series is not None and not pd.isna(sma_series.iloc[-1]):
-                                            dma_data[f"SMA_{p}"] = float(sma_series.iloc[-1])
-                            
-                            # Save back to cache
-                            if isin not in shared_cache:
-                                shared_cache[isin] = {}
-                            shared_cache[isin]['dma_data'] = dma_data
-
-                    # --- Candlestick Patterns ---
-                    pattern_str = None
-                    pattern_score = 0
-                    patterns_opts = settings.get('patterns', {})
-                    if patterns_opts.get('enabled'):
-                        bullish_patterns = []
-                        bearish_patterns = []
-                        neutral_patterns = []
-                        
-                        bullish_cols = ['CDL_ENGULFING', 'CDL_HAMMER', 'CDL_MORNINGSTAR', 'CDL_PIERCING', 'CDL_MORNINGDOJISTAR', 'CDL_3WHITESOLDIERS', 'CDL_DRAGONFLYDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
-                        bearish_cols = ['CDL_ENGULFING', 'CDL_SHOOTINGSTAR', 'CDL_EVENINGSTAR', 'CDL_DARKCLOUDCOVER', 'CDL_EVENINGDOJISTAR', 'CDL_HANGINGMAN', 'CDL_3BLACKCROWS', 'CDL_GRAVESTONEDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
-                        neutral_cols = ['CDL_DOJI_10_0.1', 'CDL_SPINNINGTOP', 'CDL_HIGHWAVE', 'CDL_RICKSHAWMAN', 'CDL_LONGLEGGEDDOJI', 'CDL_INSIDE', 'CDL_BELTHOLD']
-                        
-                        # Pattern intensity scoring
-                        PATTERN_WEIGHTS = {
-                            'CDL_MORNINGSTAR': 3, 'CDL_EVENINGSTAR': 3, 'CDL_3WHITESOLDIERS': 3, 'CDL_3BLACKCROWS': 3, 'CDL_MORNINGDOJISTAR': 3, 'CDL_EVENINGDOJISTAR': 3, 'CDL_3INSIDE': 3, 'CDL_3OUTSIDE': 3,
-                            'CDL_ENGULFING': 2, 'CDL_PIERCING': 2, 'CDL_DARKCLOUDCOVER': 2,
-                            'CDL_HAMMER': 1, 'CDL_INVERTEDHAMMER': 1, 'CDL_SHOOTINGSTAR': 1, 'CDL_DRAGONFLYDOJI': 1, 'CDL_GRAVESTONEDOJI': 1, 'CDL_DOJI': 1
-                        }
-                        
-                        for key, val in latest_data.items():
-                            if not isinstance(key, str) or not key.startswith("CDL_") or pd.isna(val) or val == 0:
-                                continue
-                            
-                            # Only accept strong pattern signals (usually 100 or -100)
-                            if abs(val) < 10: 
-                                continue
-
-                            # Update score (Signed)
-                            weight = PATTERN_WEIGHTS.get(key, 1)
-                            if val < 0: weight = -weight
-                            if abs(weight) > abs(pattern_score):
-                                pattern_score = weight
-
-                            pattern_name = key.replace("CDL_", "").split("_")[0].title()
-                            
-                            if val > 0:
-                                if key in neutral_cols:
-                                    neutral_patterns.append(pattern_name)
-                                elif key in bearish_cols and key not in bullish_cols:
-                                    bearish_patterns.append(pattern_name)
-                                else:
-                                    bullish_patterns.append(pattern_name)
-                            elif val < 0:
-                                if key in neutral_cols:
-                                    neutral_patterns.append(pattern_name)
-                                elif key in bullish_cols and key not in bearish_cols:
-                                    bullish_patterns.append(pattern_name)
-                                else:
-                                    bearish_patterns.append(pattern_name)
-                                    
-                        active_found = []
-                        if patterns_opts.get('bullish') and bullish_patterns:
-                            active_found.append("Bullish " + "/".join(bullish_patterns))
-                        if patterns_opts.get('bearish') and bearish_patterns:
-                            active_found.append("Bearish " + "/".join(bearish_patterns))
-                        if patterns_opts.get('neutral') and neutral_patterns:
-                            active_found.append("Neutral " + "/".join(neutral_patterns))
-                        if active_found:
-                            pattern_str = " | ".join(active_found)
-                    
-                    # --- Confluence Ranking Logic ---
-                    rank = 0
-                    
-                    # 1. Fetch dynamic RSI OB/OS levels from settings (Tuning)
-                    rsi_os = settings.get('RSI', {}).get('os', 30)
-                    rsi_ob = settings.get('RSI', {}).get('ob', 70)
-                    
-                    is_exhaustion_buy = False
-                    is_exhaustion_sell = False
-
-                    if profile_id == 'intraday':
-                        # A. MTF RSI Exhaustion (5m + 15m + 30m)
-                        rsi5 = rsi_val
-                        rsi15 = latest_data.get('RSI_MTF_15')
-                        rsi30 = latest_data.get('RSI_MTF_30')
-
-                        is_exhaustion_buy = (rsi5 is not None and rsi5 < rsi_os and 
-                                             rsi15 is not None and rsi15 < rsi_os and 
-                                             rsi30 is not None and rsi30 < rsi_os)
-                        is_exhaustion_sell = (rsi5 is not None and rsi5 > rsi_ob and 
-                                              rsi15 is not None and rsi15 > rsi_ob and 
-                                              rsi30 is not None and rsi30 > rsi_ob)
-
-                        if is_exhaustion_buy: rank += 3
-                        elif is_exhaustion_sell: rank -= 3
-
-                        # B. Location (Day's Extreme - 1 Point)
-                        day_high = latest_data.get('day_high')
-                        day_low = latest_data.get('day_low')
-                        if day_low and abs(ltp - day_low) / day_low < 0.001: rank += 1 
-                        if day_high and abs(ltp - day_high) / day_high < 0.001: rank -= 1
-
-                        # C. Pattern Confirmation (Up to 2 Pts)
-                        if pattern_str or latest_data.get('rev_bull_conf') or latest_data.get('rev_bear_conf'):
-                            if pattern_str:
-                                if "Bullish" in pattern_str: rank += 1
-                                elif "Bearish" in pattern_str: rank -= 1
-                            else:
-                                if latest_data.get('rev_bull_conf'): rank += 1
-                                elif latest_data.get('rev_bear_conf'): rank -= 1
-                            
-                            # Confirmation Bonus (+1 Pt)
-                            small_body_patterns = ['Spinningtop', 'Doji', 'Hammer', 'Star']
-                            is_small_body = pattern_str and any(sb in pattern_str for sb in small_body_patterns)
-                            is_buy_seq = latest_data.get('rev_bull_conf')
-                            is_sell_seq = latest_data.get('rev_bear_conf')
-
-                            if (rank > 0 and (is_small_body or is_buy_seq)):
-                                rank += 1
-                            elif (rank < 0 and (is_small_body or is_sell_seq)):
-                                rank -= 1
-
-                    else:
-                        # --- Swing Point-Based Logic ---
-                        # A. MTF RSI Exhaustion (Daily + Weekly + Monthly)
-                        # Assumes Daily data run (timeframe='1d') to possess resampled W/M columns
-                        rsi_d = rsi_val
-                        rsi_w = latest_data.get('RSI_MTF_W')
-                        rsi_m = latest_data.get('RSI_MTF_M')
-
-                        is_exhaustion_buy = (rsi_d is not None and rsi_d < rsi_os and 
-                                             rsi_w is not None and rsi_w < rsi_os and 
-                                             rsi_m is not None and rsi_m < rsi_os)
-                        is_exhaustion_sell = (rsi_d is not None and rsi_d > rsi_ob and 
-                                              rsi_w is not None and rsi_w > rsi_ob and 
-                                              rsi_m is not None and rsi_m > rsi_ob)
-
-                        if is_exhaustion_buy: rank += 3
-                        elif is_exhaustion_sell: rank -= 3
-
-                        # B. Location (Recent 20-Bar Extreme - 1 Point)
-                        rec_high = latest_data.get('recent_20_high')
-                        rec_low = latest_data.get('recent_20_low')
-                        
-                        # Timeframe-specific buffers: Daily 5%, Weekly 15%, Monthly 20%
-                        buffer = 0.05 if timeframe == '1d' else (0.15 if timeframe == '1w' else 0.20)
-                        
-                        if rec_low and abs(ltp - rec_low) / rec_low < buffer: rank += 1
-                        if rec_high and abs(ltp - rec_high) / rec_high < buffer: rank -= 1
-
-                        # C. Pattern Confirmation (Up to 2 Pts)
-                        if pattern_str or latest_data.get('rev_bull_conf') or latest_data.get('rev_bear_conf'):
-                            # Base Pattern (+1 Pt)
-                            if pattern_str:
-                                if "Bullish" in pattern_str: rank += 1
-                                elif "Bearish" in pattern_str: rank -= 1
-                            else:
-                                if latest_data.get('rev_bull_conf'): rank += 1
-                                elif latest_data.get('rev_bear_conf'): rank -= 1
-
-                            # Confirmation Bonus (+1 Pt)
-                            small_body_patterns = ['Spinningtop', 'Doji', 'Hammer', 'Star']
-                            is_small_body = pattern_str and any(sb in pattern_str for sb in small_body_patterns)
-                            is_buy_seq = latest_data.get('rev_bull_conf')
-                            is_sell_seq = latest_data.get('rev_bear_conf')
-
-                            if (rank > 0 and (is_small_body or is_buy_seq)):
-                                rank += 1
-                            elif (rank < 0 and (is_small_body or is_sell_seq)):
-                                rank -= 1
-
-                    # --- Trade Plan Logic (Pick Stocks for Trade) ---
-                    sl = None
-                    target = None
-                    trade_strategy = "NORMAL"
-                    
-                    # EXHAUSTION OVERRIDE (User-defined 0.16% / 0.21%)
-                    if (is_exhaustion_buy or is_exhaustion_sell) and profile_id == 'intraday' and (day_low or day_high):
-                        trade_strategy = "MTF_EXHAUSTION"
-                        offset_pct = 0.0021 if timeframe == '30m' else 0.0016
-                        
-                        if rsi_val < 31: # Long
-                            sl = day_low * (1 - offset_pct) if day_low else ltp * 0.99
-                            risk = ltp - sl
-                            target = ltp + max(risk, ltp * 0.005) # Min 0.5% Target (T1)
-                        else: # Short
-                            sl = day_high * (1 + offset_pct) if day_high else ltp * 1.01
-                            risk = sl - ltp
-                            target = ltp - max(risk, ltp * 0.005)
-
-                    else:
-                        # Standard Signal Logic - Align direction with confluence rank
-                        rr_multiplier = 2.0 if profile_id == 'swing' else 1.5
-                        is_buy_side = (rank > 0)
-                        
-                        if is_buy_side:
-                            # Target/SL for Longs
-                            if st_value and ema_slow: sl = min(st_value, ema_slow)
-                            elif st_value: sl = st_value
-                            elif ema_slow: sl = ema_slow
-                            
-                            # Safety: Ensure SL is actually BELOW LTP for Longs
-                            if sl and sl < ltp:
-                                risk = ltp - sl
-                                target = ltp + (risk * rr_multiplier)
-                            else:
-                                sl_pct = 0.03 if profile_id == 'swing' else 0.005
-                                sl = ltp * (1 - sl_pct)
-                                target = ltp + (ltp * sl_pct * rr_multiplier)
-                        else:
-                            # Target/SL for Shorts
-                            if st_value and ema_slow: sl = max(st_value, ema_slow)
-                            elif st_value: sl = st_value
-                            elif ema_slow: sl = ema_slow
-                            
-                            # Safety: Ensure SL is actually ABOVE LTP for Shorts
-                            if sl and sl > ltp:
-                                risk = sl - ltp
-                                target = ltp - (risk * rr_multiplier)
-                            else:
-                                sl_pct = 0.03 if profile_id == 'swing' else 0.005
-                                sl = ltp * (1 + sl_pct)
-                                target = ltp - (ltp * sl_pct * rr_multiplier)
-
-                    
-                    # Pick Strategy Labels
-                    if rank >= 4 and vol_signal == 'BULL_SPIKE' and ema_signal == 'BUY' and st_dir == 'BUY':
-                        trade_strategy = "PERFECT_BUY"
-                    elif rank <= -4 and vol_signal == 'BEAR_SPIKE' and ema_signal == 'SELL' and st_dir == 'SELL':
-                        trade_strategy = "PERFECT_SELL"
-                    elif st_dir == 'BUY' and dma_data:
-                        # Pullback logic: Check if price is near major DMA (20, 50, or 200)
-                        for dma_val in dma_data.values():
-                            if 0.985 <= (ltp / dma_val) <= 1.015:
-                                trade_strategy = "DMA_BOUNCE"
-                                break
-                    elif st_dir == 'SELL' and dma_data:
-                        # Resistance logic
-                        for dma_val in dma_data.values():
-                            if 0.985 <= (ltp / dma_val) <= 1.015:
-                                trade_strategy = "DMA_RESISTANCE"
-                                break
-
-                    # Last 5 candles visualizer
-                    last_5_candles = None
-                    if len(df) >= 5:
-                        recent_5 = df.iloc[-5:]
-                        candles_list = []
-                        for _, r in recent_5.iterrows():
-                            candles_list.append({
-                                "t": str(r['timestamp']),
-                                "o": float(r['open']),
-                                "h": float(r['high']),
-                                "l": float(r['low']),
-                                "c": float(r['close'])
-                            })
-                        last_5_candles = json.dumps(clean_nan(candles_list))
-
-                    # --- Fundamentals Integration ---
-                    sector = industry = pe = pb = roe = eps = opm = npm = i_group = i_subgroup = None
-                    if settings.get('FUNDAMENTALS', {}).get('enabled'):
-                        f_data = fundamental_map.get(isin, {})
-                        sector = f_data.get('bs_Sector')
-                        industry = f_data.get('bs_IndustryNew')
-                        i_group = f_data.get('bs_IGroup')
-                        i_subgroup = f_data.get('bs_ISubGroup')
-                        
-                        # For Intraday, PE/ROE are not meaningful context - skip them to maintain purity
-                        if profile_id != 'intraday':
-                            pe = to_db_float(f_data.get('bs_PE'))
-                            roe = to_db_float(f_data.get('bs_ROE'))
-                        
-                        pb = to_db_float(f_data.get('bs_PB'))
-                        eps = to_db_float(f_data.get('bs_EPS'))
-                        opm = to_db_float(f_data.get('bs_OPM'))
-                        npm = to_db_float(f_data.get('bs_NPM'))
-
-                    # Get meta flags for signal classification
-                    meta = isin_meta_map.get(isin, {'is_fav': False, 'is_holding': False})
-
-                    signals_to_insert.append((
-                        isin, profile_id, timeframe, timestamp, to_db_float(ltp), to_db_float(rsi_val), 
-                        to_db_float(rsi_day_high), to_db_float(rsi_day_low),
-                        ema_signal, to_db_float(ema_fast), to_db_float(ema_slow), 
-                        vol_signal, to_db_float(vol_ratio),
-                        to_db_float(ema_fast), # Using ema_fast as legacy ema_value
-                        st_dir, to_db_float(st_value), json.dumps(clean_nan(dma_data)), rank,
-                        to_db_float(sl), to_db_float(target), trade_strategy, pattern_str, pattern_score, last_5_candles,
-                        sector, industry, to_db_float(pe), to_db_float(pb), to_db_float(roe), to_db_float(eps), to_db_float(opm), to_db_float(npm),
-                        i_group, i_subgroup,
-                        meta['is_fav'], meta['is_holding']
-                    ))
-                except Exception as e:
-                    logging.error(f"FATAL error processing {isin} ({timeframe}): {e}")
-                    continue
-            
-            # Upsert into database
-            if signals_to_insert:
-                upsert_query = """
-                    INSERT INTO app_sg_calculated_signals 
-                    (isin, profile_id, timeframe, timestamp, ltp, rsi, rsi_day_high, rsi_day_low, 
-                     ema_signal, ema_fast, ema_slow, volume_signal, volume_ratio, ema_value, 
-                     supertrend_dir, supertrend_value, dma_data, confluence_rank, sl, target, 
-                     trade_strategy, candlestick_pattern, pattern_score, last_5_candles,
-                     sector, industry, pe, pb, roe, eps, opm, npm,
-                     i_group, i_subgroup, is_fav, is_holding)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        timestamp=VALUES(timestamp), ltp=VALUES(ltp), rsi=VALUES(rsi), 
-                        rsi_day_high=VALUES(rsi_day_high), rsi_day_low=VALUES(rsi_day_low),
-                        ema_signal=VALUES(ema_signal), ema_fast=VALUES(ema_fast), ema_slow=VALUES(ema_slow),
-                        volume_signal=VALUES(volume_signal), volume_ratio=VALUES(volume_ratio),
-                        ema_value=VALUES(ema_value),
-                        supertrend_dir=VALUES(supertrend_dir), supertrend_value=VALUES(supertrend_value),
-                        dma_data=VALUES(dma_data), confluence_rank=VALUES(confluence_rank),
-                        sl=VALUES(sl), target=VALUES(target), trade_strategy=VALUES(trade_strategy),
-                        candlestick_pattern=VALUES(candlestick_pattern),
-                        pattern_score=VALUES(pattern_score),
-                        last_5_candles=VALUES(last_5_candles),
-                        sector=VALUES(sector), industry=VALUES(industry), pe=VALUES(pe), 
-                        pb=VALUES(pb), roe=VALUES(roe), eps=VALUES(eps), opm=VALUES(opm), npm=VALUES(npm),
-                        i_group=VALUES(i_group), i_subgroup=VALUES(i_subgroup),
-                        is_fav=VALUES(is_fav), is_holding=VALUES(is_holding)
-                """
-                await cur.executemany(upsert_query, signals_to_insert)
-                logging.info(f"✅ Successfully updated {len(signals_to_insert)} signals for {profile_id} ({timeframe}).")
-
-                # --- Signal History Logging ---
-                history_to_insert = []
-                for s in signals_to_insert:
-                    # s[17] is rank
-                    if abs(s[17]) >= 4:
-                        # Extract: isin, profile_id, timeframe, timestamp, ltp, rsi, rank, strategy, sl, target
-                        history_to_insert.append((
-                            s[0], isin_to_symbol.get(s[0]), s[1], s[2], s[3], s[4], s[5], s[17], s[20], s[18], s[19]
-                        ))
-                
-                if history_to_insert:
-                    history_query = """
-                        INSERT IGNORE INTO app_sg_signal_history 
-                        (isin, symbol, profile_id, timeframe, timestamp, ltp, rsi, confluence_rank, trade_strategy, sl, target)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    await cur.executemany(history_query, history_to_insert)
-                    logging.info(f"📜 Logged {len(history_to_insert)} high-conviction signals to history.")
-            
-            return len(signals_to_insert)
+    settings_version = await storage.get_settings_version(profile_id)
+    await storage.save_calc_watermarks([(profile_id, tf, settings_version, run_key, calc_started_at) for tf in timeframes])
+    return counts
+
+# --- Settings Preview ---
+# Board fields compared between the saved and the proposed settings
+PREVIEW_FIELDS = ('rank', 'trade_strategy', 'st_dir', 'ema_signal', 'vol_signal', 'sl', 'target')
+
+def preview_chunk(jobs, current, proposed, profile_id, timeframe, memo_rows=()):
+    """
+    Signals of (isin, bars, live, current dma_data, proposed dma_data, tod_profile) jobs under both
+    settings, on the same bars. Runs in a worker process. Both passes share a memo seeded with the
+    node outputs the last calc run stored (memo_rows), so only nodes whose params differ from a
+    stored output, or whose bars moved since, are computed.
+    Returns ({isin: (current signal, proposed signal)}, memo stats).
+    """
+    memo = NodeMemo(size=len(memo_rows) + 2 * len(NODES) * max(len(jobs), 1))
+    memo.load(timeframe, memo_rows)
+    items = []
+    for isin, bars, live, dma_current, dma_proposed, tod in jobs:
+        try:
+            df = resample_bars(apply_live_candle(to_frame(bars), live), timeframe)
+            if df.empty:
+                continue
+            key = (isin, timeframe)
+            before, after = (apply_baseline(evaluate(df, s, profile_id, key, memo), df, tod, bars['timestamp'][-1], s, timeframe)
+                             for s in (current, proposed))
+            items.append((isin, df, before, dma_current, after, dma_proposed))
+        except Exception as e:
+            logging.warning(f"Error previewing indicators for {isin} ({timeframe}): {e}")
+    before = build_signals([(df, latest, dma) for _, df, latest, dma, _, _ in items], current, profile_id, timeframe)
+    after = build_signals([(df, latest, dma) for _, df, _, _, latest, dma in items], proposed, profile_id, timeframe)
+    return {item[0]: (b, a) for item, b, a in zip(items, before, after)}, memo.stats()
+
+async def preview_settings(pool, datamart_pool, profile_id, timeframe, overrides):
+    """
+    How the signal board of a profile/timeframe would change under `overrides` (settings-row
+    shape, e.g. {'SUPERTREND': {'mult': 2.0}}) before they are saved. Saved and proposed
+    settings are scored on the same freshly loaded bars (the longer of both lookbacks), one
+    chunk per worker-pool task like a calc run.
+    """
+    start = time.perf_counter()
+    storage = as_storage(pool, datamart_pool)
+    current = await get_profile_settings(storage, profile_id)
+    proposed = freeze(deep_merge(current, overrides))
+    snapshot = await universe.get(storage)
+    base_timeframe = get_base_timeframe(timeframe)
+    available = await storage.get_ohlcv_isins(base_timeframe)
+    isins = [c['isin'] for c in snapshot.target_companies(profile_id) if c['isin'] in available]
+
+    limit = max(get_fetch_limit(s, profile_id, timeframe) for s in (current, proposed))
+    sessions = await live_sessions.get(storage, isins) if base_timeframe == '1d' else {}
+    shared_cache = {}
+    dma_current = await get_dma_data(storage, isins, current, shared_cache)
+    dma_proposed = await get_dma_data(storage, isins, proposed, shared_cache)
+    tods = await tod_profiles(storage, isins) if base_timeframe == '5m' else {}
+    ids = sorted(set(node_ids(current, profile_id)) | set(node_ids(proposed, profile_id)))
+
+    async def submit_preview(jobs):
+        memo_rows = await storage.get_node_outputs([j[0] for j in jobs], timeframe, ids) if Config.GRAPH_MEMO_SIZE > 0 else []
+        return await run_in_pool(preview_chunk, jobs, current, proposed, profile_id, timeframe, memo_rows)
+
+    pending = []
+    jobs = []
+    async for isin, bars in iter_latest_bars(storage, isins, base_timeframe, limit):
+        live = None
+        if base_timeframe == '1d' and len(bars['timestamp']):
+            live = live_candle(bars['timestamp'][-1], sessions.get(isin))
+        jobs.append((isin, {c: bars[c] for c in OHLCV_FIELDS}, live, dma_current[isin], dma_proposed[isin], tods.get(isin)))
+        if len(jobs) >= Config.CALC_CHUNK_SIZE:
+            pending.append(submit_preview(jobs))
+            jobs = []
+    if jobs:
+        pending.append(submit_preview(jobs))
+
+    signals = {}
+    memo = {'hits': 0, 'misses': 0}
+    for chunk_signals, stats in await asyncio.gather(*pending):
+        signals.update(chunk_signals)
+        memo['hits'] += stats['hits']
+        memo['misses'] += stats['misses']
+
+    symbols = snapshot.symbol_map()
+    changes = []
+    conviction = {'before': 0, 'after': 0}
+    for isin, pair in signals.items():
+        before, after = ({} if res is None else dict(zip(SIGNAL_FIELDS, res)) for res in pair)
+        for side, res in (('before', before), ('after', after)):
+            if abs(res.get('rank') or 0) >= HISTORY_MIN_RANK:
+                conviction[side] += 1
+        if any(before.get(f) != after.get(f) for f in PREVIEW_FIELDS):
+            entry = {'isin': isin, 'symbol': symbols.get(isin, isin), 'ltp': after.get('ltp', before.get('ltp'))}
+            for f in PREVIEW_FIELDS:
+                entry[f"{f}_before"] = before.get(f)
+                entry[f"{f}_after"] = after.get(f)
+            changes.append(entry)
+    changes.sort(key=lambda e: abs((e['rank_after'] or 0) - (e['rank_before'] or 0)), reverse=True)
+
+    nodes = changed_nodes(current, proposed, profile_id)
+    elapsed = time.perf_counter() - start
+    logging.info(f"🔍 Settings preview {profile_id} ({timeframe}): {len(changes)} of {len(signals)} signals change; "
+                 f"recomputed nodes: {', '.join(nodes) or 'none'} ({elapsed:.2f}s).")
+    return {
+        'profile': profile_id,
+        'timeframe': timeframe,
+        'changed_nodes': nodes,
+        'stocks': len(signals),
+        'changed': len(changes),
+        'high_conviction': conviction,
+        'memo': memo,
+        'seconds': round(elapsed, 3),
+        'changes': clean_nan(changes),
+    }
+
+def build_chart_payload(bars, settings, timeframe, profile_id, bars_count, dma_data, stored_vpvr=None, tod_profile=None):
+    """Pure chart math (resample, indicators, rank estimate and history, VPVR). Runs in a worker process."""
+    df = to_frame(bars)
+    last_ts = df['timestamp'].iloc[-1] if len(df) else None
+    base_timeframe = get_base_timeframe(timeframe)
+    bars = bars_count
+
+    if timeframe != base_timeframe:
+        df.set_index('timestamp', inplace=True)
+        resample_rule = {
+            '1w': 'W-FRI',
+            '1mo': 'ME',
+            '15m': '15min',
+            '30m': '30min',
+            '60m': '60min'
+        }.get(timeframe)
+        
+        resample_kwargs = {}
+        if timeframe in ['15m', '30m', '60m']:
+            resample_kwargs['offset'] = '15min'
+        
+        df = df.resample(resample_rule, **resample_kwargs).agg({
+            'open': 'first',
+            'high': 'max',
+            'low': 'min',
+            'close': 'last',
+            'volume': 'sum'
+        }).dropna()
+        df.reset_index(inplace=True)
+
+    # Calculate Indicators for the enrichment
+    # We use the same calculation engine as the main signal processor for consistency
+    df, latest_meta = calculate_indicators(df, settings, return_df=True, profile_id=profile_id)
+    latest_meta = apply_baseline(latest_meta, df, tod_profile, last_ts, settings, timeframe)
+    
+    # --- Extract meta if any ---
+    pattern_str = None
+    pattern_score = 0
+    p_opts = settings.get('patterns', {})
+    if p_opts.get('enabled') and latest_meta is not None:
+        pattern_str, pattern_score = summarize_patterns(frame_patterns(df), p_opts)
+
+    # --- Confluence Rank Extract ---
+    st_dir = f"{latest_meta.get('ST_dir')}"
+    st_dir = 'BUY' if st_dir == '1' else ('SELL' if st_dir == '-1' else 'Neutral')
+
+    # --- Confluence Rank (same scoring as the calc run) ---
+    calc_rank = score_one(latest_meta, pattern_str, settings, profile_id, timeframe)
+    # Rank of every candle as if it were the latest (rank_history.py)
+    df['rank'] = rank_series(df, settings, profile_id, timeframe)
+
+    # --- DMA ---
+    if settings['DMA']['enabled']:
+        for p in settings['DMA']['periods']:
+            if f"SMA_{p}" in dma_data:
+                df[f"DMA_{p}"] = dma_data[f"SMA_{p}"]
+    
+    # --- VPVR (Volume Profile) ---
+    # "lookback" mode: the profile stored by the calc run (or the same window computed here);
+    # "visible" mode: only the bars on screen (below)
+    vpvr_data = stored_vpvr
+    if vpvr_data is None and Config.VPVR_RANGE_MODE != 'visible':
+        vpvr_data = frame_profile(df)
+
+    # Return requested window
+    df = df.tail(bars).copy()
+    df = df.replace({np.nan: None})
+    
+    # Format and rename columns for frontend compatibility
+    df['t'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    df = df.rename(columns={
+        'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'
+    })
+    
+    if vpvr_data is None:
+        vpvr_data = volume_profile(df['h'].to_numpy(), df['l'].to_numpy(), df['c'].to_numpy(), df['v'].to_numpy())
+
+    # Computed metadata (the caller lets the stored signal record take precedence)
+    signal_meta = {
+        "pattern": pattern_str,
+        "pattern_score": pattern_score,
+        "st_dir": st_dir,
+        "rank": calc_rank,
+        "ltp": float(df['c'].iloc[-1]) if not df.empty else 0
+    }
+    return {
+        "candles": df.to_dict(orient='records'),
+        "vpvr": vpvr_data,
+        "meta": signal_meta
+    }
 
 async def get_enriched_chart_data(app_pool, isin, timeframe, profile_id, bars=30):
     """Calculates full technical indicators for a chart range. Used for zoomed modal charts."""
-    settings = await get_profile_settings(app_pool, profile_id)
+    storage = as_storage(app_pool)
+    settings = await get_profile_settings(storage, profile_id)
     
     # Determine base timeframe and required limit
-    if timeframe in ['1w', '1mo']:
-        base_timeframe = '1d'
-    elif timeframe in ['15m', '30m', '60m']:
-        base_timeframe = '5m'
-    else:
-        base_timeframe = timeframe
+    base_timeframe = get_base_timeframe(timeframe)
 
-    # Define fetch limit based on timeframe (Ensuring 250+ bars)
-    if timeframe == '5m': limit = 1500 # ~15 days
-    elif timeframe in ['15m', '30m', '60m']: limit = 3000 
-    else: limit = 1000 # ~4 years daily
+    # Warmup for the active settings plus the bars on screen
+    limit = get_fetch_limit(settings, profile_id, timeframe, extra=bars)
+    bars_data = await read_ohlcv(storage, isin, base_timeframe, limit=limit)
+    if bars_data is None: return []
     
-    async with app_pool.acquire() as conn:
-        async with conn.cursor(aiomysql.DictCursor) as cur:
-            await cur.execute(
-                """
-                SELECT timestamp, open, high, low, close, volume 
-                FROM app_sg_ohlcv_prices 
-                WHERE isin = %s AND timeframe = %s 
-                ORDER BY timestamp DESC LIMIT %s
-                """,
-                (isin, base_timeframe, limit)
-            )
-            rows = await cur.fetchall()
-            if not rows: return []
-            
-            df = pd.DataFrame(rows)
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df = df.sort_values('timestamp').reset_index(drop=True)
-            df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-            
-            # Resampling Logic (Matches process_profile)
-            if base_timeframe == '1d':
-                rows = await synthesize_live_candle(cur, isin, rows)
-                df = pd.DataFrame(rows)
-                df['timestamp'] = pd.to_datetime(df['timestamp'])
-                df = df.sort_values('timestamp').reset_index(drop=True)
-                df[['open', 'high', 'low', 'close', 'volume']] = df[['open', 'high', 'low', 'close', 'volume']].astype(float)
-            
-            if timeframe != base_timeframe:
-                df.set_index('timestamp', inplace=True)
-                resample_rule = {
-                    '1w': 'W-FRI',
-                    '1mo': 'ME',
-                    '15m': '15min',
-                    '30m': '30min',
-                    '60m': '60min'
-                }.get(timeframe)
-                
-                resample_kwargs = {}
-                if timeframe in ['15m', '30m', '60m']:
-                    resample_kwargs['offset'] = '15min'
-                
-                df = df.resample(resample_rule, **resample_kwargs).agg({
-                    'open': 'first',
-                    'high': 'max',
-                    'low': 'min',
-                    'close': 'last',
-                    'volume': 'sum'
-                }).dropna()
-                df.reset_index(inplace=True)
+    df = to_frame(bars_data)
+    
+    # Resampling Logic (Matches process_profile)
+    if base_timeframe == '1d':
+        df = await synthesize_live_candle(storage, isin, df)
+
+    dma_data = (await get_dma_data(storage, [isin], settings, {}))[isin]
+    tod_profile = (await tod_profiles(storage, [isin])).get(isin) if base_timeframe == '5m' else None
+
+    stored_vpvr = None
+    if Config.VPVR_RANGE_MODE != 'visible':
+        vpvr_row = await storage.get_vpvr(isin, timeframe)
+        if vpvr_row and vpvr_row['bins'] == Config.VPVR_BINS:
+            stored_vpvr = json.loads(vpvr_row['levels_json'])
+
+    # Indicator math runs off the event loop so chart requests don't block the API
+    payload = await run_in_pool(
+        build_chart_payload, {c: df[c].to_numpy() for c in OHLCV_FIELDS},
+        settings, timeframe, profile_id, bars, dma_data, stored_vpvr, tod_profile
+    )
 
-            # Calculate Indicators for the enrichment
-            # We use the same calculation engine as the main signal processor for consistency
-            df, latest_meta = calculate_indicators(df, settings, return_df=True, profile_id=profile_id)
-            
-            # --- Extract meta if any ---
-            pattern_str = None
-            pattern_score = 0
-            p_opts = settings.get('patterns', {})
-            if p_opts.get('enabled') and latest_meta is not None:
-                bullish_patterns = []
-                bearish_patterns = []
-                neutral_patterns = []
-                
-                # Weighting system (Mirrors process_profile)
-                PATTERN_WEIGHTS = {
-                    'CDL_MORNINGSTAR': 3, 'CDL_EVENINGSTAR': 3, 'CDL_3WHITESOLDIERS': 3, 'CDL_3BLACKCROWS': 3, 'CDL_MORNINGDOJISTAR': 3, 'CDL_EVENINGDOJISTAR': 3, 'CDL_3INSIDE': 3, 'CDL_3OUTSIDE': 3,
-                    'CDL_ENGULFING': 2, 'CDL_PIERCING': 2, 'CDL_DARKCLOUDCOVER': 2,
-                    'CDL_HAMMER': 1, 'CDL_INVERTEDHAMMER': 1, 'CDL_SHOOTINGSTAR': 1, 'CDL_DRAGONFLYDOJI': 1, 'CDL_GRAVESTONEDOJI': 1, 'CDL_DOJI': 1
-                }
-
-                # Define strong patterns
-                bull_cols = ['CDL_ENGULFING', 'CDL_HAMMER', 'CDL_MORNINGSTAR', 'CDL_PIERCING', 'CDL_MORNINGDOJISTAR', 'CDL_3WHITESOLDIERS', 'CDL_DRAGONFLYDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
-                bear_cols = ['CDL_ENGULFING', 'CDL_SHOOTINGSTAR', 'CDL_EVENINGSTAR', 'CDL_DARKCLOUDCOVER', 'CDL_EVENINGDOJISTAR', 'CDL_HANGINGMAN', 'CDL_3BLACKCROWS', 'CDL_GRAVESTONEDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
-                neut_cols = ['CDL_DOJI_10_0.1', 'CDL_SPINNINGTOP', 'CDL_HIGHWAVE', 'CDL_RICKSHAWMAN', 'CDL_LONGLEGGEDDOJI', 'CDL_INSIDE', 'CDL_BELTHOLD']
-                
-                for k, v in latest_meta.items():
-                    if not isinstance(k, str) or not k.startswith("CDL_") or pd.isna(v) or v == 0: continue
-                    if abs(v) < 10: continue
-                    
-                    # Update score (Signed)
-                    weight = PATTERN_WEIGHTS.get(k, 1)
-                    if v < 0: weight = -weight
-                    if abs(weight) > abs(pattern_score):
-                        pattern_score = weight
-                    
-                    p_name = k.replace("CDL_", "").split("_")[0].title()
-                    if v > 0:
-                        if k in neut_cols: neutral_patterns.append(p_name)
-                        elif k in bear_cols and k not in bull_cols: bearish_patterns.append(p_name)
-                        else: bullish_patterns.append(p_name)
-                    elif v < 0:
-                        if k in neut_cols: neutral_patterns.append(p_name)
-                        elif k in bull_cols and k not in bear_cols: bullish_patterns.append(p_name)
-                        else: bearish_patterns.append(p_name)
-                
-                active_p = []
-                if p_opts.get('bullish') and bullish_patterns: active_p.append("Bullish " + "/".join(bullish_patterns))
-                if p_opts.get('bearish') and bearish_patterns: active_p.append("Bearish " + "/".join(bearish_patterns))
-                if p_opts.get('neutral') and neutral_patterns: active_p.append("Neutral " + "/".join(neutral_patterns))
-                if active_p: pattern_str = " | ".join(active_p)
-
-            # --- Confluence Rank Extract ---
-            st_dir = f"{latest_meta.get('ST_dir')}"
-            st_dir = 'BUY' if st_dir == '1' else ('SELL' if st_dir == '-1' else 'Neutral')
-
-            # --- Confluence Rank Estimation (Matches process_profile) ---
-            calc_rank = 0
-            rsi_os = settings.get('RSI', {}).get('os', 30)
-            rsi_ob = settings.get('RSI', {}).get('ob', 70)
-            ltp = latest_meta.get('close')
-
-            if profile_id == 'intraday':
-                # A. MTF RSI Exhaustion (5m + 15m + 30m)
-                r5 = latest_meta.get(f"RSI_{settings['RSI']['period']}")
-                r15 = latest_meta.get('RSI_MTF_15')
-                r30 = latest_meta.get('RSI_MTF_30')
-
-                is_ex_buy = (r5 is not None and r5 < rsi_os and r15 is not None and r15 < rsi_os and r30 is not None and r30 < rsi_os)
-                is_ex_sell = (r5 is not None and r5 > rsi_ob and r15 is not None and r15 > rsi_ob and r30 is not None and r30 > rsi_ob)
-                if is_ex_buy: calc_rank += 3
-                elif is_ex_sell: calc_rank -= 3
-                
-                # B. Location (Day Extreme)
-                d_low = latest_meta.get('day_low')
-                d_high = latest_meta.get('day_high')
-                if d_low and ltp and abs(ltp - d_low) / d_low < 0.001: calc_rank += 1
-                if d_high and ltp and abs(ltp - d_high) / d_high < 0.001: calc_rank -= 1
-            else:
-                # --- Swing Points ---
-                r_d = latest_meta.get(f"RSI_{settings['RSI']['period']}")
-                r_w = latest_meta.get('RSI_MTF_W')
-                r_m = latest_meta.get('RSI_MTF_M')
-
-                is_ex_buy = (r_d is not None and r_d < rsi_os and r_w is not None and r_w < rsi_os and r_m is not None and r_m < rsi_os)
-                is_ex_sell = (r_d is not None and r_d > rsi_ob and r_w is not None and r_w > rsi_ob and r_m is not None and r_m > rsi_ob)
-                if is_ex_buy: calc_rank += 3
-                elif is_ex_sell: calc_rank -= 3
-
-                # B. Location (20-bar Extreme)
-                rec_h = latest_meta.get('recent_20_high')
-                rec_l = latest_meta.get('recent_20_low')
-                buffer = 0.05 if timeframe == '1d' else (0.15 if timeframe == '1w' else 0.20)
-                if rec_l and ltp and abs(ltp - rec_l) / rec_l < buffer: calc_rank += 1
-                if rec_h and ltp and abs(ltp - rec_h) / rec_h < buffer: calc_rank -= 1
-
-            # C. Pattern Confirmation (Common - Up to 2 Pts)
-            if pattern_str or latest_meta.get('rev_bull_conf') or latest_meta.get('rev_bear_conf'):
-                # Base Pattern (+1 Pt)
-                if pattern_str:
-                    if "Bullish" in pattern_str: calc_rank += 1
-                    elif "Bearish" in pattern_str: calc_rank -= 1
-                else:
-                    if latest_meta.get('rev_bull_conf'): calc_rank += 1
-                    elif latest_meta.get('rev_bear_conf'): calc_rank -= 1
-
-                # Confirmation Bonus (+1 Pt)
-                small_body_patterns = ['Spinningtop', 'Doji', 'Hammer', 'Star']
-                is_small_body = pattern_str and any(sb in pattern_str for sb in small_body_patterns)
-                is_buy_seq = latest_meta.get('rev_bull_conf')
-                is_sell_seq = latest_meta.get('rev_bear_conf')
-
-                if (calc_rank > 0 and (is_small_body or is_buy_seq)):
-                    calc_rank += 1
-                elif (calc_rank < 0 and (is_small_body or is_sell_seq)):
-                    calc_rank -= 1
-            
-            # --- DMA ---
-            if settings['DMA']['enabled']:
-                await cur.execute(
-                    "SELECT close FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = '1d' ORDER BY timestamp DESC LIMIT 250",
-                    (isin,)
-                )
-                rows_1d = await cur.fetchall()
-                if rows_1d:
-                    df_1d = pd.DataFrame(rows_1d).iloc[::-1].reset_index(drop=True)
-                    df_1d['close'] = df_1d['close'].astype(float)
-                    for p in settings['DMA']['periods']:
-                        if len(df_1d) >= p:
-                            sma_s = ta.sma(df_1d['close'], length=p)
-                            if sma_s is not None and not pd.isna(sma_s.iloc[-1]):
-                                df[f"DMA_{p}"] = float(sma_s.iloc[-1])
-            
-            # Return requested window
-            df = df.tail(bars).copy()
-            df = df.replace({np.nan: None})
-            
-            # Format and rename columns for frontend compatibility
-            df['t'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-            df = df.rename(columns={
-                'open': 'o', 'high': 'h', 'low': 'l', 'close': 'c', 'volume': 'v'
-            })
-            
-            # --- VPVR (Volume Profile) ---
-            vpvr_data = []
-            if not df.empty:
-                prices_min = df['l'].min()
-                prices_max = df['h'].max()
-                num_bins = 24
-                if prices_max > prices_min:
-                    bin_size = (prices_max - prices_min) / num_bins
-                    for i in range(num_bins):
-                        b_start = prices_min + (i * bin_size)
-                        b_end = b_start + bin_size
-                        # Volume in this price range
-                        v = df[(df['c'] >= b_start) & (df['c'] < b_end)]['v'].sum()
-                        vpvr_data.append({
-                            "price": float(round(b_start, 2)),
-                            "volume": float(v)
-                        })
-
-            # --- Finalize Metadata (Database record takes precedence) ---
-            signal_meta = {
-                "pattern": pattern_str,
-                "pattern_score": pattern_score,
-                "st_dir": st_dir,
-                "rank": calc_rank,
-                "ltp": float(df['c'].iloc[-1]) if not df.empty else 0
-            }
-            await cur.execute(
-                "SELECT candlestick_pattern, pattern_score, supertrend_dir, confluence_rank FROM app_sg_calculated_signals WHERE isin = %s AND timeframe = %s AND profile_id = %s",
-                (isin, timeframe, profile_id)
-            )
-            sig_row = await cur.fetchone()
-            if sig_row:
-                signal_meta = {
-                    "pattern": sig_row['candlestick_pattern'] or pattern_str,
-                    "pattern_score": sig_row['pattern_score'] if sig_row['pattern_score'] is not None else pattern_score,
-                    "st_dir": sig_row['supertrend_dir'] or st_dir,
-                    "rank": sig_row['confluence_rank'] if sig_row['confluence_rank'] is not None else calc_rank,
-                    "ltp": float(df['c'].iloc[-1]) if not df.empty else 0
-                }
-
-            return {
-                "candles": df.to_dict(orient='records'),
-                "vpvr": vpvr_data,
-                "meta": signal_meta
-            }
+    # --- Finalize Metadata (Database record takes precedence) ---
+    calc_meta = payload['meta']
+    sig_row = await storage.get_signal_meta(isin, timeframe, profile_id)
+    if sig_row:
+        payload['meta'] = {
+            "pattern": sig_row['candlestick_pattern'] or calc_meta['pattern'],
+            "pattern_score": sig_row['pattern_score'] if sig_row['pattern_score'] is not None else calc_meta['pattern_score'],
+            "st_dir": sig_row['supertrend_dir'] or calc_meta['st_dir'],
+            "rank": sig_row['confluence_rank'] if sig_row['confluence_rank'] is not None else calc_meta['rank'],
+            "ltp": calc_meta['ltp']
+        }
+
+    return payload
+
+# --- Orchestrated Run ---
+def build_pipelines(split_timeframes=False):
+    """
+    Default engine schedule. One pipeline per profile (single multi-timeframe pass), or with
+    split_timeframes one per timeframe, where resampled timeframes wait for their base
+    timeframe so they start with its DMA values already cached.
+    """
+    schedule = [('swing', ['1d', '1w', '1mo']), ('intraday', ['5m', '15m', '30m', '60m'])]
+    if not split_timeframes:
+        return [{'name': profile_id, 'profile_id': profile_id, 'timeframes': tfs, 'after': []} for profile_id, tfs in schedule]
+    pipelines = []
+    for profile_id, tfs in schedule:
+        for tf in tfs:
+            base = get_base_timeframe(tf)
+            after = [f"{profile_id}:{base}"] if base != tf else []
+            pipelines.append({'name': f"{profile_id}:{tf}", 'profile_id': profile_id, 'timeframes': [tf], 'after': after})
+    return pipelines
+
+async def run_pipelines(pipelines, open_storage, parallelism=None, shared_cache=None, engine=None, mode=None):
+    """
+    Runs pipelines ({name, profile_id, timeframes, after}) concurrently, at most `parallelism`
+    at a time, each on the storage returned by `open_storage()` -> (storage, owned).
+    A pipeline starts once everything in its `after` list finished; it is skipped if one failed.
+    Logs per-pipeline wall time and the speedup over running them back to back.
+    Returns {name: {timeframe: count}} (None for failed/skipped pipelines).
+    """
+    parallelism = max(1, parallelism or Config.CALC_PARALLELISM)
+    if shared_cache is None:
+        shared_cache = {}
+    names = set()
+    for p in pipelines:
+        missing = [dep for dep in p.get('after', []) if dep not in names]
+        if missing:
+            raise ValueError(f"Pipeline {p['name']} depends on {missing}, which must be listed before it.")
+        names.add(p['name'])
+
+    gate = asyncio.Semaphore(parallelism)
+    tasks = {}
+    timings = {}
+
+    async def run_one(p):
+        deps = await asyncio.gather(*(tasks[dep] for dep in p.get('after', [])))
+        if any(d is None for d in deps):
+            logging.warning(f"Pipeline {p['name']} skipped: a dependency failed.")
+            return None
+        async with gate:
+            start = time.perf_counter()
+            try:
+                storage, owned = await open_storage()
+                try:
+                    counts = await process_timeframes(storage, None, p['profile_id'], p['timeframes'], shared_cache, engine=engine, mode=mode)
+                finally:
+                    if owned:
+                        await storage.close()
+            except Exception as e:
+                logging.error(f"Pipeline {p['name']} failed: {e}")
+                return None
+            timings[p['name']] = time.perf_counter() - start
+            logging.info(f"⏱️ Pipeline {p['name']} finished in {timings[p['name']]:.2f}s.")
+            return counts if counts is not None else {}
+
+    run_start = time.perf_counter()
+    for p in pipelines:
+        tasks[p['name']] = asyncio.ensure_future(run_one(p))
+    results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    wall = time.perf_counter() - run_start
+
+    # Back-to-back estimate: pipelines timed under contention, so this is an upper bound
+    sequential = sum(timings.values())
+    for name, duration in timings.items():
+        logging.info(f"   {name:<14} {duration:8.2f}s")
+    if wall > 0:
+        logging.info(f"🏁 {len(pipelines)} pipelines (parallelism {parallelism}) in {wall:.2f}s "
+                     f"vs {sequential:.2f}s back to back ({sequential / wall:.1f}x).")
+    return results
 
 async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embedded", type=str, default=None, help="Path to a local DuckDB file to run against instead of MySQL")
+    parser.add_argument("--mirror", action="store_true", help="Snapshot MySQL into the --embedded file before running")
+    parser.add_argument("--parallel", type=int, default=Config.CALC_PARALLELISM, help="Pipelines run at once (1 = sequential)")
+    parser.add_argument("--split-timeframes", action="store_true", help="Run each timeframe as its own pipeline")
+    parser.add_argument("--mode", choices=CALC_MODES, default=Config.CALC_MODE, help="full: every stock; dirty: only stocks whose bars changed since the last run")
+    args = parser.parse_args()
+
     logging.info("Starting Indicator Engine (Testing Phase - Favourites Only)...")
     try:
-        pool = await aiomysql.create_pool(**Config.get_app_db_config())
-        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
+        if args.embedded:
+            storage = EmbeddedStorage(args.embedded)
+            if args.mirror:
+                source = await MySQLStorage.connect()
+                await mirror(source, storage)
+                await source.close()
+        else:
+            storage = await MySQLStorage.connect()
     except Exception as e:
         logging.error(f"Failed to connect to Databases: {e}")
         return
 
-    # Initialize memory caching object
+    async def open_storage():
+        # The embedded file is a single connection; MySQL pipelines each get their own pools
+        # so one pipeline's writes never queue behind another's reads.
+        if args.embedded:
+            return storage, False
+        return await MySQLStorage.connect(), True
+
+    # Initialize memory caching object (shared by all pipelines)
     shared_cache = {}
 
-    # Process Swing Mode (Daily data)
-    await process_profile(pool, datamart_pool, 'swing', '1d', shared_cache)
-    await process_profile(pool, datamart_pool, 'swing', '1w', shared_cache)
-    await process_profile(pool, datamart_pool, 'swing', '1mo', shared_cache)
-    
-    # Process Intraday Mode (5m data)
-    await process_profile(pool, datamart_pool, 'intraday', '5m', shared_cache)
-    await process_profile(pool, datamart_pool, 'intraday', '15m', shared_cache)
-    await process_profile(pool, datamart_pool, 'intraday', '30m', shared_cache)
-    await process_profile(pool, datamart_pool, 'intraday', '60m', shared_cache)
-
-    pool.close()
-    datamart_pool.close()
-    await pool.wait_closed()
-    await datamart_pool.wait_closed()
+    # Swing (daily data, resampled to weekly/monthly) and Intraday (5m data, resampled to
+    # 15m/30m/60m) are independent, so they run side by side
+    await run_pipelines(build_pipelines(args.split_timeframes), open_storage, args.parallel, shared_cache, mode=args.mode)
+
+    await storage.close()
+    shutdown_pool()
     logging.info("Indicator Engine run complete.")
 
 if __name__ == "__main__":
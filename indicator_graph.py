@@ -0,0 +1,301 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import kernels
+import lookback
+from config import Config
+
+# Indicator dependency graph.
+# Every indicator of the latest indicator row is a Node. A node declares the upstream nodes it
+# reads, the settings it depends on (params), the bars it needs to warm up and a function
+# returning its latest values. evaluate() runs the enabled nodes for one frame and merges their
+# outputs into the row signal_fields() and confluence.latest_columns() read (keys starting with
+# "_" stay internal). Called with a key ((isin, timeframe)), each node's output is memoized by
+# (isin, timeframe, node id, data version): the node id hashes the params of the node and its
+# inputs, the data version is a digest of the bars. The calc run persists the outputs it
+# computed (app_sg_node_memo, one row per isin / timeframe / node id) and seeds the memo of the
+# worker that gets a chunk with the stored rows, so whichever process runs the next calc or
+# settings preview, a settings change recomputes only the nodes whose params moved for bars
+# that did not change. changed_nodes() names the nodes up front. lookback.warmup_bars() sizes
+# reads from the node warmups.
+
+# Multi-timeframe RSI buckets per profile (resample rule, latest-row key)
+MTF_RSI_RULES = {'intraday': [('15min', 'RSI_MTF_15'), ('30min', 'RSI_MTF_30')],
+                 'swing': [('W-FRI', 'RSI_MTF_W'), ('ME', 'RSI_MTF_M')]}
+
+class Node:
+    def __init__(self, name, compute, params=None, inputs=(), warmup=None, enabled=None):
+        self.name = name
+        self.compute = compute  # (bars, params, *input outputs) -> {latest-row key: value}
+        self.params = params or (lambda settings, profile_id: ())
+        self.inputs = inputs
+        self.warmup = warmup  # (settings, profile_id, timeframe) -> bars, or None
+        self.enabled = enabled or (lambda settings, profile_id: True)
+
+def _last(series):
+    """Last value of an optional kernel output (None when the series was too short)."""
+    return None if series is None else series.iloc[-1]
+
+# --- Node Functions ---
+def last_bar(bars, params):
+    o, h, l, c, v = bars['ohlcv']
+    return {'timestamp': bars['ts'].iloc[-1], 'open': o[-1], 'high': h[-1], 'low': l[-1], 'close': c[-1], 'volume': v[-1]}
+
+def day_range(bars, params):
+    """Extremes of the latest calendar date; its bars are the tail of the (sorted) series."""
+    _, h, l, _, _ = bars['ohlcv']
+    days = bars['ts'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+    today = int(np.searchsorted(days, days[-1]))
+    with np.errstate(invalid='ignore'):
+        return {'_today': today, 'day_high': np.nanmax(h[today:]), 'day_low': np.nanmin(l[today:])}
+
+def range_20(bars, params):
+    _, h, l, _, _ = bars['ohlcv']
+    n = len(h)
+    return {'recent_20_high': h[-20:].max() if n >= 20 else np.nan, 'recent_20_low': l[-20:].min() if n >= 20 else np.nan}
+
+def rsi(bars, params, day):
+    (length,) = params
+    values = kernels.rsi(bars['close'], length=length)
+    out = {f'RSI_{length}': _last(values), 'RSI_day_high': None, 'RSI_day_low': None}
+    today = None if values is None else values.to_numpy(dtype=float)[day['_today']:]
+    if today is not None and not np.isnan(today).all():
+        out['RSI_day_high'] = np.nanmax(today)
+        out['RSI_day_low'] = np.nanmin(today)
+    return out
+
+def rsi_mtf(bars, params):
+    """RSI of the higher-timeframe buckets the last bar forward-fills from."""
+    length, profile_id = params
+    ts = bars['ts']
+    closes = pd.Series(bars['ohlcv'][3], index=pd.DatetimeIndex(ts), copy=False)
+    out = {}
+    for rule, key in MTF_RSI_RULES[profile_id]:
+        buckets = closes.resample(rule).last().dropna()
+        if buckets.empty:
+            continue
+        values = kernels.rsi(buckets, length=length)
+        if values is not None:
+            pos = buckets.index.searchsorted(ts.iloc[-1], side='right') - 1
+            out[key] = values.iloc[pos] if pos >= 0 else np.nan
+    return out
+
+def ema(bars, params):
+    (length,) = params
+    return {f'EMA_{length}': _last(kernels.ema(bars['close'], length=length))}
+
+def ema_signal(bars, params, fast, slow):
+    fast, slow = fast[f'EMA_{params[0]}'], slow[f'EMA_{params[1]}']
+    return {'ema_signal': None if pd.isna(fast) or pd.isna(slow) else ('BUY' if fast > slow else 'SELL')}
+
+def supertrend(bars, params):
+    length, mult = params
+    st_df = kernels.supertrend(bars['high'], bars['low'], bars['close'], length=length, multiplier=mult)
+    if st_df is None or st_df.empty:
+        return {}
+    return {'ST_value': st_df.iloc[-1, 0], 'ST_dir': st_df.iloc[-1, 1]}
+
+def volume_spike(bars, params):
+    length, threshold = params
+    o, _, _, c, v = bars['ohlcv']
+    vol_sma = v[-length:].mean() if len(v) >= length else np.nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vol_ratio = v[-1] / vol_sma
+    vol_signal = 'NORMAL'
+    if vol_ratio > threshold and c[-1] > o[-1]:
+        vol_signal = 'BULL_SPIKE'
+    elif vol_ratio > threshold and c[-1] < o[-1]:
+        vol_signal = 'BEAR_SPIKE'
+    return {'vol_ratio': vol_ratio, 'vol_signal': vol_signal}
+
+def reversal(bars, params):
+    """3-Candle Reversal Confirmation on the last four bars."""
+    o, _, _, c, _ = bars['ohlcv']
+    green = c[-4:] > o[-4:]
+    red = c[-4:] < o[-4:]
+    n = len(c)
+    return {'rev_bull_conf': bool(n >= 4 and green[3] and red[:3].all()),
+            'rev_bear_conf': bool(n >= 4 and red[3] and green[:3].all())}
+
+def _mtf_warmup(settings, profile_id, timeframe):
+    buckets = lookback.rsi_bars(settings['RSI']['period']) + 1  # the oldest bucket may be partial
+    return max(buckets * span for span in lookback.MTF_SPAN[profile_id](timeframe))
+
+def _on(key):
+    return lambda settings, profile_id: bool(settings.get(key, {}).get('enabled'))
+
+# In dependency order: a node's inputs come before it
+NODES = [
+    Node('last_bar', last_bar),
+    Node('day_range', day_range),
+    Node('range_20', range_20, warmup=lambda s, p, tf: 20, enabled=lambda s, p: p == 'swing'),
+    Node('rsi', rsi, params=lambda s, p: (s['RSI']['period'],), inputs=('day_range',),
+         warmup=lambda s, p, tf: lookback.rsi_bars(s['RSI']['period']), enabled=_on('RSI')),
+    Node('rsi_mtf', rsi_mtf, params=lambda s, p: (s['RSI']['period'], p), warmup=_mtf_warmup,
+         enabled=lambda s, p: _on('RSI')(s, p) and p in MTF_RSI_RULES),
+    Node('ema_fast', ema, params=lambda s, p: (s['EMA']['fast_period'],),
+         warmup=lambda s, p, tf: lookback.ema_bars(s['EMA']['fast_period']), enabled=_on('EMA')),
+    Node('ema_slow', ema, params=lambda s, p: (s['EMA']['slow_period'],),
+         warmup=lambda s, p, tf: lookback.ema_bars(s['EMA']['slow_period']), enabled=_on('EMA')),
+    Node('ema_signal', ema_signal, params=lambda s, p: (s['EMA']['fast_period'], s['EMA']['slow_period']),
+         inputs=('ema_fast', 'ema_slow'), enabled=_on('EMA')),
+    Node('supertrend', supertrend, params=lambda s, p: (s['SUPERTREND']['period'], s['SUPERTREND']['mult']),
+         warmup=lambda s, p, tf: lookback.atr_bars(s['SUPERTREND']['period']), enabled=_on('SUPERTREND')),
+    Node('volume', volume_spike, params=lambda s, p: (s['VOLUME']['period'], s['VOLUME']['threshold']),
+         warmup=lambda s, p, tf: s['VOLUME']['period'], enabled=_on('VOLUME')),
+    Node('reversal', reversal, warmup=lambda s, p, tf: 4),
+]
+
+def plan(settings, profile_id):
+    """[(node, params, memo key)] of the enabled nodes. A key covers the node's params and its inputs' keys."""
+    keys = {}
+    out = []
+    for node in NODES:
+        if not node.enabled(settings, profile_id):
+            continue
+        params = node.params(settings, profile_id)
+        keys[node.name] = (node.name, params, tuple(keys[name] for name in node.inputs))
+        out.append((node, params, keys[node.name]))
+    return out
+
+def warmup(settings, profile_id, timeframe):
+    """Warmup bars of every enabled node."""
+    return [node.warmup(settings, profile_id, timeframe) for node, _, _ in plan(settings, profile_id) if node.warmup]
+
+def changed_nodes(current, proposed, profile_id):
+    """Names of the nodes `proposed` settings would (re)compute or drop compared to `current`."""
+    before = {node.name: key for node, _, key in plan(current, profile_id)}
+    after = {node.name: key for node, _, key in plan(proposed, profile_id)}
+    return [node.name for node in NODES if before.get(node.name) != after.get(node.name)]
+
+def bar_columns(df):
+    """Time-sorted bar columns: Series for the kernels (pandas-ta signatures), arrays for the rest."""
+    ts = df['timestamp']
+    if not pd.api.types.is_datetime64_any_dtype(ts):
+        ts = pd.to_datetime(ts)
+    if not ts.is_monotonic_increasing:
+        order = np.argsort(ts.to_numpy(), kind='stable')
+        df, ts = df.iloc[order], ts.iloc[order]
+    return {
+        'ts': ts,
+        'high': df['high'], 'low': df['low'], 'close': df['close'],
+        'ohlcv': tuple(df[f].to_numpy(dtype=float) for f in ('open', 'high', 'low', 'close', 'volume')),
+    }
+
+def data_version(bars):
+    """Digest (hex) of the bars a frame's nodes read."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(bars['ts'].to_numpy(dtype='datetime64[ns]').tobytes())
+    for values in bars['ohlcv']:
+        digest.update(values.tobytes())
+    return digest.hexdigest()
+
+_node_ids = {}
+
+def node_id(node_key):
+    """Stable 16-char id of a plan() memo key (the same in every process)."""
+    out = _node_ids.get(node_key)
+    if out is None:
+        out = _node_ids[node_key] = hashlib.sha1(repr(node_key).encode()).hexdigest()[:16]
+    return out
+
+def node_ids(settings, profile_id):
+    """Ids of the enabled nodes, for loading their stored outputs."""
+    return [node_id(key) for _, _, key in plan(settings, profile_id)]
+
+def _encode_value(value):
+    if isinstance(value, pd.Timestamp):
+        return {'__ts__': value.value}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store node output of type {type(value).__name__}")
+
+def _decode_object(obj):
+    return pd.Timestamp(obj['__ts__']) if obj.keys() == {'__ts__'} else obj
+
+def encode_output(out):
+    return json.dumps(out, default=_encode_value)
+
+def decode_output(text):
+    """Stored node output; floats come back as NumPy floats like the kernels return them."""
+    return json.loads(text, object_hook=_decode_object, parse_float=np.float64, parse_constant=np.float64)
+
+class NodeMemo:
+    def __init__(self, size=None):
+        self.size = Config.GRAPH_MEMO_SIZE if size is None else size
+        self._entries = OrderedDict()  # (isin, timeframe, node id, data version) -> output, LRU order
+        self._fresh = {}  # entries computed since the last drain(), to be persisted
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            out = self._entries.get(key)
+            if out is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return out
+
+    def put(self, key, out):
+        with self._lock:
+            self._entries[key] = out
+            self._fresh[key] = out
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def load(self, timeframe, rows):
+        """Seeds stored (isin, node id, data version, output_json) rows of a timeframe."""
+        if self.size <= 0:
+            return
+        with self._lock:
+            for isin, nid, version, output_json in rows:
+                key = (isin, timeframe, nid, version)
+                if key not in self._entries:
+                    self._entries[key] = decode_output(output_json)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def drain(self):
+        """app_sg_node_memo rows (isin, timeframe, node id, data version, output_json) computed since the last drain."""
+        with self._lock:
+            fresh, self._fresh = self._fresh, {}
+        return [(isin, timeframe, nid, version, encode_output(out)) for (isin, timeframe, nid, version), out in fresh.items()]
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._fresh.clear()
+
+node_memo = NodeMemo()
+
+def evaluate(df, settings, profile_id, key=None, memo=None):
+    """
+    Latest indicator row of a frame under `settings`. With a key ((isin, timeframe)), node
+    outputs come from / go to `memo` (default: this process's node_memo; off when its size is 0).
+    """
+    memo = node_memo if memo is None else memo
+    bars = bar_columns(df)
+    version = data_version(bars) if key is not None and memo.size > 0 else None
+    outputs = {}
+    row = {}
+    for node, params, node_key in plan(settings, profile_id):
+        out = None
+        if version is not None:
+            memo_key = (*key, node_id(node_key), version)
+            out = memo.get(memo_key)
+        if out is None:
+            out = node.compute(bars, params, *(outputs[name] for name in node.inputs))
+            if version is not None:
+                memo.put(memo_key, out)
+        outputs[node.name] = out
+        row.update((k, v) for k, v in out.items() if not k.startswith('_'))
+    return row
@@ -0,0 +1,284 @@
+import copy
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+
+# Incremental indicator state.
+# Each (isin, timeframe, settings-hash) keeps the recursive state of its indicators
+# (Wilder averages, EMA values, ATR, Supertrend bands/direction, rolling buffers)
+# as of the last *closed* bar. A run only steps the bars that arrived since then,
+# and the still-forming latest bar is applied to a throwaway copy, so every run
+# costs O(new bars) per stock instead of O(history).
+# Stepping a fresh state over a frame reproduces the pandas-ta recurrences used by
+# calculate_indicators, which is also the full-recompute fallback.
+
+STATE_VERSION = 1
+DAY_NS = 86_400_000_000_000
+EPOCH = date(1970, 1, 1)
+NAN = float('nan')
+
+def settings_hash(settings, profile_id):
+    """Stable key for the indicator parameters a state was built with."""
+    keys = ('RSI', 'EMA', 'SUPERTREND', 'ATR', 'VOLUME')
+    payload = {'v': STATE_VERSION, 'profile': profile_id, 'settings': {k: settings.get(k) for k in keys}}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _label(ts, rule):
+    """Resample bucket label (ns) of one bar; scalar twin of panel_engine.bucket_labels."""
+    if rule.endswith('min'):
+        step = int(rule[:-3]) * 60_000_000_000
+        return ts - ts % step
+    day = -(-ts // DAY_NS)
+    if rule == 'W-FRI':
+        return (day + (1 - day) % 7) * DAY_NS
+    d = EPOCH + timedelta(days=day)
+    next_month = date(d.year + d.month // 12, d.month % 12 + 1, 1)
+    return ((next_month - EPOCH).days - 1) * DAY_NS
+
+# --- Recurrences (pandas-ta semantics) ---
+def _rsi_step(st, close, alpha):
+    prev = st['prev']
+    st['prev'] = close
+    if prev is None:
+        return
+    diff = close - prev
+    up = diff if diff > 0 else 0.0
+    down = diff if diff < 0 else 0.0
+    if st['pos'] is None:
+        st['pos'], st['neg'] = up, down
+    else:
+        st['pos'] = (1.0 - alpha) * st['pos'] + alpha * up
+        st['neg'] = (1.0 - alpha) * st['neg'] + alpha * down
+
+def _rsi_value(st):
+    if st['pos'] is None:
+        return NAN
+    denom = st['pos'] + abs(st['neg'])
+    return 100.0 * st['pos'] / denom if denom else NAN
+
+def _seeded_step(st, x, length, alpha):
+    """EMA/RMA seeded with the SMA of the first `length` values (pandas-ta presma)."""
+    if st['value'] is None:
+        st['count'] += 1
+        st['sum'] += x
+        if st['count'] == length:
+            st['value'] = st['sum'] / length
+    else:
+        st['value'] = (1.0 - alpha) * st['value'] + alpha * x
+
+def _atr_step(st, high, low, close, length):
+    pc = st['prev']
+    tr = high - low if pc is None else max(abs(high - low), abs(high - pc), abs(pc - low))
+    st['prev'] = close
+    _seeded_step(st, tr, length, 1.0 / length)
+
+def _push(buf, x, size):
+    buf.append(x)
+    if len(buf) > size:
+        del buf[0]
+
+def _nan(x):
+    return NAN if x is None else x
+
+
+class IndicatorState:
+    """Recursive indicator state for one ISIN/timeframe under one settings hash."""
+
+    def __init__(self, settings, profile_id, data=None):
+        self.settings = settings
+        self.profile_id = profile_id
+        self.s = data or self._fresh()
+
+    def _fresh(self):
+        return {
+            'v': STATE_VERSION, 'n': 0, 'last': None,
+            'day': {'date': None, 'hi': None, 'lo': None, 'rsi_hi': None, 'rsi_lo': None},
+            'rsi': {'prev': None, 'pos': None, 'neg': None},
+            'mtf': {},
+            'ema_fast': {'count': 0, 'sum': 0.0, 'value': None},
+            'ema_slow': {'count': 0, 'sum': 0.0, 'value': None},
+            'atr': {'prev': None, 'count': 0, 'sum': 0.0, 'value': None},
+            'st': {'atr': {'prev': None, 'count': 0, 'sum': 0.0, 'value': None}, 'dir': 1, 'lb': None, 'ub': None},
+            'vol': [], 'hi20': [], 'lo20': [], 'colors': [],
+        }
+
+    @classmethod
+    def load(cls, blob, settings, profile_id):
+        """Restores a persisted state, or None if missing / from another state version."""
+        if not blob:
+            return None
+        data = json.loads(blob)
+        if data.get('v') != STATE_VERSION:
+            return None
+        return cls(settings, profile_id, data)
+
+    def dump(self):
+        return json.dumps(self.s, separators=(',', ':'))
+
+    def copy(self):
+        return IndicatorState(self.settings, self.profile_id, copy.deepcopy(self.s))
+
+    def _mtf_rules(self):
+        if self.profile_id == 'intraday':
+            return [('15min', 'RSI_MTF_15'), ('30min', 'RSI_MTF_30')]
+        if self.profile_id == 'swing':
+            return [('W-FRI', 'RSI_MTF_W'), ('ME', 'RSI_MTF_M')]
+        return []
+
+    # --- Advancing ---
+    def step(self, ts, o, h, l, c, v):
+        """Advances every enabled indicator by one bar."""
+        s, cfg = self.s, self.settings
+        s['n'] += 1
+        s['last'] = [ts, o, h, l, c, v]
+
+        day = s['day']
+        if day['date'] != ts // DAY_NS:
+            day.update({'date': ts // DAY_NS, 'hi': h, 'lo': l, 'rsi_hi': None, 'rsi_lo': None})
+        else:
+            day['hi'], day['lo'] = max(day['hi'], h), min(day['lo'], l)
+
+        if cfg['RSI']['enabled']:
+            length = cfg['RSI']['period']
+            _rsi_step(s['rsi'], c, 1.0 / length)
+            rsi = _rsi_value(s['rsi'])
+            if rsi == rsi:
+                day['rsi_hi'] = rsi if day['rsi_hi'] is None else max(day['rsi_hi'], rsi)
+                day['rsi_lo'] = rsi if day['rsi_lo'] is None else min(day['rsi_lo'], rsi)
+            for rule, key in self._mtf_rules():
+                m = s['mtf'].setdefault(key, {'label': None, 'close': None, 'count': 0, 'rsi': {'prev': None, 'pos': None, 'neg': None}})
+                label = _label(ts, rule)
+                if m['label'] is not None and label != m['label']:
+                    _rsi_step(m['rsi'], m['close'], 1.0 / length)
+                    m['count'] += 1
+                m['label'], m['close'] = label, c
+
+        if cfg['EMA']['enabled']:
+            for key, length in (('ema_fast', cfg['EMA']['fast_period']), ('ema_slow', cfg['EMA']['slow_period'])):
+                _seeded_step(s[key], c, length, 2.0 / (length + 1))
+
+        if cfg.get('ATR', {}).get('enabled'):
+            _atr_step(s['atr'], h, l, c, cfg['ATR']['period'])
+
+        if cfg.get('SUPERTREND', {}).get('enabled'):
+            st = s['st']
+            _atr_step(st['atr'], h, l, c, cfg['SUPERTREND']['period'])
+            atr = st['atr']['value']
+            hl2 = 0.5 * (h + l)
+            lb = hl2 - cfg['SUPERTREND']['mult'] * atr if atr is not None else None
+            ub = hl2 + cfg['SUPERTREND']['mult'] * atr if atr is not None else None
+            if s['n'] > 1:
+                if st['ub'] is not None and c > st['ub']:
+                    st['dir'] = 1
+                elif st['lb'] is not None and c < st['lb']:
+                    st['dir'] = -1
+                else:
+                    if st['dir'] > 0 and lb is not None and st['lb'] is not None and lb < st['lb']:
+                        lb = st['lb']
+                    if st['dir'] < 0 and ub is not None and st['ub'] is not None and ub > st['ub']:
+                        ub = st['ub']
+            st['lb'], st['ub'] = lb, ub
+
+        if cfg.get('VOLUME', {}).get('enabled'):
+            _push(s['vol'], v, cfg['VOLUME']['period'])
+        if self.profile_id == 'swing':
+            _push(s['hi20'], h, 20)
+            _push(s['lo20'], l, 20)
+        _push(s['colors'], 1 if c > o else (-1 if c < o else 0), 4)
+
+    # --- Reading ---
+    def row(self):
+        """Latest indicator row (same keys as calculate_indicators) for the last stepped bar."""
+        s, cfg = self.s, self.settings
+        ts, o, h, l, c, v = s['last']
+        day = s['day']
+        row = {'timestamp': pd.Timestamp(ts), 'open': o, 'high': h, 'low': l, 'close': c, 'volume': v,
+               'day_high': day['hi'], 'day_low': day['lo']}
+        if self.profile_id == 'swing':
+            row['recent_20_high'] = max(s['hi20']) if len(s['hi20']) == 20 else NAN
+            row['recent_20_low'] = min(s['lo20']) if len(s['lo20']) == 20 else NAN
+
+        if cfg['RSI']['enabled']:
+            length = cfg['RSI']['period']
+            row[f'RSI_{length}'] = _rsi_value(s['rsi'])
+            row['RSI_day_high'] = day['rsi_hi']
+            row['RSI_day_low'] = day['rsi_lo']
+            for rule, key in self._mtf_rules():
+                m = s['mtf'][key]
+                if m['count'] + 1 < length + 1:
+                    row[key] = None
+                elif m['label'] <= ts:
+                    cur = dict(m['rsi'])
+                    _rsi_step(cur, m['close'], 1.0 / length)
+                    row[key] = _rsi_value(cur)
+                else:
+                    # pandas reindex(ffill) lands on the previous (closed) bucket
+                    row[key] = _rsi_value(m['rsi']) if m['count'] > 0 else NAN
+
+        if cfg['EMA']['enabled']:
+            fast_len, slow_len = cfg['EMA']['fast_period'], cfg['EMA']['slow_period']
+            fast, slow = _nan(s['ema_fast']['value']), _nan(s['ema_slow']['value'])
+            row[f'EMA_{fast_len}'] = fast
+            row[f'EMA_{slow_len}'] = slow
+            row['ema_signal'] = None if (fast != fast or slow != slow) else ('BUY' if fast > slow else 'SELL')
+
+        if cfg.get('SUPERTREND', {}).get('enabled'):
+            st = s['st']
+            row['ST_value'] = _nan(st['lb'] if st['dir'] > 0 else st['ub'])
+            row['ST_dir'] = float(st['dir'])
+
+        if cfg.get('ATR', {}).get('enabled'):
+            row['ATR_value'] = _nan(s['atr']['value'])
+
+        if cfg.get('VOLUME', {}).get('enabled'):
+            vol_sma = sum(s['vol']) / len(s['vol']) if len(s['vol']) == cfg['VOLUME']['period'] else NAN
+            vol_ratio = (v / vol_sma if vol_sma else (NAN if v == 0 else np.inf)) if vol_sma == vol_sma else NAN
+            spike = vol_ratio > cfg['VOLUME']['threshold']
+            row['vol_sma'] = vol_sma
+            row['vol_ratio'] = vol_ratio
+            row['vol_signal'] = 'BULL_SPIKE' if spike and c > o else ('BEAR_SPIKE' if spike and c < o else 'NORMAL')
+
+        colors = [0] * (4 - len(s['colors'])) + s['colors']
+        row['is_green'] = colors[-1] == 1
+        row['is_red'] = colors[-1] == -1
+        row['rev_bull_conf'] = colors == [-1, -1, -1, 1]
+        row['rev_bear_conf'] = colors == [1, 1, 1, -1]
+        return row
+
+
+def advance(df, settings, profile_id, blob=None):
+    """
+    Brings a persisted state up to date with `df` (ascending, already resampled).
+    The last row is treated as still forming and never committed.
+    Falls back to a full recompute when there is no state or the stored last bar
+    is no longer part of (or differs from) the fetched history.
+    Returns (latest_row, new_blob, recomputed).
+    """
+    ts = df['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    cols = [df[f].to_numpy(dtype=float) for f in ('open', 'high', 'low', 'close', 'volume')]
+    n = len(ts)
+
+    state = IndicatorState.load(blob, settings, profile_id)
+    start = 0
+    if state is not None:
+        last_ts, *last_vals = state.s['last']
+        idx = int(np.searchsorted(ts, last_ts))
+        same = idx < n - 1 and ts[idx] == last_ts and all(
+            abs(col[idx] - val) <= 1e-9 * max(1.0, abs(val)) for col, val in zip(cols, last_vals))
+        if same:
+            start = idx + 1
+        else:
+            state = None
+    recomputed = state is None
+    if recomputed:
+        state = IndicatorState(settings, profile_id)
+
+    o, h, l, c, v = cols
+    for i in range(start, n - 1):
+        state.step(int(ts[i]), float(o[i]), float(h[i]), float(l[i]), float(c[i]), float(v[i]))
+
+    live = state.copy()
+    live.step(int(ts[-1]), float(o[-1]), float(h[-1]), float(l[-1]), float(c[-1]), float(v[-1]))
+    return live.row(), state.dump(), recomputed
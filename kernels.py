@@ -0,0 +1,220 @@
+import sys
+import logging
+import numpy as np
+import pandas as pd
+from config import Config
+
+# Indicator kernels.
+# RSI, EMA, SMA, ATR and Supertrend for the series engine, the chart modal, DMA anchoring and
+# the scenario backtester, on plain float arrays instead of pandas-ta's Series machinery.
+# Formulas reproduce pandas-ta 0.4 (TA-Lib off) step for step, including the pandas
+# ewm(adjust=False) weight arithmetic, so outputs are bit-identical (the numpy backend's SMA
+# differs in the last bits: NumPy and Numba convolve in a different order). check_kernels.py
+# holds the parity checks and micro-benchmarks.
+# Backends (Config.INDICATOR_KERNEL, or use() at runtime):
+#   "numba"     - JIT-compiled loops (falls back to "numpy" when numba is not installed)
+#   "numpy"     - pandas' Cython ewm + a plain-Python Supertrend ratchet
+#   "pandas_ta" - the reference implementation itself (imported only when selected)
+
+BACKENDS = ('numpy', 'numba', 'pandas_ta')
+EPS = sys.float_info.epsilon
+
+_backend = None
+_ta = None
+_nb = {}
+
+def use(name):
+    """Selects the kernel backend for this process. Returns the backend actually in use."""
+    global _backend, _ta
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown indicator kernel '{name}' (expected one of {', '.join(BACKENDS)})")
+    if name == 'numba' and not _nb:
+        try:
+            import numba
+            _nb['ewm'] = numba.njit(cache=True)(_ewm_loop)
+            _nb['supertrend'] = numba.njit(cache=True)(_supertrend_loop)
+            _nb['sma'] = numba.njit(cache=True)(_sma_convolve)
+        except ImportError:
+            logging.warning("numba is not installed; using the numpy indicator kernels.")
+            name = 'numpy'
+    if name == 'pandas_ta' and _ta is None:
+        np.NaN = np.nan  # pandas-ta still references the alias removed in NumPy 2
+        import pandas_ta
+        _ta = pandas_ta
+    _backend = name
+    return name
+
+def backend():
+    if _backend is None:
+        use(Config.INDICATOR_KERNEL)
+    return _backend
+
+# --- Recurrences ---
+def _ewm_loop(x, alpha):
+    """pandas ewm(alpha=alpha, adjust=False).mean(): starts at the first valid value, NaNs keep the last one."""
+    n = len(x)
+    out = np.empty(n)
+    old_wt_factor = 1.0 - alpha
+    old_wt = 1.0
+    weighted = x[0] if n else np.nan
+    for i in range(n):
+        cur = x[i]
+        if i > 0:
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if cur == cur:
+                    if weighted != cur:
+                        weighted = ((old_wt * weighted) + (alpha * cur)) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif cur == cur:
+                weighted = cur
+        out[i] = weighted
+    return out
+
+def _supertrend_loop(close, lb, ub, length):
+    """pandas-ta band ratchet. Mutates lb/ub; returns (trend, direction)."""
+    m = len(close)
+    trend = np.full(m, np.nan)
+    direction = np.ones(m)
+    for i in range(1, m):
+        if close[i] > ub[i - 1]:
+            direction[i] = 1.0
+        elif close[i] < lb[i - 1]:
+            direction[i] = -1.0
+        else:
+            direction[i] = direction[i - 1]
+            if direction[i] > 0 and lb[i] < lb[i - 1]:
+                lb[i] = lb[i - 1]
+            if direction[i] < 0 and ub[i] > ub[i - 1]:
+                ub[i] = ub[i - 1]
+        trend[i] = lb[i] if direction[i] > 0 else ub[i]
+    direction[:length] = np.nan
+    return trend, direction
+
+def _sma_convolve(x, length):
+    """Full-window means (pandas-ta nb_sma); len(x) - length + 1 values."""
+    return np.convolve(np.ones(length) / length, x)[length - 1:1 - length]
+
+def ewm(x, com):
+    """ewm(com=com, adjust=False).mean() of a float array with the selected backend."""
+    if backend() == 'numba':
+        return _nb['ewm'](x, 1.0 / (1.0 + com))
+    return pd.Series(x).ewm(com=com, adjust=False).mean().to_numpy()
+
+def rma(x, length):
+    """Wilder's moving average (alpha = 1/length, expressed as pandas' centre of mass)."""
+    alpha = 1.0 / length
+    return ewm(x, (1.0 - alpha) / alpha)
+
+def rma_step(prev, x, length):
+    """rma() one value further: the average once `x` follows `prev` (element-wise, same weight arithmetic)."""
+    com = (1.0 - 1.0 / length) / (1.0 / length)  # rma()'s centre of mass, converted back as ewm() does
+    alpha = 1.0 / (1.0 + com)
+    old_wt = 1.0 - alpha
+    with np.errstate(invalid='ignore'):
+        step = ((old_wt * prev) + (alpha * x)) / (old_wt + alpha)
+    return np.where(np.isnan(prev), x, np.where(np.isnan(x) | (prev == x), prev, step))
+
+def presma(x, length):
+    """pandas-ta seeding: first length-1 values NaN, value length-1 = mean of the first length."""
+    x = x.copy()
+    seed = np.nanmean(x[:length]) if np.isfinite(x[:length]).any() else np.nan
+    x[:length - 1] = np.nan
+    x[length - 1] = seed
+    return x
+
+# --- Array Kernels ---
+def rsi_averages(close, length):
+    """Wilder averages of the gains and (negative) losses RSI divides."""
+    diff = np.full(len(close), np.nan)
+    diff[1:] = close[1:] - close[:-1]
+    positive = np.where(diff < 0, 0.0, diff)
+    negative = np.where(diff > 0, 0.0, diff)
+    return rma(positive, length), rma(negative, length)
+
+def rsi_from_averages(pos_avg, neg_avg):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 * pos_avg / (pos_avg + np.abs(neg_avg))
+
+def rsi_values(close, length):
+    return rsi_from_averages(*rsi_averages(close, length))
+
+def ema_values(close, length):
+    return ewm(presma(close, length), (length - 1) / 2)
+
+def sma_values(close, length):
+    out = np.full(len(close), np.nan)
+    out[length - 1:] = (_nb['sma'] if backend() == 'numba' else _sma_convolve)(close, length)
+    return out
+
+def true_range_values(high, low, close):
+    hl = high - low
+    if (hl == 0).any():
+        hl = hl + EPS
+    pc = np.full(len(close), np.nan)
+    pc[1:] = close[:-1]
+    return np.fmax(np.fmax(np.abs(hl), np.abs(high - pc)), np.abs(pc - low))
+
+def atr_values(high, low, close, length):
+    tr = true_range_values(high, low, close)
+    if np.isnan(tr).all():
+        return None
+    atr = rma(presma(tr, length), length)
+    return None if np.isnan(atr).all() else atr
+
+def supertrend_values(high, low, close, length, mult):
+    atr = atr_values(high, low, close, length)
+    if atr is None:
+        return None
+    matr = mult * atr
+    hl2 = 0.5 * (high + low)
+    lb, ub = hl2 - matr, hl2 + matr
+    if backend() == 'numba':
+        return _nb['supertrend'](close, lb, ub, length)
+    return _supertrend_loop(close.tolist(), lb.tolist(), ub.tolist(), length)
+
+# --- Series API (pandas-ta call signatures; None when the series is too short) ---
+def _floats(s):
+    return s.to_numpy(dtype=float)
+
+def rsi(close, length):
+    if backend() == 'pandas_ta':
+        return _ta.rsi(close, length=length)
+    if len(close) < length + 1:
+        return None
+    return pd.Series(rsi_values(_floats(close), length), index=close.index, name=f"RSI_{length}")
+
+def ema(close, length):
+    if backend() == 'pandas_ta':
+        return _ta.ema(close, length=length)
+    if len(close) < length:
+        return None
+    return pd.Series(ema_values(_floats(close), length), index=close.index, name=f"EMA_{length}")
+
+def sma(close, length):
+    if backend() == 'pandas_ta':
+        return _ta.sma(close, length=length)
+    if len(close) < length:
+        return None
+    return pd.Series(sma_values(_floats(close), length), index=close.index, name=f"SMA_{length}")
+
+def atr(high, low, close, length):
+    if backend() == 'pandas_ta':
+        return _ta.atr(high, low, close, length=length)
+    if len(close) < length + 1:
+        return None
+    values = atr_values(_floats(high), _floats(low), _floats(close), length)
+    return None if values is None else pd.Series(values, index=close.index, name=f"ATRr_{length}")
+
+def supertrend(high, low, close, length, multiplier):
+    """DataFrame of [trend, direction] (pandas-ta's first two columns, same positions)."""
+    if backend() == 'pandas_ta':
+        return _ta.supertrend(high, low, close, length=length, multiplier=multiplier)
+    if len(close) < length + 1:
+        return None
+    values = supertrend_values(_floats(high), _floats(low), _floats(close), length, multiplier)
+    if values is None:
+        return None
+    trend, direction = values
+    props = f"_{length}_{multiplier}"
+    return pd.DataFrame({f"SUPERT{props}": trend, f"SUPERTd{props}": direction}, index=close.index)
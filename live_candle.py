@@ -0,0 +1,65 @@
+import time
+import pandas as pd
+from config import Config
+
+# Live daily candle.
+# When the 5m series runs ahead of the daily one (the session in progress, or a day the daily
+# fetch has not caught up with yet), daily frames get a candle synthesized from the latest 5m
+# session. Sessions for a whole batch of ISINs come from one grouped query
+# (storage.fetch_live_sessions) and are cached per database for LIVE_SESSION_TTL seconds, so
+# the 1d/1w/1mo passes of a calc run and the chart modal share one read. Writers of 5m bars
+# in this process call live_sessions.invalidate().
+
+def live_candle(last_daily_ts, session):
+    """
+    (drop_last, live_candle) for apply_live_candle(), or None when the daily series is current.
+    drop_last: the last daily bar is the same day as the session and is replaced.
+    """
+    if session is None or last_daily_ts is None:
+        return None
+    last_daily_ts = pd.Timestamp(last_daily_ts)
+    last_5m_ts = pd.Timestamp(session['last_ts'])
+    if last_5m_ts <= last_daily_ts:
+        return None
+    return last_5m_ts.date() == last_daily_ts.date(), {
+        'timestamp': last_5m_ts.normalize(),
+        'open': float(session['open']),
+        'high': float(session['high']),
+        'low': float(session['low']),
+        'close': float(session['close']),
+        'volume': float(session['volume'])
+    }
+
+def apply_live_candle(df, live):
+    """Applies a live_candle() result to a daily frame."""
+    if not live:
+        return df
+    drop_last, candle = live
+    if drop_last:
+        df = df.iloc[:-1]
+    if candle:
+        df = pd.concat([df, pd.DataFrame([candle])], ignore_index=True)
+    return df
+
+class LiveSessions:
+    def __init__(self, ttl=None):
+        self.ttl = Config.LIVE_SESSION_TTL if ttl is None else ttl
+        self._sessions = {}  # storage.source_key -> {isin: (monotonic load time, session or None)}
+
+    async def get(self, storage, isins):
+        """{isin: session or None}; ISINs not cached (or expired) are loaded in batched queries."""
+        cache = self._sessions.setdefault(storage.source_key, {})
+        now = time.monotonic()
+        missing = [i for i in dict.fromkeys(isins) if i not in cache or now - cache[i][0] >= self.ttl]
+        for k in range(0, len(missing), Config.OHLCV_BATCH_SIZE):
+            batch = missing[k:k + Config.OHLCV_BATCH_SIZE]
+            loaded = await storage.fetch_live_sessions(batch, '5m')
+            for isin in batch:
+                cache[isin] = (now, loaded.get(isin))
+        return {isin: cache[isin][1] for isin in isins}
+
+    def invalidate(self):
+        """Change signal: the next get() reloads."""
+        self._sessions.clear()
+
+live_sessions = LiveSessions()
@@ -0,0 +1,59 @@
+import math
+import indicator_graph
+from config import Config
+from patterns import pattern_window
+
+# Warmup-aware lookback sizing.
+# Every loader asks the planner how many bars to read instead of using fixed limits. The
+# count comes from the warmups of the enabled indicator_graph nodes: recursive indicators
+# (Wilder RSI/ATR, EMA) are read until their seed's weight has decayed below
+# WARMUP_TOLERANCE, windowed ones (volume SMA, 20-bar range, patterns) need their window,
+# and MTF RSI needs its own warmup in higher-timeframe buckets, converted back to bars of
+# the signal timeframe.
+# The volume profile is not a warmup: it covers up to VPVR_LOOKBACK bars of what is loaded.
+
+# Upper bounds of base bars per bar of a timeframe (75 five-minute bars make 7 sixty-minute
+# buckets a session; a month holds at most 23 trading days)
+BASE_BARS = {'5m': 1, '15m': 3, '30m': 6, '60m': 12, '1d': 1, '1w': 5, '1mo': 23}
+MINUTES = {'5m': 5, '15m': 15, '30m': 30, '60m': 60}
+# MTF RSI buckets per profile, as bars of the signal timeframe each bucket spans at most
+MTF_SPAN = {
+    'intraday': lambda tf: [max(1, math.ceil(m / MINUTES.get(tf, m))) for m in (15, 30)],
+    'swing': lambda tf: {'1d': [5, 23], '1w': [1, 5]}.get(tf, [1, 1]),
+}
+SESSION_BARS = 75  # 5m bars per trading session
+
+def ewm_warmup(alpha, tolerance=None):
+    """Steps until a recursive average's seed weighs less than `tolerance`."""
+    tolerance = tolerance or Config.WARMUP_TOLERANCE
+    return math.ceil(math.log(tolerance) / math.log(1.0 - alpha))
+
+def rsi_bars(period):
+    return max(period + 1, 1 + ewm_warmup(1.0 / period))
+
+def ema_bars(period):
+    return period + ewm_warmup(2.0 / (period + 1))
+
+def atr_bars(period):
+    """ATR (and Supertrend, whose bands ride on it)."""
+    return max(period + 1, period + ewm_warmup(1.0 / period))
+
+def warmup_bars(settings, profile_id, timeframe):
+    """Bars of `timeframe` the signal needs for stable latest values."""
+    need = [5, 20, Config.RS_LOOKBACK + 1]  # last-5 candles, 20-bar range, return over RS_LOOKBACK
+    need += indicator_graph.warmup(settings, profile_id, timeframe)
+    if settings.get('ATR', {}).get('enabled'):
+        need.append(atr_bars(settings['ATR']['period']))  # ATR column of the chart frame
+    if settings.get('patterns', {}).get('enabled'):
+        need.append(pattern_window())
+    return max(need)
+
+def fetch_limit(settings, profile_id, timeframe, base_timeframe, extra=0):
+    """Base-timeframe bars to read for `timeframe` signals (+ `extra` displayed bars, + the forming bar)."""
+    per_bar = BASE_BARS[timeframe] // BASE_BARS[base_timeframe]
+    return (warmup_bars(settings, profile_id, timeframe) + extra + 1) * per_bar
+
+def warmup_days(base_bars, base_timeframe):
+    """Calendar days that hold `base_bars` bars (weekends plus ~10% holidays)."""
+    sessions = math.ceil(base_bars / SESSION_BARS) if base_timeframe in MINUTES else base_bars
+    return math.ceil(sessions * 7 / 5 * 1.1) + 5
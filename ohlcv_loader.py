@@ -0,0 +1,62 @@
+import asyncio
+import numpy as np
+import pandas as pd
+from config import Config
+
+OHLCV_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+def _columns(block):
+    """Turns an ascending (n, 7) block into contiguous per-field arrays."""
+    cols = np.ascontiguousarray(block[:, 1:].T)
+    arrays = {'timestamp': cols[0].astype(np.int64).astype('datetime64[s]').astype('datetime64[ns]')}
+    for name, col in zip(OHLCV_FIELDS[1:], cols[1:]):
+        arrays[name] = col
+    return arrays
+
+def split_by_isin(matrix, isins):
+    """
+    Splits a storage OHLCV matrix into per-ISIN column arrays sorted oldest-first,
+    using one sort and one split for the whole batch (no per-row Python objects).
+    """
+    if matrix.size == 0:
+        return {}
+    order = np.lexsort((matrix[:, 1], matrix[:, 0]))
+    matrix = matrix[order]
+    positions, starts = np.unique(matrix[:, 0].astype(np.int64), return_index=True)
+    blocks = np.split(matrix, starts[1:])
+    return {isins[pos]: _columns(block) for pos, block in zip(positions, blocks)}
+
+def to_frame(arrays):
+    """DataFrame view over loader arrays (columns are not copied)."""
+    return pd.DataFrame(arrays, copy=False)
+
+async def read_ohlcv(storage, isin, timeframe, limit=None, start=None, end=None):
+    """Single-ISIN fast read as ascending column arrays, or None if there are no bars."""
+    matrix = await storage.fetch_ohlcv_matrix([isin], timeframe, limit=limit, start=start, end=end)
+    return split_by_isin(matrix, [isin]).get(isin)
+
+async def load_latest_bars(storage, isins, timeframe, limit):
+    """Latest `limit` bars for a batch of ISINs as {isin: {column: ndarray}}."""
+    isins = list(isins)
+    matrix = await storage.fetch_ohlcv_matrix(isins, timeframe, limit=limit)
+    return split_by_isin(matrix, isins)
+
+async def iter_latest_bars(storage, isins, timeframe, limit, chunk_size=None):
+    """
+    Yields (isin, arrays) for every ISIN that has bars, loading in chunks of
+    `chunk_size` ISINs. The next chunk is requested while the caller works on
+    the current one, so DB time overlaps with indicator math.
+    """
+    chunk_size = chunk_size or Config.OHLCV_BATCH_SIZE
+    chunks = [isins[i:i + chunk_size] for i in range(0, len(isins), chunk_size)]
+    if not chunks:
+        return
+    pending = asyncio.ensure_future(load_latest_bars(storage, chunks[0], timeframe, limit))
+    for idx, chunk in enumerate(chunks):
+        batch = await pending
+        if idx + 1 < len(chunks):
+            pending = asyncio.ensure_future(load_latest_bars(storage, chunks[idx + 1], timeframe, limit))
+        for isin in chunk:
+            arrays = batch.get(isin)
+            if arrays is not None:
+                yield isin, arrays
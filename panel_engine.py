@@ -0,0 +1,248 @@
+import numpy as np
+import pandas as pd
+
+# Cross-sectional indicator engine.
+# The whole chunk of ISINs is laid out as right-aligned (time x isin) panels: row -1
+# is every stock's latest bar and shorter histories are padded with NaN at the top.
+# Recursive indicators then advance one row at a time for all stocks at once, which
+# removes the per-ISIN pandas overhead that dominates on short series.
+# Formulas mirror pandas-ta (rma/presma EMA/ATR/Supertrend) so the latest row matches
+# calculate_indicators.
+
+DAY_NS = 86_400_000_000_000
+PANEL_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+# --- Panel Construction ---
+def build_panel(frames):
+    """Right-aligns a list of ascending OHLCV frames into (T, N) arrays. Returns (panel, lengths)."""
+    lengths = np.array([len(f) for f in frames], dtype=np.int64)
+    T, N = int(lengths.max()), len(frames)
+    panel = {f: np.full((T, N), np.nan) for f in PANEL_FIELDS[1:]}
+    panel['timestamp'] = np.full((T, N), np.iinfo(np.int64).min, dtype=np.int64)
+    for j, frame in enumerate(frames):
+        start = T - lengths[j]
+        panel['timestamp'][start:, j] = frame['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+        for f in PANEL_FIELDS[1:]:
+            panel[f][start:, j] = frame[f].to_numpy(dtype=float)
+    return panel, lengths
+
+def _compress(values, keep, labels):
+    """
+    Keeps the rows flagged in `keep` per column and right-aligns them again.
+    Used to collapse bars into higher-timeframe buckets (last close per bucket).
+    """
+    counts = keep.sum(axis=0)
+    M, N = max(int(counts.max()), 1), keep.shape[1]
+    out = np.full((M, N), np.nan)
+    out_labels = np.full((M, N), np.iinfo(np.int64).max, dtype=np.int64)
+    cols, rows = np.nonzero(keep.T)
+    col_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    target = M - counts[cols] + (np.arange(len(cols)) - col_starts[cols])
+    out[target, cols] = values[rows, cols]
+    out_labels[target, cols] = labels[rows, cols]
+    return out, out_labels, counts
+
+# --- Column-wise Kernels ---
+def ewm_panel(x, alpha):
+    """pandas ewm(alpha, adjust=False) per column; each column starts at its first valid value."""
+    out = np.empty_like(x)
+    prev = np.full(x.shape[1], np.nan)
+    for t in range(x.shape[0]):
+        xt = x[t]
+        prev = np.where(np.isnan(prev), xt, (1.0 - alpha) * prev + alpha * xt)
+        out[t] = prev
+    return out
+
+def _presma(x, lengths, n):
+    """pandas-ta `presma`: first n-1 values NaN, value n-1 replaced by the mean of the first n."""
+    T = x.shape[0]
+    start = T - lengths
+    rows = np.arange(T)[:, None]
+    seed_row = start + n - 1
+    window = (rows >= start) & (rows <= seed_row)
+    seed = np.where(window, np.nan_to_num(x), 0.0).sum(axis=0) / n
+    out = np.where(rows < seed_row, np.nan, x)
+    cols = np.arange(x.shape[1])
+    out[seed_row, cols] = seed
+    return out
+
+def rsi_panel(close, length):
+    """Wilder RSI for every column (full history, needed for day extremes / MTF)."""
+    diff = np.full_like(close, np.nan)
+    diff[1:] = close[1:] - close[:-1]
+    pos = np.where(diff < 0, 0.0, diff)
+    neg = np.where(diff > 0, 0.0, diff)
+    pos_avg = ewm_panel(pos, 1.0 / length)
+    neg_avg = ewm_panel(neg, 1.0 / length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 * pos_avg / (pos_avg + np.abs(neg_avg))
+
+def ema_latest(close, lengths, length):
+    """Latest EMA per column (SMA-seeded, span=length)."""
+    return ewm_panel(_presma(close, lengths, length), 2.0 / (length + 1))[-1]
+
+def atr_panel(high, low, close, lengths, length):
+    """Wilder ATR per column (true range -> presma -> rma)."""
+    hl = high - low
+    hl = hl + np.where(np.any(hl == 0, axis=0), np.finfo(float).eps, 0.0)
+    pc = np.full_like(close, np.nan)
+    pc[1:] = close[:-1]
+    tr = np.fmax(np.fmax(np.abs(hl), np.abs(high - pc)), np.abs(pc - low))
+    return ewm_panel(_presma(tr, lengths, length), 1.0 / length)
+
+def supertrend_latest(high, low, close, lengths, length, mult):
+    """Latest Supertrend value/direction per column, with the pandas-ta band ratchet."""
+    matr = mult * atr_panel(high, low, close, lengths, length)
+    hl2 = 0.5 * (high + low)
+    lb, ub = hl2 - matr, hl2 + matr
+    direction = np.ones(close.shape[1])
+    lb_prev, ub_prev = lb[0], ub[0]
+    for t in range(1, close.shape[0]):
+        c = close[t]
+        up = c > ub_prev
+        down = ~up & (c < lb_prev)
+        carry = ~up & ~down
+        direction = np.where(up, 1.0, np.where(down, -1.0, direction))
+        lb_t = np.where(carry & (direction > 0) & (lb[t] < lb_prev), lb_prev, lb[t])
+        ub_t = np.where(carry & (direction < 0) & (ub[t] > ub_prev), ub_prev, ub[t])
+        lb_prev, ub_prev = lb_t, ub_t
+    value = np.where(direction > 0, lb_prev, ub_prev)
+    return value, direction
+
+def rolling_latest(x, lengths, window, func):
+    """Latest value of a full rolling window (NaN when the column is shorter than the window)."""
+    res = func(x[-window:], axis=0)
+    return np.where(lengths >= window, res, np.nan)
+
+# --- Multi-Timeframe RSI ---
+def bucket_labels(ts, rule):
+    """Resample bucket label (ns) per bar, matching pandas resample() for the rules used here."""
+    if rule.endswith('min'):
+        step = int(rule[:-3]) * 60_000_000_000
+        return ts - ts % step
+    day = -(-ts // DAY_NS)  # bins are closed on the right for W-FRI / ME
+    if rule == 'W-FRI':
+        return (day + (1 - day) % 7) * DAY_NS
+    month = day.astype('datetime64[D]').astype('datetime64[M]')
+    return ((month + 1).astype('datetime64[D]') - np.timedelta64(1, 'D')).astype('datetime64[ns]').astype(np.int64)
+
+def mtf_rsi_latest(panel, lengths, rule, length):
+    """
+    RSI of the resampled closes, forward-filled onto each column's latest bar
+    (what calculate_indicators gets from resample -> rsi -> reindex(ffill)).
+    Returns None for columns with too few buckets (pandas-ta returns no series).
+    """
+    ts, close = panel['timestamp'], panel['close']
+    T = ts.shape[0]
+    valid = np.arange(T)[:, None] >= (T - lengths)
+    labels = np.where(valid, bucket_labels(np.where(valid, ts, ts[-1]), rule), np.iinfo(np.int64).max)
+    is_last = valid.copy()
+    is_last[:-1] &= labels[:-1] != labels[1:]
+    res_close, res_labels, counts = _compress(close, is_last, labels)
+    rsi = rsi_panel(res_close, length)
+    M = res_close.shape[0]
+    n_le = (res_labels <= ts[-1]).sum(axis=0)
+    out = []
+    for j in range(close.shape[1]):
+        if counts[j] < length + 1:
+            out.append(None)
+        elif n_le[j] == 0:
+            out.append(np.nan)
+        else:
+            out.append(rsi[M - counts[j] + n_le[j] - 1, j])
+    return out
+
+# --- Latest Rows ---
+def min_bars(settings):
+    """Shortest history the panel path reproduces exactly; shorter series use calculate_indicators."""
+    need = [1]
+    if settings['RSI']['enabled']:
+        need.append(settings['RSI']['period'] + 1)
+    if settings['EMA']['enabled']:
+        need += [settings['EMA']['fast_period'], settings['EMA']['slow_period']]
+    if settings.get('SUPERTREND', {}).get('enabled'):
+        need.append(settings['SUPERTREND']['period'] + 1)
+    if settings.get('ATR', {}).get('enabled'):
+        need.append(settings['ATR']['period'] + 1)
+    return max(need)
+
+def latest_rows(frames, settings, profile_id='swing'):
+    """
+    Latest indicator row (dict, same keys as calculate_indicators) for each frame.
+    Every frame must have at least min_bars(settings) rows.
+    """
+    panel, lengths = build_panel(frames)
+    T, N = panel['close'].shape
+    o, h, l, c, v, ts = (panel[f] for f in ('open', 'high', 'low', 'close', 'volume', 'timestamp'))
+    valid = np.arange(T)[:, None] >= (T - lengths)
+    cols = {f: list(panel[f][-1]) for f in PANEL_FIELDS[1:]}
+
+    # Day extremes (bars on the latest calendar date)
+    day_mask = valid & ((ts // DAY_NS) == (ts[-1] // DAY_NS))
+    with np.errstate(invalid='ignore'):
+        cols['day_high'] = list(np.nanmax(np.where(day_mask, h, np.nan), axis=0))
+        cols['day_low'] = list(np.nanmin(np.where(day_mask, l, np.nan), axis=0))
+    if profile_id == 'swing':
+        cols['recent_20_high'] = list(rolling_latest(h, lengths, 20, np.max))
+        cols['recent_20_low'] = list(rolling_latest(l, lengths, 20, np.min))
+
+    if settings['RSI']['enabled']:
+        rsi_len = settings['RSI']['period']
+        rsi = rsi_panel(c, rsi_len)
+        cols[f'RSI_{rsi_len}'] = list(rsi[-1])
+        today = np.where(day_mask, rsi, np.nan)
+        has_today = ~np.all(np.isnan(today), axis=0)
+        with np.errstate(invalid='ignore'):
+            hi, lo = np.nanmax(today, axis=0), np.nanmin(today, axis=0)
+        cols['RSI_day_high'] = [x if ok else None for x, ok in zip(hi, has_today)]
+        cols['RSI_day_low'] = [x if ok else None for x, ok in zip(lo, has_today)]
+        if profile_id == 'intraday':
+            mtf = [('15min', 'RSI_MTF_15'), ('30min', 'RSI_MTF_30')]
+        elif profile_id == 'swing':
+            mtf = [('W-FRI', 'RSI_MTF_W'), ('ME', 'RSI_MTF_M')]
+        else:
+            mtf = []
+        for rule, key in mtf:
+            cols[key] = mtf_rsi_latest(panel, lengths, rule, rsi_len)
+
+    if settings['EMA']['enabled']:
+        fast_len = settings['EMA']['fast_period']
+        slow_len = settings['EMA']['slow_period']
+        fast = ema_latest(c, lengths, fast_len)
+        slow = ema_latest(c, lengths, slow_len)
+        cols[f'EMA_{fast_len}'] = list(fast)
+        cols[f'EMA_{slow_len}'] = list(slow)
+        cols['ema_signal'] = [None if (np.isnan(f) or np.isnan(s)) else ('BUY' if f > s else 'SELL') for f, s in zip(fast, slow)]
+
+    if settings.get('SUPERTREND', {}).get('enabled'):
+        st_val, st_dir = supertrend_latest(h, l, c, lengths, settings['SUPERTREND']['period'], settings['SUPERTREND']['mult'])
+        cols['ST_value'] = list(st_val)
+        cols['ST_dir'] = list(st_dir)
+
+    if settings.get('ATR', {}).get('enabled'):
+        cols['ATR_value'] = list(atr_panel(h, l, c, lengths, settings['ATR']['period'])[-1])
+
+    if settings.get('VOLUME', {}).get('enabled'):
+        vol_sma = rolling_latest(v, lengths, settings['VOLUME']['period'], np.mean)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vol_ratio = v[-1] / vol_sma
+        spike = vol_ratio > settings['VOLUME']['threshold']
+        cols['vol_sma'] = list(vol_sma)
+        cols['vol_ratio'] = list(vol_ratio)
+        cols['vol_signal'] = np.where(spike & (c[-1] > o[-1]), 'BULL_SPIKE', np.where(spike & (c[-1] < o[-1]), 'BEAR_SPIKE', 'NORMAL')).tolist()
+
+    # 3-Candle Reversal Confirmation on the last four bars (missing bars count as False)
+    green = valid & (c > o)
+    red = valid & (c < o)
+    cols['is_green'] = list(green[-1])
+    cols['is_red'] = list(red[-1])
+    cols['rev_bull_conf'] = list(green[-1] & red[-2] & red[-3] & red[-4]) if T >= 4 else [False] * N
+    cols['rev_bear_conf'] = list(red[-1] & green[-2] & green[-3] & green[-4]) if T >= 4 else [False] * N
+
+    rows = []
+    for j in range(N):
+        row = {key: values[j] for key, values in cols.items()}
+        row['timestamp'] = pd.Timestamp(ts[-1, j])
+        rows.append(row)
+
+    return rows
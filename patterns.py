@@ -0,0 +1,199 @@
+import numpy as np
+np.NaN = np.nan  # pandas-ta compatibility with NumPy 2.0+
+from numpy.lib.stride_tricks import sliding_window_view
+from pandas_ta.candle.cdl_pattern import ALL_PATTERNS
+
+try:
+    import talib
+except ImportError:
+    talib = None
+
+# Candlestick pattern subsystem.
+# Only the patterns the confluence logic actually classifies are evaluated (unlisted TA-Lib
+# patterns no longer count towards pattern_str or the rank), each over
+# just the trailing bars its definition needs, and the result is a small
+# {CDL_NAME: value} dict of hits for the latest bar (no per-pattern columns).
+# pattern_series() labels every bar instead (the rank history): each pattern runs once over the
+# whole series and only the bars with a hit are summarized.
+
+BULLISH_COLS = ['CDL_ENGULFING', 'CDL_HAMMER', 'CDL_MORNINGSTAR', 'CDL_PIERCING', 'CDL_MORNINGDOJISTAR', 'CDL_3WHITESOLDIERS', 'CDL_DRAGONFLYDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
+BEARISH_COLS = ['CDL_ENGULFING', 'CDL_SHOOTINGSTAR', 'CDL_EVENINGSTAR', 'CDL_DARKCLOUDCOVER', 'CDL_EVENINGDOJISTAR', 'CDL_HANGINGMAN', 'CDL_3BLACKCROWS', 'CDL_GRAVESTONEDOJI', 'CDL_3INSIDE', 'CDL_3OUTSIDE']
+NEUTRAL_COLS = ['CDL_DOJI_10_0.1', 'CDL_SPINNINGTOP', 'CDL_HIGHWAVE', 'CDL_RICKSHAWMAN', 'CDL_LONGLEGGEDDOJI', 'CDL_INSIDE', 'CDL_BELTHOLD']
+
+# Pattern intensity scoring
+PATTERN_WEIGHTS = {
+    'CDL_MORNINGSTAR': 3, 'CDL_EVENINGSTAR': 3, 'CDL_3WHITESOLDIERS': 3, 'CDL_3BLACKCROWS': 3, 'CDL_MORNINGDOJISTAR': 3, 'CDL_EVENINGDOJISTAR': 3, 'CDL_3INSIDE': 3, 'CDL_3OUTSIDE': 3,
+    'CDL_ENGULFING': 2, 'CDL_PIERCING': 2, 'CDL_DARKCLOUDCOVER': 2,
+    'CDL_HAMMER': 1, 'CDL_INVERTEDHAMMER': 1, 'CDL_SHOOTINGSTAR': 1, 'CDL_DRAGONFLYDOJI': 1, 'CDL_GRAVESTONEDOJI': 1, 'CDL_DOJI': 1
+}
+
+DOJI_LENGTH = 10
+DOJI_FACTOR = 0.1
+
+def _column_name(name):
+    """Output name pandas-ta gives a pattern in cdl_pattern()."""
+    if name == 'doji':
+        return f"CDL_DOJI_{DOJI_LENGTH}_{DOJI_FACTOR}"
+    return f"CDL_{name.upper()}"
+
+# Evaluated set: every classified/weighted pattern, in pandas-ta order (keeps labels stable)
+_WANTED = set(BULLISH_COLS) | set(BEARISH_COLS) | set(NEUTRAL_COLS) | set(PATTERN_WEIGHTS)
+PATTERNS = [(n, _column_name(n)) for n in ALL_PATTERNS if _column_name(n) in _WANTED]
+
+# --- Native Patterns (no TA-Lib needed) ---
+def _non_zero(x):
+    return x + np.finfo(float).eps if np.any(x == 0) else x
+
+def _doji(o, h, l, c):
+    """pandas-ta cdl_doji on the last bar: body < 10% of the 10-bar average range."""
+    if len(c) < DOJI_LENGTH:
+        return None
+    body = np.abs(_non_zero(c[-DOJI_LENGTH:] - o[-DOJI_LENGTH:]))
+    hl_range = np.abs(_non_zero(h[-DOJI_LENGTH:] - l[-DOJI_LENGTH:]))
+    return 100 if body[-1] < DOJI_FACTOR * hl_range.mean() else 0
+
+def _inside(o, h, l, c):
+    """pandas-ta cdl_inside on the last bar: range inside the previous bar's range."""
+    if len(c) < 2:
+        return 0
+    return 100 if (h[-1] < h[-2] and l[-1] > l[-2]) else 0
+
+NATIVE = {'doji': _doji, 'inside': _inside}
+
+def _doji_series(o, h, l, c):
+    """_doji() for every bar (0 before DOJI_LENGTH bars)."""
+    out = np.zeros(len(c))
+    if len(c) < DOJI_LENGTH:
+        return out
+    body = sliding_window_view(c - o, DOJI_LENGTH)
+    hl_range = sliding_window_view(h - l, DOJI_LENGTH)
+    eps = np.finfo(float).eps
+    body = np.abs(body[:, -1] + np.where((body == 0).any(axis=1), eps, 0.0))
+    hl_range = np.abs(hl_range + np.where((hl_range == 0).any(axis=1), eps, 0.0)[:, None]).mean(axis=1)
+    out[DOJI_LENGTH - 1:] = np.where(body < DOJI_FACTOR * hl_range, 100, 0)
+    return out
+
+def _inside_series(o, h, l, c):
+    out = np.zeros(len(c))
+    out[1:] = np.where((h[1:] < h[:-1]) & (l[1:] > l[:-1]), 100, 0)
+    return out
+
+NATIVE_SERIES = {'doji': _doji_series, 'inside': _inside_series}
+
+# --- TA-Lib Patterns ---
+_lookbacks = {}
+
+def _talib_tail(name):
+    """Bars a TA-Lib pattern needs for its latest output (lookback + 1), cached per pattern."""
+    if name not in _lookbacks:
+        import talib.abstract as tala
+        _lookbacks[name] = tala.Function(f"CDL{name.upper()}").lookback + 1
+    return _lookbacks[name]
+
+def available_patterns():
+    """Patterns that can be evaluated in this environment (TA-Lib ones only when installed)."""
+    return [(n, col) for n, col in PATTERNS if n in NATIVE or talib is not None]
+
+def pattern_window():
+    """Bars the available patterns need for the latest bar's result."""
+    tails = {'doji': DOJI_LENGTH, 'inside': 2}
+    return max((tails[n] if n in NATIVE else _talib_tail(n) for n, _ in available_patterns()), default=1)
+
+def detect_patterns(o, h, l, c):
+    """
+    Evaluates the configured patterns on the latest bar of the given OHLC arrays
+    (ascending). Returns {CDL_NAME: value} for the patterns that fired.
+    """
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (o, h, l, c))
+    hits = {}
+    for name, col in available_patterns():
+        if name in NATIVE:
+            val = NATIVE[name](o, h, l, c)
+        else:
+            tail = _talib_tail(name)
+            if len(c) < tail:
+                continue
+            out = getattr(talib, f"CDL{name.upper()}")(o[-tail:], h[-tail:], l[-tail:], c[-tail:])
+            val = out[-1]
+        if val:
+            hits[col] = float(val)
+    return hits
+
+def pattern_series(o, h, l, c, opts):
+    """
+    pattern_str of every bar as if it were the latest (detect_patterns() + summarize_patterns()),
+    '' where none. TA-Lib outputs only look back over each pattern's own window, so one call
+    over the whole series gives every bar's value.
+    """
+    o, h, l, c = (np.asarray(x, dtype=float) for x in (o, h, l, c))
+    values = {}
+    for name, col in available_patterns():
+        if name in NATIVE_SERIES:
+            values[col] = NATIVE_SERIES[name](o, h, l, c)
+        else:
+            values[col] = getattr(talib, f"CDL{name.upper()}")(o, h, l, c).astype(float)
+    out = np.full(len(c), '', dtype=object)
+    if not values:
+        return out
+    fired = np.any([v != 0 for v in values.values()], axis=0)
+    labels = {}  # the same combination of hits recurs across bars
+    for i in np.flatnonzero(fired):
+        hits = tuple((col, float(v[i])) for col, v in values.items() if v[i])
+        if hits not in labels:
+            labels[hits] = summarize_patterns(dict(hits), opts)[0] or ''
+        out[i] = labels[hits]
+    return out
+
+def frame_patterns(df):
+    """detect_patterns() over an OHLC DataFrame."""
+    return detect_patterns(df['open'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())
+
+def summarize_patterns(hits, opts):
+    """
+    Classifies pattern hits into the signal label and signed intensity score.
+    Returns (pattern_str, pattern_score); pattern_str honours the bullish/bearish/neutral toggles.
+    """
+    pattern_str = None
+    pattern_score = 0
+    bullish_patterns = []
+    bearish_patterns = []
+    neutral_patterns = []
+
+    for key, val in hits.items():
+        # Only accept strong pattern signals (usually 100 or -100)
+        if val == 0 or abs(val) < 10:
+            continue
+
+        # Update score (Signed)
+        weight = PATTERN_WEIGHTS.get(key, 1)
+        if val < 0: weight = -weight
+        if abs(weight) > abs(pattern_score):
+            pattern_score = weight
+
+        pattern_name = key.replace("CDL_", "").split("_")[0].title()
+
+        if val > 0:
+            if key in NEUTRAL_COLS:
+                neutral_patterns.append(pattern_name)
+            elif key in BEARISH_COLS and key not in BULLISH_COLS:
+                bearish_patterns.append(pattern_name)
+            else:
+                bullish_patterns.append(pattern_name)
+        elif val < 0:
+            if key in NEUTRAL_COLS:
+                neutral_patterns.append(pattern_name)
+            elif key in BULLISH_COLS and key not in BEARISH_COLS:
+                bullish_patterns.append(pattern_name)
+            else:
+                bearish_patterns.append(pattern_name)
+
+    active_found = []
+    if opts.get('bullish') and bullish_patterns:
+        active_found.append("Bullish " + "/".join(bullish_patterns))
+    if opts.get('bearish') and bearish_patterns:
+        active_found.append("Bearish " + "/".join(bearish_patterns))
+    if opts.get('neutral') and neutral_patterns:
+        active_found.append("Neutral " + "/".join(neutral_patterns))
+    if active_found:
+        pattern_str = " | ".join(active_found)
+    return pattern_str, pattern_score
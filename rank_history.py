@@ -0,0 +1,107 @@
+import json
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import kernels
+from config import Config
+from confluence import confluence_rank
+from indicator_graph import MTF_RSI_RULES
+from patterns import pattern_series
+
+# Historical confluence rank.
+# confluence_rank() scores the latest row only. rank_series() scores every bar of a frame as if
+# the frame ended there, so the chart can plot the rank and the board can tell since when a
+# stock holds it. Each input is rebuilt per bar without looking ahead:
+#   RSI / MTF RSI   the base RSI series; the higher-timeframe bucket a bar reads is the forming
+#                   one, advanced one Wilder step from the last completed bucket (kernels.rma_step)
+#   location        the day's range so far (intraday) or the trailing 20-bar range (swing)
+#   patterns        3-candle reversal and candlestick patterns of each bar (patterns.pattern_series)
+# All bars are then scored as one confluence_rank() batch, so the last value is the stored
+# rank. The calc run keeps the last RANK_HISTORY_BARS bars of the loaded window per signal row
+# as change points ([[bar time, rank], ...], rank_history); the chart gets a rank per candle.
+
+def mtf_rsi(ts, close, rule, length):
+    """RSI of the `rule` bucket each bar's latest row reads (the node rsi_mtf), for every bar."""
+    bins = pd.Series(np.arange(len(close)), index=ts).resample(rule)
+    first, last = bins.first(), bins.last()
+    keep = last.notna().to_numpy()
+    out = np.full(len(close), np.nan)
+    if not keep.any():
+        return out
+    labels, bucket_close = last.index[keep], close[last.to_numpy()[keep].astype(int)]
+    forming = np.searchsorted(first.to_numpy()[keep].astype(int), np.arange(len(close)), side='right') - 1
+
+    # Completed buckets keep their RSI; the forming one takes the bar's close as its own
+    pos_avg, neg_avg = kernels.rsi_averages(bucket_close, length)
+    prev = np.maximum(forming - 1, 0)
+    diff = np.where(forming > 0, close - bucket_close[prev], np.nan)
+    pos = kernels.rma_step(np.where(forming > 0, pos_avg[prev], np.nan), np.where(diff < 0, 0.0, diff), length)
+    neg = kernels.rma_step(np.where(forming > 0, neg_avg[prev], np.nan), np.where(diff > 0, 0.0, diff), length)
+
+    read = np.minimum(labels.searchsorted(ts, side='right') - 1, forming)
+    completed = kernels.rsi_from_averages(pos_avg, neg_avg)[np.maximum(read, 0)]
+    out = np.where(read == forming, kernels.rsi_from_averages(pos, neg), completed)
+    out[(read < 0) | (forming < length)] = np.nan  # kernels.rsi() needs length + 1 buckets
+    return out
+
+def _rolling(values, window, fn):
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = fn(sliding_window_view(values, window), axis=1)
+    return out
+
+def history_columns(df, settings, profile_id):
+    """latest_columns() equivalent over every bar of an indicator-free OHLCV frame."""
+    ts = pd.DatetimeIndex(df['timestamp'])
+    o, h, l, c = (df[f].to_numpy(dtype=float) for f in ('open', 'high', 'low', 'close'))
+    n = len(c)
+    missing = np.full(n, np.nan)
+
+    rsi = missing
+    rsi_mtf = (missing, missing)
+    if settings['RSI']['enabled']:
+        length = settings['RSI']['period']
+        values = kernels.rsi(pd.Series(c), length=length)
+        if values is not None:
+            rsi = values.to_numpy(dtype=float).copy()
+            rsi[:length] = np.nan  # a frame cut before length + 1 bars has no RSI
+        if profile_id in MTF_RSI_RULES:
+            rsi_mtf = tuple(mtf_rsi(ts, c, rule, length) for rule, _ in MTF_RSI_RULES[profile_id])
+
+    if profile_id == 'intraday':
+        days = ts.normalize()
+        low_ref = pd.Series(l).groupby(days).cummin().to_numpy()
+        high_ref = pd.Series(h).groupby(days).cummax().to_numpy()
+    else:
+        low_ref, high_ref = _rolling(l, 20, np.min), _rolling(h, 20, np.max)
+
+    green, red = c > o, c < o
+    rev_bull, rev_bear = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+    if n >= 4:
+        rev_bull[3:] = green[3:] & red[2:-1] & red[1:-2] & red[:-3]
+        rev_bear[3:] = red[3:] & green[2:-1] & green[1:-2] & green[:-3]
+
+    patterns_opts = settings.get('patterns', {})
+    patterns = pattern_series(o, h, l, c, patterns_opts) if patterns_opts.get('enabled') else np.full(n, '', dtype=object)
+    return {
+        'ltp': c, 'rsi': rsi, 'rsi_mtf': rsi_mtf, 'low_ref': low_ref, 'high_ref': high_ref,
+        'rev_bull': rev_bull, 'rev_bear': rev_bear, 'patterns': patterns.astype(str),
+    }
+
+def rank_series(df, settings, profile_id, timeframe):
+    """Confluence rank of every bar of `df` (timestamp + OHLC, time-sorted) as an int array."""
+    if df.empty:
+        return np.zeros(0, dtype=int)
+    cols = history_columns(df, settings, profile_id)
+    rank, _, _ = confluence_rank(cols, profile_id, timeframe,
+                                 settings.get('RSI', {}).get('os', 30), settings.get('RSI', {}).get('ob', 70))
+    return rank.astype(int)
+
+def encode(ts, rank):
+    """Compact rank_history JSON: [[bar time, rank], ...] where the rank changes over the last RANK_HISTORY_BARS bars."""
+    ts, rank = pd.DatetimeIndex(ts)[-Config.RANK_HISTORY_BARS:], np.asarray(rank)[-Config.RANK_HISTORY_BARS:]
+    if not len(rank):
+        return None
+    change = np.flatnonzero(np.concatenate([[True], rank[1:] != rank[:-1]]))
+    times = ts[change].strftime('%Y-%m-%d %H:%M:%S')
+    return json.dumps([[t, int(r)] for t, r in zip(times, rank[change])], separators=(',', ':'))
@@ -26,6 +26,13 @@ CREATE TABLE IF NOT EXISTS app_sg_indicator_settings (
     UNIQUE KEY unique_profile_indicator (profile_id, indicator_key)
 );
 
+-- 2b. Settings Version (bumped on every save; engines reload cached settings when it moves)
+CREATE TABLE IF NOT EXISTS app_sg_settings_version (
+    profile_id VARCHAR(20) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
 -- 3. OHLCV Prices Table (Option A: No Foreign Key to external companies table)
 CREATE TABLE IF NOT EXISTS app_sg_ohlcv_prices (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
@@ -77,12 +84,98 @@ CREATE TABLE IF NOT EXISTS app_sg_calculated_signals (
     npm DECIMAL(10, 4),
     i_group VARCHAR(100),
     i_subgroup VARCHAR(100),
+    ret_pct DECIMAL(10, 4), -- % return over RS_LOOKBACK bars
+    sr_levels JSON, -- pivots, swing clusters and VPVR levels (sr_levels.py)
+    support DECIMAL(10, 4), -- nearest level below / above ltp
+    resistance DECIMAL(10, 4),
+    rank_history JSON, -- [[bar time, rank], ...] rank change points (rank_history.py)
+    -- Cross-sectional features (cross_section.py)
+    rsi_sector_pct DECIMAL(7, 2),
+    ret_rank INT,
+    ret_group_pct DECIMAL(7, 2),
+    beta DECIMAL(10, 4),
+    rel_strength DECIMAL(10, 4),
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     PRIMARY KEY (isin, profile_id, timeframe),
     FOREIGN KEY (profile_id) REFERENCES app_sg_profiles(profile_id) ON DELETE CASCADE,
     INDEX idx_isin (isin) -- Added index for faster querying
 );
 
+-- 4b. Incremental Indicator State (recursive indicator values per ISIN / timeframe / settings hash)
+CREATE TABLE IF NOT EXISTS app_sg_indicator_state (
+    isin VARCHAR(20) NOT NULL,
+    timeframe VARCHAR(10) NOT NULL,
+    settings_hash CHAR(16) NOT NULL,
+    last_bar_ts DATETIME NOT NULL,
+    state_json MEDIUMTEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (isin, timeframe, settings_hash)
+);
+
+-- 4c. Volume Profile (VPVR per ISIN / timeframe, written by the calc run; state_json = closed-bar profile)
+CREATE TABLE IF NOT EXISTS app_sg_vpvr (
+    isin VARCHAR(20) NOT NULL,
+    timeframe VARCHAR(10) NOT NULL,
+    bins INT NOT NULL,
+    last_bar_ts DATETIME NOT NULL,
+    levels_json MEDIUMTEXT NOT NULL,
+    state_json MEDIUMTEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (isin, timeframe)
+);
+
+-- 4d. OHLCV Change Log (written by every OHLCV upsert; one row per ISIN / timeframe, last change only)
+CREATE TABLE IF NOT EXISTS app_sg_ohlcv_changes (
+    isin VARCHAR(20) NOT NULL,
+    timeframe VARCHAR(10) NOT NULL,
+    changed_at DATETIME NOT NULL,
+    PRIMARY KEY (isin, timeframe),
+    INDEX idx_changed (timeframe, changed_at)
+);
+
+-- 4e. DMA Store (anchored daily SMAs per ISIN / period / trading day; value NULL = not enough closes)
+CREATE TABLE IF NOT EXISTS app_sg_dma (
+    isin VARCHAR(20) NOT NULL,
+    period INT NOT NULL,
+    as_of DATE NOT NULL,
+    value DOUBLE,
+    computed_at DATETIME NOT NULL,
+    PRIMARY KEY (isin, period, as_of)
+);
+
+-- 4f. Calc Watermarks (start of the last calc run per profile / timeframe and the settings it used)
+CREATE TABLE IF NOT EXISTS app_sg_calc_watermark (
+    profile_id VARCHAR(20) NOT NULL,
+    timeframe VARCHAR(10) NOT NULL,
+    settings_version BIGINT NOT NULL DEFAULT 0,
+    settings_key CHAR(16) NOT NULL,
+    calc_started_at DATETIME NOT NULL,
+    PRIMARY KEY (profile_id, timeframe)
+);
+
+-- 4g. Time-of-Day Volume (median 5m volume per session slot; through = last session included,
+-- forming = session left out because it was in progress when the row was computed)
+CREATE TABLE IF NOT EXISTS app_sg_tod_volume (
+    isin VARCHAR(20) NOT NULL PRIMARY KEY,
+    sessions INT NOT NULL,
+    through DATE,
+    forming DATE,
+    slots_json TEXT NOT NULL,
+    computed_at DATETIME NOT NULL
+);
+
+-- 4h. Indicator Graph Memo (latest output of each indicator graph node per ISIN / timeframe / node id;
+--      data_version is a digest of the bars it was computed from)
+CREATE TABLE IF NOT EXISTS app_sg_node_memo (
+    isin VARCHAR(20) NOT NULL,
+    timeframe VARCHAR(10) NOT NULL,
+    node_id CHAR(16) NOT NULL,
+    data_version CHAR(32) NOT NULL,
+    output_json TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (isin, timeframe, node_id)
+);
+
 -- 5. Strategy Builder Tables --
 CREATE TABLE IF NOT EXISTS app_user_strategies (
     id INT AUTO_INCREMENT PRIMARY KEY,
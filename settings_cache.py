@@ -0,0 +1,84 @@
+import time
+import logging
+from config import Config
+
+# In-process cache of merged profile settings.
+# Each profile's settings are held as a read-only FrozenDict together with the version
+# they were built from. /api/settings/save bumps the profile's row in app_sg_settings_version;
+# readers re-check that single row at most every SETTINGS_VERSION_TTL seconds and only
+# reload the settings rows when it has moved, so other workers pick up saves cheaply.
+
+class FrozenDict(dict):
+    """Read-only dict. Still picklable (worker pool) and JSON-serialisable."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Settings are read-only; derive a changed copy with deep_merge()")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+def freeze(obj):
+    """Recursively converts dicts to FrozenDict and lists to tuples."""
+    if isinstance(obj, dict):
+        return FrozenDict({k: freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+def deep_merge(base, overrides):
+    """Returns a new dict of base with overrides merged in recursively (inputs are not modified)."""
+    merged = dict(base)
+    for key, val in overrides.items():
+        if isinstance(val, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], val)
+        else:
+            merged[key] = val
+    return merged
+
+class SettingsCache:
+    def __init__(self, ttl=None):
+        self.ttl = Config.SETTINGS_VERSION_TTL if ttl is None else ttl
+        self._entries = {}  # (storage.source_key, profile_id) -> (version, settings)
+        self._checked = {}  # (storage.source_key, profile_id) -> monotonic time of the last version check
+
+    async def get(self, storage, profile_id, build):
+        """
+        Cached settings for a profile of the database behind `storage`. `build()` is awaited
+        to load and merge the settings when the profile's version changed (or on first use).
+        """
+        key = (storage.source_key, profile_id)
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and now - self._checked.get(key, 0) < self.ttl:
+            return entry[1]
+
+        # Read the version before the rows: a save in between just triggers one more reload
+        try:
+            version = await storage.get_settings_version(profile_id)
+        except Exception as e:
+            logging.warning(f"Settings version check failed for {profile_id}, reloading: {e}")
+            version = None
+        self._checked[key] = now
+        if entry is not None and version is not None and entry[0] == version:
+            return entry[1]
+
+        settings = freeze(await build())
+        self._entries[key] = (version, settings)
+        return settings
+
+    def version(self, storage, profile_id):
+        """Version of the cached settings (None if not loaded or unversioned)."""
+        entry = self._entries.get((storage.source_key, profile_id))
+        return entry[0] if entry else None
+
+    def invalidate(self, profile_id=None):
+        """Drops the profile's cached settings for every source (all profiles when None)."""
+        for key in [k for k in self._entries if profile_id is None or k[1] == profile_id]:
+            self._entries.pop(key, None)
+        for key in [k for k in self._checked if profile_id is None or k[1] == profile_id]:
+            self._checked.pop(key, None)
+
+settings_cache = SettingsCache()
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from config import Config
+from storage import SIGNAL_COLUMNS, HISTORY_MIN_RANK
+
+# Streaming signal writer.
+# The calc run hands finished signal rows to a SignalWriter as each chunk of ISINs comes
+# back from the workers. Every SIGNAL_WRITE_CHUNK rows are merged through the storage's
+# staging table (merge_signals: one bulk load + one set-based upsert + one history insert)
+# in a background task, so database writes overlap the remaining computation. At most one
+# merge is in flight and add() holds the lock while a full buffer waits for it, so callers
+# queue behind the merge instead of growing the buffer; the calc run also caps the chunks it
+# has in flight, which keeps memory bounded.
+
+RANK = SIGNAL_COLUMNS.index('confluence_rank')
+TIMEFRAME = SIGNAL_COLUMNS.index('timeframe')
+
+class SignalWriter:
+    def __init__(self, storage, label, chunk_size=None):
+        self.storage = storage
+        self.label = label
+        self.chunk_size = chunk_size or Config.SIGNAL_WRITE_CHUNK
+        self.buffer = []
+        self.inflight = None
+        self.lock = asyncio.Lock()  # chunks finish concurrently; one merge at a time
+        self.rows = 0
+        self.history = 0
+        self.chunks = 0
+        self.write_time = 0.0
+        self.written = {}  # timeframe -> rows merged
+        self.timeframe_write_time = {}  # timeframe -> its share (by rows) of the merge time
+        self.started = time.perf_counter()
+
+    async def add(self, rows):
+        """Queues STAGE_COLUMNS rows; starts a merge whenever a chunk is full (waits while one is running)."""
+        async with self.lock:
+            self.buffer.extend(rows)
+            while len(self.buffer) >= self.chunk_size:
+                chunk, self.buffer = self.buffer[:self.chunk_size], self.buffer[self.chunk_size:]
+                await self._submit(chunk)
+
+    async def close(self):
+        """Writes what is left, waits for the last merge and logs throughput. Returns rows written."""
+        async with self.lock:
+            if self.buffer:
+                chunk, self.buffer = self.buffer, []
+                await self._submit(chunk)
+            await self._wait()
+        if self.rows:
+            elapsed = time.perf_counter() - self.started
+            rate = self.rows / self.write_time if self.write_time > 0 else float('inf')
+            logging.info(f"💾 {self.label}: wrote {self.rows} signals ({self.history} to history) in {self.chunks} chunks; "
+                         f"{self.write_time:.2f}s in the database over {elapsed:.2f}s ({rate:.0f} rows/s).")
+        return self.rows
+
+    async def _submit(self, chunk):
+        """Starts a merge once the previous one finished. Called with the lock held."""
+        await self._wait()
+        self.inflight = asyncio.ensure_future(self._merge(chunk))
+
+    async def _wait(self):
+        if self.inflight is not None:
+            inflight, self.inflight = self.inflight, None
+            await inflight
+
+    async def _merge(self, chunk):
+        start = time.perf_counter()
+        await self.storage.merge_signals(chunk)
+        elapsed = time.perf_counter() - start
+        self.write_time += elapsed
+        for row in chunk:
+            timeframe = row[TIMEFRAME]
+            self.written[timeframe] = self.written.get(timeframe, 0) + 1
+            self.timeframe_write_time[timeframe] = self.timeframe_write_time.get(timeframe, 0.0) + elapsed / len(chunk)
+        self.rows += len(chunk)
+        self.history += sum(1 for r in chunk if abs(r[RANK]) >= HISTORY_MIN_RANK)
+        self.chunks += 1
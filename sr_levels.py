@@ -0,0 +1,99 @@
+import json
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from config import Config
+from lookback import MINUTES
+
+# Support / resistance levels.
+# The calc run derives each ISIN/timeframe's levels from the bars and volume profile it already
+# holds, so the dashboard reads them instead of recomputing per stock in the browser:
+#   pp, r1, r2, s1, s2     classic floor pivots of the previous session (intraday timeframes) or
+#                          the previous bar (1d / 1w / 1mo); prev_high / prev_low are its range
+#   swing_highs / lows     swing points (SR_SWING_BARS higher/lower bars on each side) of the last
+#                          SR_LOOKBACK bars (at most the loaded window; reads are not extended for
+#                          them), clustered within SR_CLUSTER_PCT: [[level, touches]], the
+#                          SR_MAX_LEVELS most touched per side
+#   poc, vah, val          point of control and value area (SR_VALUE_AREA of the volume) of the
+#                          stored volume profile
+# The signal row stores them as one JSON object (sr_levels) plus the nearest level below and
+# above the LTP (support / resistance columns) for screening.
+
+def pivots(df, timeframe):
+    """Floor pivots of the previous session (intraday) or previous bar; {} without one."""
+    high, low, close = (df[f].to_numpy(dtype=float) for f in ('high', 'low', 'close'))
+    if timeframe in MINUTES:
+        days = df['timestamp'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+        today = int(np.searchsorted(days, days[-1]))
+        if today == 0:
+            return {}
+        start = int(np.searchsorted(days, days[today - 1]))
+        h, l, c = np.nanmax(high[start:today]), np.nanmin(low[start:today]), close[today - 1]
+    else:
+        if len(df) < 2:
+            return {}
+        h, l, c = high[-2], low[-2], close[-2]
+    pp = (h + l + c) / 3
+    return {'pp': pp, 'r1': 2 * pp - l, 'r2': pp + (h - l), 's1': 2 * pp - h, 's2': pp - (h - l),
+            'prev_high': h, 'prev_low': l}
+
+def clusters(prices):
+    """[[level, touches]] of prices lying within SR_CLUSTER_PCT of their neighbours: the SR_MAX_LEVELS most touched, by price."""
+    prices = np.sort(prices[np.isfinite(prices)])
+    if not len(prices):
+        return []
+    breaks = np.flatnonzero(np.diff(prices) > prices[:-1] * Config.SR_CLUSTER_PCT / 100) + 1
+    starts = np.concatenate([[0], breaks])
+    touches = np.diff(np.concatenate([starts, [len(prices)]]))
+    levels = np.add.reduceat(prices, starts) / touches
+    keep = np.argsort(-touches, kind='stable')[:Config.SR_MAX_LEVELS]
+    return [[float(levels[i]), int(touches[i])] for i in sorted(keep)]
+
+def swing_levels(df):
+    """(swing-high clusters, swing-low clusters) over the last SR_LOOKBACK bars."""
+    high = df['high'].to_numpy(dtype=float)[-Config.SR_LOOKBACK:]
+    low = df['low'].to_numpy(dtype=float)[-Config.SR_LOOKBACK:]
+    w = Config.SR_SWING_BARS
+    if len(high) < 2 * w + 1:
+        return [], []
+    inner = slice(w, len(high) - w)
+    highs = high[inner][high[inner] >= sliding_window_view(high, 2 * w + 1).max(axis=1)]
+    lows = low[inner][low[inner] <= sliding_window_view(low, 2 * w + 1).min(axis=1)]
+    return clusters(highs), clusters(lows)
+
+def value_area(profile):
+    """POC and value area bounds of a volume profile ([{price (bin start), volume}])."""
+    if len(profile) < 2:
+        return {}
+    prices = np.array([r['price'] for r in profile], dtype=float)
+    volume = np.array([r['volume'] for r in profile], dtype=float)
+    total = volume.sum()
+    if not total > 0:
+        return {}
+    size = prices[1] - prices[0]
+    poc = lo = hi = int(np.argmax(volume))
+    covered = volume[poc]
+    # Grow towards the heavier neighbouring bin until the area holds SR_VALUE_AREA of the volume
+    while covered < Config.SR_VALUE_AREA * total and (lo > 0 or hi < len(volume) - 1):
+        below = volume[lo - 1] if lo > 0 else -1.0
+        above = volume[hi + 1] if hi < len(volume) - 1 else -1.0
+        if above >= below:
+            hi += 1
+            covered += volume[hi]
+        else:
+            lo -= 1
+            covered += volume[lo]
+    return {'poc': prices[poc] + size / 2, 'vah': prices[hi] + size, 'val': prices[lo]}
+
+def sr_levels(df, timeframe, profile, ltp):
+    """(sr_levels JSON, nearest support, nearest resistance) of one ISIN/timeframe frame."""
+    levels = {k: round(float(v), 2) for k, v in {**pivots(df, timeframe), **value_area(profile)}.items() if np.isfinite(v)}
+    swing_highs, swing_lows = swing_levels(df)
+    levels['swing_highs'] = [[round(p, 2), n] for p, n in swing_highs]
+    levels['swing_lows'] = [[round(p, 2), n] for p, n in swing_lows]
+
+    prices = np.array([v for v in levels.values() if not isinstance(v, list)]
+                      + [p for p, _ in levels['swing_highs'] + levels['swing_lows']], dtype=float)
+    below, above = prices[prices < ltp], prices[prices > ltp]
+    support = float(below.max()) if len(below) else None
+    resistance = float(above.min()) if len(above) else None
+    return json.dumps(levels, separators=(',', ':')), support, resistance
@@ -0,0 +1,1228 @@
+import aiomysql
+import logging
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from config import Config
+from ohlcv_loader import split_by_isin
+
+# Column order of app_sg_calculated_signals rows as produced by process_profile
+SIGNAL_COLUMNS = (
+    'isin', 'profile_id', 'timeframe', 'timestamp', 'ltp', 'rsi', 'rsi_day_high', 'rsi_day_low',
+    'ema_signal', 'ema_fast', 'ema_slow', 'volume_signal', 'volume_ratio', 'ema_value',
+    'supertrend_dir', 'supertrend_value', 'dma_data', 'confluence_rank', 'sl', 'target',
+    'trade_strategy', 'candlestick_pattern', 'pattern_score', 'last_5_candles',
+    'sector', 'industry', 'pe', 'pb', 'roe', 'eps', 'opm', 'npm',
+    'i_group', 'i_subgroup', 'is_fav', 'is_holding', 'ret_pct',
+    'sr_levels', 'support', 'resistance', 'rank_history'
+)
+
+SIGNAL_KEY_COLUMNS = ('isin', 'profile_id', 'timeframe')
+
+# Cross-sectional columns of app_sg_calculated_signals, filled after a run by cross_section.py
+FEATURE_COLUMNS = ('rsi_sector_pct', 'ret_rank', 'ret_group_pct', 'beta', 'rel_strength')
+
+# Rows handed to merge_signals(): a signal row plus the symbol its history entry is logged under
+STAGE_COLUMNS = SIGNAL_COLUMNS + ('symbol',)
+# Signals with |confluence_rank| at or above this are logged to app_sg_signal_history
+HISTORY_MIN_RANK = 4
+
+HISTORY_COLUMNS = (
+    'isin', 'symbol', 'profile_id', 'timeframe', 'timestamp', 'ltp', 'rsi',
+    'confluence_rank', 'trade_strategy', 'sl', 'target'
+)
+
+OHLCV_COLUMNS = ('isin', 'timeframe', 'timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+STATE_COLUMNS = ('isin', 'timeframe', 'settings_hash', 'last_bar_ts', 'state_json')
+STATE_KEY_COLUMNS = ('isin', 'timeframe', 'settings_hash')
+
+# Column order of app_sg_node_memo rows (indicator graph node outputs per ISIN / timeframe / node id)
+NODE_MEMO_COLUMNS = ('isin', 'timeframe', 'node_id', 'data_version', 'output_json')
+NODE_MEMO_KEY_COLUMNS = ('isin', 'timeframe', 'node_id')
+
+# Column order of app_sg_vpvr rows (volume profile per ISIN / timeframe)
+VPVR_COLUMNS = ('isin', 'timeframe', 'bins', 'last_bar_ts', 'levels_json', 'state_json')
+VPVR_KEY_COLUMNS = ('isin', 'timeframe')
+
+# Column order of app_sg_dma rows (daily SMA per ISIN / period / trading day)
+DMA_COLUMNS = ('isin', 'period', 'as_of', 'value', 'computed_at')
+DMA_KEY_COLUMNS = ('isin', 'period', 'as_of')
+
+# Column order of app_sg_tod_volume rows (5m time-of-day volume baseline per ISIN)
+TOD_VOLUME_COLUMNS = ('isin', 'sessions', 'through', 'forming', 'slots_json', 'computed_at')
+
+# Column order of app_sg_calc_watermark rows (last calc run per profile / timeframe)
+WATERMARK_COLUMNS = ('profile_id', 'timeframe', 'settings_version', 'settings_key', 'calc_started_at')
+WATERMARK_KEY_COLUMNS = ('profile_id', 'timeframe')
+
+# Latest session of each ISIN's bars, aggregated to one OHLCV row per ISIN in one grouped query
+# ({p}: placeholder style, {isins}: IN-list placeholders; params: timeframe, *isins, timeframe)
+LIVE_SESSION_SQL = """
+    WITH latest AS (
+        SELECT isin, MAX(timestamp) AS last_ts FROM app_sg_ohlcv_prices
+        WHERE timeframe = {p} AND isin IN ({isins}) GROUP BY isin
+    ), session AS (
+        SELECT p.isin, p.timestamp, p.open, p.high, p.low, p.close, p.volume, l.last_ts,
+               ROW_NUMBER() OVER (PARTITION BY p.isin ORDER BY p.timestamp) AS rn
+        FROM app_sg_ohlcv_prices p JOIN latest l ON p.isin = l.isin
+        WHERE p.timeframe = {p} AND p.timestamp >= CAST(l.last_ts AS DATE)
+    )
+    SELECT isin, MAX(last_ts) AS last_ts,
+           MAX(CASE WHEN rn = 1 THEN open END) AS open, MAX(high) AS high, MIN(low) AS low,
+           MAX(CASE WHEN timestamp = last_ts THEN close END) AS close, SUM(volume) AS volume
+    FROM session GROUP BY isin
+"""
+
+def group_pairs(rows):
+    """OHLCV rows grouped by (isin, timeframe)."""
+    groups = {}
+    for r in rows:
+        groups.setdefault((r[0], r[1]), []).append(r)
+    return groups
+
+
+class Storage:
+    """
+    Data access interface used by the engines.
+    Covers the OHLCV, signal, settings and universe queries; row shapes match
+    what aiomysql.DictCursor returns so callers can switch backends freely.
+    """
+
+    @property
+    def source_key(self):
+        """Identifies the database behind this storage (universe snapshots are cached per source)."""
+        return id(self)
+
+    # --- Universe (Datamart + Holdings) ---
+    async def get_holdings_isins(self):
+        raise NotImplementedError
+
+    async def get_active_universe(self, target_dim):
+        """Active companies with dim_favourites set only where it equals target_dim."""
+        raise NotImplementedError
+
+    async def get_symbol_map(self, active_only=True):
+        raise NotImplementedError
+
+    async def resolve_symbols(self, symbols=None):
+        """Maps symbols to {isin: symbol}; no symbols means the favourites list."""
+        raise NotImplementedError
+
+    async def get_fundamentals(self):
+        raise NotImplementedError
+
+    async def get_companies(self):
+        """All companies as {isin, symbol, exchange, is_active} rows (universe snapshots)."""
+        raise NotImplementedError
+
+    async def get_favourite_rows(self):
+        """Favourites as {isin, symbol, dim_favourites} rows (1 = intraday, 2 = swing)."""
+        raise NotImplementedError
+
+    # --- Settings ---
+    async def get_settings_rows(self, profile_id):
+        raise NotImplementedError
+
+    async def get_settings_version(self, profile_id):
+        """Current settings version of a profile (0 if it was never saved)."""
+        raise NotImplementedError
+
+    async def bump_settings_version(self, profile_id):
+        raise NotImplementedError
+
+    # --- OHLCV ---
+    async def get_ohlcv_isins(self, timeframe):
+        raise NotImplementedError
+
+    async def fetch_ohlcv_matrix(self, isins, timeframe, limit=None, start=None, end=None):
+        """
+        Fast numeric read for one or many ISINs in a single statement.
+        Returns an (n, 7) float64 array of [isin position in `isins`, epoch seconds
+        (naive wall-clock), open, high, low, close, volume] in no particular order.
+        `limit` keeps the latest N bars per ISIN; `start`/`end` bound the timestamp.
+        """
+        raise NotImplementedError
+
+    async def fetch_ohlcv_range(self, isin, timeframe, start, end):
+        """Bars between two datetimes (inclusive), oldest first."""
+        raise NotImplementedError
+
+    async def get_latest_timestamp(self, isin, timeframe):
+        raise NotImplementedError
+
+    async def fetch_session_bars(self, isin, timeframe, session_date):
+        """All bars of one calendar day, oldest first."""
+        raise NotImplementedError
+
+    async def fetch_closes(self, isin, timeframe, limit):
+        """Latest `limit` closes, newest first."""
+        raise NotImplementedError
+
+    async def fetch_live_sessions(self, isins, timeframe='5m'):
+        """OHLCV of each ISIN's latest session of `timeframe` bars: {isin: {last_ts, open, high, low, close, volume}}."""
+        raise NotImplementedError
+
+    async def upsert_ohlcv(self, rows):
+        """
+        Upserts bars and records each (isin, timeframe) whose stored bars actually changed
+        in app_sg_ohlcv_changes. Returns the set of changed pairs.
+        """
+        raise NotImplementedError
+
+    async def get_latest_timestamps(self, isins, timeframe):
+        """{isin: timestamp of its latest bar} in one grouped query."""
+        raise NotImplementedError
+
+    # --- Change Tracking ---
+    async def get_db_time(self):
+        """Current time on the database clock (change stamps and calc watermarks both use it)."""
+        raise NotImplementedError
+
+    async def get_change_times(self, isins, timeframe):
+        """{isin: last change of its `timeframe` bars} for ISINs that have a change record."""
+        raise NotImplementedError
+
+    async def get_changed_isins(self, timeframes, since):
+        """ISINs with bars of any of `timeframes` changed at or after `since`."""
+        raise NotImplementedError
+
+    async def get_calc_watermarks(self, profile_id):
+        """Last calc run per timeframe as {timeframe: {settings_version, settings_key, calc_started_at}}."""
+        raise NotImplementedError
+
+    async def save_calc_watermarks(self, rows):
+        """Upserts (profile_id, timeframe, settings_version, settings_key, calc_started_at) rows."""
+        raise NotImplementedError
+
+    # --- Signals ---
+    async def get_signal_meta(self, isin, timeframe, profile_id):
+        raise NotImplementedError
+
+    async def get_signal_isins(self, profile_id, timeframe):
+        """ISINs that have a stored signal row for this profile / timeframe."""
+        raise NotImplementedError
+
+    async def upsert_signals(self, rows):
+        raise NotImplementedError
+
+    async def insert_signal_history(self, rows):
+        raise NotImplementedError
+
+    async def merge_signals(self, rows):
+        """
+        Bulk-loads STAGE_COLUMNS rows into a staging table, upserts them into
+        app_sg_calculated_signals and logs high-conviction ones to history, set-based.
+        """
+        raise NotImplementedError
+
+    async def get_signal_columns(self, profile_id, timeframe, columns):
+        """Stored signal rows of a profile / timeframe as [{isin, *columns}] (SIGNAL_COLUMNS names only)."""
+        raise NotImplementedError
+
+    async def update_signal_features(self, rows):
+        """Sets FEATURE_COLUMNS of existing signal rows from (*SIGNAL_KEY_COLUMNS, *FEATURE_COLUMNS) rows."""
+        raise NotImplementedError
+
+    async def get_index_change(self, index_name):
+        """Day % change of an index from the e_bs_indices_nse snapshot (name or symbol), or None."""
+        raise NotImplementedError
+
+    # --- Indicator State ---
+    async def get_indicator_states(self, isins, timeframe, settings_hash):
+        """Persisted incremental state as {isin: state_json} for one timeframe/settings hash."""
+        raise NotImplementedError
+
+    async def save_indicator_states(self, rows):
+        """Upserts (isin, timeframe, settings_hash, last_bar_ts, state_json) rows."""
+        raise NotImplementedError
+
+    async def get_node_outputs(self, isins, timeframe, node_ids):
+        """Stored indicator graph outputs of one timeframe as [(isin, node_id, data_version, output_json)]."""
+        raise NotImplementedError
+
+    async def save_node_outputs(self, rows):
+        """Upserts NODE_MEMO_COLUMNS rows (one per isin / timeframe / node id)."""
+        raise NotImplementedError
+
+    # --- DMA Store ---
+    async def get_latest_dma(self, isins):
+        """Newest stored row per ISIN and period: {isin: {period: {as_of, value, computed_at}}}."""
+        raise NotImplementedError
+
+    async def save_dma(self, rows):
+        """Upserts (isin, period, as_of, value, computed_at) rows."""
+        raise NotImplementedError
+
+    # --- Time-of-Day Volume ---
+    async def get_tod_volume(self, isins):
+        """Stored baselines as {isin: {sessions, through, forming, slots_json, computed_at}}."""
+        raise NotImplementedError
+
+    async def save_tod_volume(self, rows):
+        """Upserts (isin, sessions, through, forming, slots_json, computed_at) rows."""
+        raise NotImplementedError
+
+    # --- Volume Profile ---
+    async def get_vpvr_states(self, isins, timeframe):
+        """Closed-bar volume profile state as {isin: state_json} for one timeframe."""
+        raise NotImplementedError
+
+    async def get_vpvr(self, isin, timeframe):
+        """Stored profile row ({bins, last_bar_ts, levels_json}) or None."""
+        raise NotImplementedError
+
+    async def save_vpvr(self, rows):
+        """Upserts (isin, timeframe, bins, last_bar_ts, levels_json, state_json) rows."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MySQLStorage(Storage):
+    """Storage over the App DB and Datamart DB aiomysql pools."""
+
+    # Every instance talks to the same configured App DB / Datamart
+    source_key = "mysql"
+
+    def __init__(self, app_pool, datamart_pool=None):
+        self.app_pool = app_pool
+        self.datamart_pool = datamart_pool
+
+    @classmethod
+    async def connect(cls):
+        app_pool = await aiomysql.create_pool(**Config.get_app_db_config())
+        datamart_pool = await aiomysql.create_pool(**Config.get_datamart_db_config())
+        return cls(app_pool, datamart_pool)
+
+    async def _fetchall(self, pool, query, params=None, dict_rows=True):
+        async with pool.acquire() as conn:
+            cursor_cls = aiomysql.DictCursor if dict_rows else aiomysql.Cursor
+            async with conn.cursor(cursor_cls) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def _executemany(self, query, rows):
+        if not rows:
+            return
+        async with self.app_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(query, rows)
+
+    # --- Universe ---
+    async def get_holdings_isins(self):
+        rows = await self._fetchall(self.app_pool, "SELECT DISTINCT isin FROM tb_app_sf_holdings", dict_rows=False)
+        return {r[0] for r in rows if r[0]}
+
+    async def get_active_universe(self, target_dim):
+        return await self._fetchall(self.datamart_pool, """
+            SELECT a.bs_ISIN as isin, a.bs_SYMBOL as symbol, a.bs_Available_ON as exchange, f.dim_favourites
+            FROM vw_e_bs_companies_all a
+            LEFT JOIN vw_e_bs_companies_favourite_indices f ON a.bs_SYMBOL = f.bs_symbol AND f.dim_favourites = %s
+            WHERE BINARY a.bs_Status = 'Active'
+        """, (target_dim,))
+
+    async def get_symbol_map(self, active_only=True):
+        query = "SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all"
+        if active_only:
+            query += " WHERE BINARY bs_Status = 'Active'"
+        rows = await self._fetchall(self.datamart_pool, query, dict_rows=False)
+        return {r[0]: r[1] for r in rows}
+
+    async def resolve_symbols(self, symbols=None):
+        if symbols:
+            format_strings = ','.join(['%s'] * len(symbols))
+            rows = await self._fetchall(
+                self.datamart_pool,
+                f"SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all WHERE bs_SYMBOL IN ({format_strings})",
+                tuple(symbols), dict_rows=False
+            )
+        else:
+            rows = await self._fetchall(self.datamart_pool, "SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_favourite_indices", dict_rows=False)
+        return {r[0]: r[1] for r in rows}
+
+    async def get_fundamentals(self):
+        rows = await self._fetchall(self.datamart_pool, """
+            SELECT bs_ISIN, bs_SecurityId, bs_Sector, bs_IndustryNew,
+                   bs_IGroup, bs_ISubGroup,
+                   bs_PE, bs_PB, bs_ROE, bs_EPS, bs_OPM, bs_NPM
+            FROM e_bs_header_info_bse
+        """)
+        return {r['bs_ISIN']: r for r in rows}
+
+    async def get_companies(self):
+        return await self._fetchall(self.datamart_pool, """
+            SELECT bs_ISIN as isin, bs_SYMBOL as symbol, bs_Available_ON as exchange, (BINARY bs_Status = 'Active') as is_active
+            FROM vw_e_bs_companies_all
+        """)
+
+    async def get_favourite_rows(self):
+        return await self._fetchall(self.datamart_pool, "SELECT bs_ISIN as isin, bs_symbol as symbol, dim_favourites FROM vw_e_bs_companies_favourite_indices")
+
+    # --- Settings ---
+    async def get_settings_rows(self, profile_id):
+        return await self._fetchall(
+            self.app_pool,
+            "SELECT indicator_key, is_enabled, params_json FROM app_sg_indicator_settings WHERE profile_id = %s",
+            (profile_id,)
+        )
+
+    async def get_settings_version(self, profile_id):
+        rows = await self._fetchall(self.app_pool, "SELECT version FROM app_sg_settings_version WHERE profile_id = %s", (profile_id,), dict_rows=False)
+        return int(rows[0][0]) if rows else 0
+
+    async def bump_settings_version(self, profile_id):
+        await self._executemany(
+            "INSERT INTO app_sg_settings_version (profile_id, version) VALUES (%s, 1) ON DUPLICATE KEY UPDATE version = version + 1",
+            [(profile_id,)]
+        )
+
+    # --- OHLCV ---
+    async def get_ohlcv_isins(self, timeframe):
+        rows = await self._fetchall(self.app_pool, "SELECT DISTINCT isin FROM app_sg_ohlcv_prices WHERE timeframe = %s", (timeframe,), dict_rows=False)
+        return {r[0] for r in rows}
+
+    async def fetch_ohlcv_matrix(self, isins, timeframe, limit=None, start=None, end=None):
+        if not isins:
+            return np.empty((0, 7))
+        format_strings = ','.join(['%s'] * len(isins))
+        where = ["timeframe = %s", f"isin IN ({format_strings})"]
+        params = [timeframe, *isins]
+        if start is not None:
+            where.append("timestamp >= %s"); params.append(start)
+        if end is not None:
+            where.append("timestamp <= %s"); params.append(end)
+        source = f"SELECT * FROM app_sg_ohlcv_prices WHERE {' AND '.join(where)}"
+        if limit is not None:
+            source = f"""
+                SELECT * FROM (
+                    SELECT p.*, ROW_NUMBER() OVER (PARTITION BY isin ORDER BY timestamp DESC) AS rn
+                    FROM app_sg_ohlcv_prices p WHERE {' AND '.join(where)}
+                ) latest WHERE rn <= %s
+            """
+            params.append(limit)
+        # Server-side casts: the driver only ever sees doubles, never Decimal/datetime objects
+        query = f"""
+            SELECT FIELD(isin, {format_strings}) - 1,
+                   TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', timestamp),
+                   CAST(open AS DOUBLE), CAST(high AS DOUBLE), CAST(low AS DOUBLE),
+                   CAST(close AS DOUBLE), CAST(volume AS DOUBLE)
+            FROM ({source}) src
+        """
+        rows = await self._fetchall(self.app_pool, query, (*isins, *params), dict_rows=False)
+        if not rows:
+            return np.empty((0, 7))
+        return np.array(rows, dtype=np.float64)
+
+    async def fetch_ohlcv_range(self, isin, timeframe, start, end):
+        return list(await self._fetchall(self.app_pool, """
+            SELECT timestamp, open, high, low, close, volume
+            FROM app_sg_ohlcv_prices
+            WHERE isin = %s AND timeframe = %s
+            AND timestamp >= %s AND timestamp <= %s
+            ORDER BY timestamp ASC
+        """, (isin, timeframe, start, end)))
+
+    async def get_latest_timestamp(self, isin, timeframe):
+        rows = await self._fetchall(
+            self.app_pool,
+            "SELECT MAX(timestamp) FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = %s",
+            (isin, timeframe), dict_rows=False
+        )
+        return rows[0][0] if rows else None
+
+    async def fetch_session_bars(self, isin, timeframe, session_date):
+        return list(await self._fetchall(self.app_pool, """
+            SELECT timestamp, open, high, low, close, volume
+            FROM app_sg_ohlcv_prices
+            WHERE isin = %s AND timeframe = %s AND DATE(timestamp) = %s
+            ORDER BY timestamp ASC
+        """, (isin, timeframe, session_date)))
+
+    async def fetch_closes(self, isin, timeframe, limit):
+        return list(await self._fetchall(
+            self.app_pool,
+            "SELECT close FROM app_sg_ohlcv_prices WHERE isin = %s AND timeframe = %s ORDER BY timestamp DESC LIMIT %s",
+            (isin, timeframe, limit)
+        ))
+
+    async def get_latest_timestamps(self, isins, timeframe):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT isin, MAX(timestamp) FROM app_sg_ohlcv_prices WHERE timeframe = %s AND isin IN ({format_strings}) GROUP BY isin",
+            (timeframe, *isins), dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def fetch_live_sessions(self, isins, timeframe='5m'):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(self.app_pool, LIVE_SESSION_SQL.format(p='%s', isins=format_strings), (timeframe, *isins, timeframe))
+        return {r['isin']: r for r in rows}
+
+    async def upsert_ohlcv(self, rows):
+        changed = set()
+        async with self.app_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                for pair, group in group_pairs(rows).items():
+                    # One statement per pair: affected rows is 0 when every bar already matched
+                    # (the connection does not set CLIENT_FOUND_ROWS)
+                    if await cur.executemany("""
+                        INSERT INTO app_sg_ohlcv_prices (isin, timeframe, timestamp, open, high, low, close, volume)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            open=VALUES(open), high=VALUES(high), low=VALUES(low),
+                            close=VALUES(close), volume=VALUES(volume)
+                    """, group):
+                        changed.add(pair)
+                if changed:
+                    await cur.executemany(
+                        "INSERT INTO app_sg_ohlcv_changes (isin, timeframe, changed_at) VALUES (%s, %s, NOW()) ON DUPLICATE KEY UPDATE changed_at = NOW()",
+                        sorted(changed)
+                    )
+        return changed
+
+    # --- Change Tracking ---
+    async def get_db_time(self):
+        rows = await self._fetchall(self.app_pool, "SELECT NOW()", dict_rows=False)
+        return rows[0][0]
+
+    async def get_change_times(self, isins, timeframe):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT isin, changed_at FROM app_sg_ohlcv_changes WHERE timeframe = %s AND isin IN ({format_strings})",
+            (timeframe, *isins), dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def get_changed_isins(self, timeframes, since):
+        format_strings = ','.join(['%s'] * len(timeframes))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT DISTINCT isin FROM app_sg_ohlcv_changes WHERE timeframe IN ({format_strings}) AND changed_at >= %s",
+            (*timeframes, since), dict_rows=False
+        )
+        return {r[0] for r in rows}
+
+    async def get_calc_watermarks(self, profile_id):
+        rows = await self._fetchall(
+            self.app_pool,
+            "SELECT timeframe, settings_version, settings_key, calc_started_at FROM app_sg_calc_watermark WHERE profile_id = %s",
+            (profile_id,)
+        )
+        return {r['timeframe']: r for r in rows}
+
+    async def save_calc_watermarks(self, rows):
+        await self._executemany(f"""
+            INSERT INTO app_sg_calc_watermark ({', '.join(WATERMARK_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(WATERMARK_COLUMNS))})
+            ON DUPLICATE KEY UPDATE settings_version=VALUES(settings_version), settings_key=VALUES(settings_key),
+                calc_started_at=VALUES(calc_started_at)
+        """, rows)
+
+    # --- Signals ---
+    async def get_signal_meta(self, isin, timeframe, profile_id):
+        rows = await self._fetchall(
+            self.app_pool,
+            "SELECT candlestick_pattern, pattern_score, supertrend_dir, confluence_rank FROM app_sg_calculated_signals WHERE isin = %s AND timeframe = %s AND profile_id = %s",
+            (isin, timeframe, profile_id)
+        )
+        return rows[0] if rows else None
+
+    async def get_signal_isins(self, profile_id, timeframe):
+        rows = await self._fetchall(
+            self.app_pool,
+            "SELECT isin FROM app_sg_calculated_signals WHERE profile_id = %s AND timeframe = %s",
+            (profile_id, timeframe), dict_rows=False
+        )
+        return {r[0] for r in rows}
+
+    async def upsert_signals(self, rows):
+        placeholders = ', '.join(['%s'] * len(SIGNAL_COLUMNS))
+        updates = ', '.join(f"{c}=VALUES({c})" for c in SIGNAL_COLUMNS if c not in SIGNAL_KEY_COLUMNS)
+        await self._executemany(f"""
+            INSERT INTO app_sg_calculated_signals ({', '.join(SIGNAL_COLUMNS)})
+            VALUES ({placeholders})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, rows)
+
+    async def insert_signal_history(self, rows):
+        placeholders = ', '.join(['%s'] * len(HISTORY_COLUMNS))
+        await self._executemany(f"""
+            INSERT IGNORE INTO app_sg_signal_history ({', '.join(HISTORY_COLUMNS)})
+            VALUES ({placeholders})
+        """, rows)
+
+    async def merge_signals(self, rows):
+        if not rows:
+            return
+        cols = ', '.join(SIGNAL_COLUMNS)
+        updates = ', '.join(f"{c}=s.{c}" for c in SIGNAL_COLUMNS if c not in SIGNAL_KEY_COLUMNS)
+        async with self.app_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                # Session-scoped stage with the live table's column types, reused by this connection
+                await cur.execute(f"""
+                    CREATE TEMPORARY TABLE IF NOT EXISTS app_sg_signal_stage
+                    AS SELECT {cols}, CAST(NULL AS CHAR(50)) AS symbol FROM app_sg_calculated_signals LIMIT 0
+                """)
+                await cur.execute("DELETE FROM app_sg_signal_stage")
+                # Multi-row INSERT batches (PyMySQL rewrites executemany up to max_allowed_packet)
+                await cur.executemany(f"""
+                    INSERT INTO app_sg_signal_stage ({', '.join(STAGE_COLUMNS)})
+                    VALUES ({', '.join(['%s'] * len(STAGE_COLUMNS))})
+                """, rows)
+                await cur.execute(f"""
+                    INSERT INTO app_sg_calculated_signals ({cols})
+                    SELECT {cols} FROM app_sg_signal_stage s
+                    ON DUPLICATE KEY UPDATE {updates}
+                """)
+                await cur.execute(f"""
+                    INSERT IGNORE INTO app_sg_signal_history ({', '.join(HISTORY_COLUMNS)})
+                    SELECT {', '.join(HISTORY_COLUMNS)} FROM app_sg_signal_stage
+                    WHERE ABS(confluence_rank) >= %s
+                """, (HISTORY_MIN_RANK,))
+
+    async def get_signal_columns(self, profile_id, timeframe, columns):
+        cols = ', '.join(['isin'] + [c for c in columns if c in SIGNAL_COLUMNS and c != 'isin'])
+        return await self._fetchall(
+            self.app_pool,
+            f"SELECT {cols} FROM app_sg_calculated_signals WHERE profile_id = %s AND timeframe = %s",
+            (profile_id, timeframe)
+        )
+
+    async def update_signal_features(self, rows):
+        if not rows:
+            return
+        stage_cols = SIGNAL_KEY_COLUMNS + FEATURE_COLUMNS
+        on = ' AND '.join(f"t.{c} = s.{c}" for c in SIGNAL_KEY_COLUMNS)
+        async with self.app_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"""
+                    CREATE TEMPORARY TABLE IF NOT EXISTS app_sg_feature_stage
+                    AS SELECT {', '.join(stage_cols)} FROM app_sg_calculated_signals LIMIT 0
+                """)
+                await cur.execute("DELETE FROM app_sg_feature_stage")
+                await cur.executemany(f"""
+                    INSERT INTO app_sg_feature_stage ({', '.join(stage_cols)})
+                    VALUES ({', '.join(['%s'] * len(stage_cols))})
+                """, rows)
+                await cur.execute(f"""
+                    UPDATE app_sg_calculated_signals t JOIN app_sg_feature_stage s ON {on}
+                    SET {', '.join(f't.{c} = s.{c}' for c in FEATURE_COLUMNS)}
+                """)
+
+    async def get_index_change(self, index_name):
+        rows = await self._fetchall(
+            self.datamart_pool,
+            "SELECT bs_percentChange FROM e_bs_indices_nse WHERE bs_index = %s OR bs_indexSymbol = %s LIMIT 1",
+            (index_name, index_name), dict_rows=False
+        )
+        return float(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    # --- Indicator State ---
+    async def get_indicator_states(self, isins, timeframe, settings_hash):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT isin, state_json FROM app_sg_indicator_state WHERE timeframe = %s AND settings_hash = %s AND isin IN ({format_strings})",
+            (timeframe, settings_hash, *isins), dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def save_indicator_states(self, rows):
+        await self._executemany(f"""
+            INSERT INTO app_sg_indicator_state ({', '.join(STATE_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(STATE_COLUMNS))})
+            ON DUPLICATE KEY UPDATE last_bar_ts=VALUES(last_bar_ts), state_json=VALUES(state_json)
+        """, rows)
+
+    async def get_node_outputs(self, isins, timeframe, node_ids):
+        if not isins or not node_ids:
+            return []
+        isin_strings = ','.join(['%s'] * len(isins))
+        node_strings = ','.join(['%s'] * len(node_ids))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT isin, node_id, data_version, output_json FROM app_sg_node_memo "
+            f"WHERE timeframe = %s AND isin IN ({isin_strings}) AND node_id IN ({node_strings})",
+            (timeframe, *isins, *node_ids), dict_rows=False
+        )
+        return [tuple(r) for r in rows]
+
+    async def save_node_outputs(self, rows):
+        await self._executemany(f"""
+            INSERT INTO app_sg_node_memo ({', '.join(NODE_MEMO_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(NODE_MEMO_COLUMNS))})
+            ON DUPLICATE KEY UPDATE data_version=VALUES(data_version), output_json=VALUES(output_json)
+        """, rows)
+
+    # --- DMA Store ---
+    async def get_latest_dma(self, isins):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(self.app_pool, f"""
+            SELECT isin, period, as_of, value, computed_at FROM (
+                SELECT d.*, ROW_NUMBER() OVER (PARTITION BY isin, period ORDER BY as_of DESC) AS rn
+                FROM app_sg_dma d WHERE isin IN ({format_strings})
+            ) latest WHERE rn = 1
+        """, tuple(isins))
+        out = {}
+        for r in rows:
+            out.setdefault(r['isin'], {})[r['period']] = r
+        return out
+
+    async def save_dma(self, rows):
+        await self._executemany(f"""
+            INSERT INTO app_sg_dma ({', '.join(DMA_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(DMA_COLUMNS))})
+            ON DUPLICATE KEY UPDATE value=VALUES(value), computed_at=VALUES(computed_at)
+        """, rows)
+
+    # --- Time-of-Day Volume ---
+    async def get_tod_volume(self, isins):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT {', '.join(TOD_VOLUME_COLUMNS)} FROM app_sg_tod_volume WHERE isin IN ({format_strings})",
+            tuple(isins)
+        )
+        return {r['isin']: r for r in rows}
+
+    async def save_tod_volume(self, rows):
+        updates = ', '.join(f"{c}=VALUES({c})" for c in TOD_VOLUME_COLUMNS if c != 'isin')
+        await self._executemany(f"""
+            INSERT INTO app_sg_tod_volume ({', '.join(TOD_VOLUME_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(TOD_VOLUME_COLUMNS))})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, rows)
+
+    # --- Volume Profile ---
+    async def get_vpvr_states(self, isins, timeframe):
+        if not isins:
+            return {}
+        format_strings = ','.join(['%s'] * len(isins))
+        rows = await self._fetchall(
+            self.app_pool,
+            f"SELECT isin, state_json FROM app_sg_vpvr WHERE timeframe = %s AND isin IN ({format_strings})",
+            (timeframe, *isins), dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows if r[1]}
+
+    async def get_vpvr(self, isin, timeframe):
+        rows = await self._fetchall(
+            self.app_pool,
+            "SELECT bins, last_bar_ts, levels_json FROM app_sg_vpvr WHERE isin = %s AND timeframe = %s",
+            (isin, timeframe)
+        )
+        return rows[0] if rows else None
+
+    async def save_vpvr(self, rows):
+        await self._executemany(f"""
+            INSERT INTO app_sg_vpvr ({', '.join(VPVR_COLUMNS)})
+            VALUES ({', '.join(['%s'] * len(VPVR_COLUMNS))})
+            ON DUPLICATE KEY UPDATE bins=VALUES(bins), last_bar_ts=VALUES(last_bar_ts),
+                levels_json=VALUES(levels_json), state_json=VALUES(state_json)
+        """, rows)
+
+    async def close(self):
+        for pool in (self.app_pool, self.datamart_pool):
+            if pool is not None:
+                pool.close()
+                await pool.wait_closed()
+
+
+EMBEDDED_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS app_sg_ohlcv_prices (
+        isin VARCHAR, timeframe VARCHAR, timestamp TIMESTAMP,
+        open DOUBLE, high DOUBLE, low DOUBLE, close DOUBLE, volume BIGINT,
+        PRIMARY KEY (isin, timeframe, timestamp))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_indicator_settings (
+        profile_id VARCHAR, indicator_key VARCHAR, is_enabled BOOLEAN DEFAULT TRUE, params_json VARCHAR,
+        PRIMARY KEY (profile_id, indicator_key))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_settings_version (
+        profile_id VARCHAR PRIMARY KEY, version BIGINT NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS app_sg_calculated_signals (
+        isin VARCHAR, profile_id VARCHAR, timeframe VARCHAR, timestamp TIMESTAMP,
+        ltp DOUBLE, rsi DOUBLE, rsi_day_high DOUBLE, rsi_day_low DOUBLE,
+        ema_signal VARCHAR, ema_fast DOUBLE, ema_slow DOUBLE, volume_signal VARCHAR, volume_ratio DOUBLE,
+        ema_value DOUBLE, supertrend_dir VARCHAR, supertrend_value DOUBLE, dma_data VARCHAR,
+        confluence_rank INTEGER, sl DOUBLE, target DOUBLE, trade_strategy VARCHAR,
+        candlestick_pattern VARCHAR, pattern_score INTEGER, last_5_candles VARCHAR,
+        sector VARCHAR, industry VARCHAR, pe DOUBLE, pb DOUBLE, roe DOUBLE, eps DOUBLE, opm DOUBLE, npm DOUBLE,
+        i_group VARCHAR, i_subgroup VARCHAR, is_fav BOOLEAN, is_holding BOOLEAN, ret_pct DOUBLE,
+        sr_levels VARCHAR, support DOUBLE, resistance DOUBLE, rank_history VARCHAR, rsi_sector_pct DOUBLE, ret_rank INTEGER, ret_group_pct DOUBLE, beta DOUBLE, rel_strength DOUBLE,
+        PRIMARY KEY (isin, profile_id, timeframe))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_signal_history (
+        isin VARCHAR, symbol VARCHAR, profile_id VARCHAR, timeframe VARCHAR, timestamp TIMESTAMP,
+        ltp DOUBLE, rsi DOUBLE, confluence_rank INTEGER, trade_strategy VARCHAR, sl DOUBLE, target DOUBLE,
+        PRIMARY KEY (isin, profile_id, timeframe, timestamp))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_indicator_state (
+        isin VARCHAR, timeframe VARCHAR, settings_hash VARCHAR, last_bar_ts TIMESTAMP, state_json VARCHAR,
+        PRIMARY KEY (isin, timeframe, settings_hash))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_node_memo (
+        isin VARCHAR, timeframe VARCHAR, node_id VARCHAR, data_version VARCHAR, output_json VARCHAR,
+        PRIMARY KEY (isin, timeframe, node_id))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_vpvr (
+        isin VARCHAR, timeframe VARCHAR, bins INTEGER, last_bar_ts TIMESTAMP, levels_json VARCHAR, state_json VARCHAR,
+        PRIMARY KEY (isin, timeframe))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_ohlcv_changes (
+        isin VARCHAR, timeframe VARCHAR, changed_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (isin, timeframe))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_dma (
+        isin VARCHAR, period INTEGER, as_of DATE, value DOUBLE, computed_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (isin, period, as_of))""",
+    """CREATE TABLE IF NOT EXISTS app_sg_tod_volume (
+        isin VARCHAR PRIMARY KEY, sessions INTEGER, through DATE, forming DATE, slots_json VARCHAR, computed_at TIMESTAMP NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS app_sg_calc_watermark (
+        profile_id VARCHAR, timeframe VARCHAR, settings_version BIGINT, settings_key VARCHAR, calc_started_at TIMESTAMP NOT NULL,
+        PRIMARY KEY (profile_id, timeframe))""",
+    """CREATE TABLE IF NOT EXISTS tb_app_sf_holdings (isin VARCHAR, symbol VARCHAR)""",
+    """CREATE TABLE IF NOT EXISTS vw_e_bs_companies_all (
+        bs_ISIN VARCHAR PRIMARY KEY, bs_SYMBOL VARCHAR, bs_Status VARCHAR, bs_Available_ON VARCHAR)""",
+    """CREATE TABLE IF NOT EXISTS vw_e_bs_companies_favourite_indices (
+        bs_ISIN VARCHAR, bs_symbol VARCHAR, dim_favourites INTEGER)""",
+    """CREATE TABLE IF NOT EXISTS e_bs_header_info_bse (
+        bs_ISIN VARCHAR PRIMARY KEY, bs_SecurityId VARCHAR, bs_Sector VARCHAR, bs_IndustryNew VARCHAR,
+        bs_IGroup VARCHAR, bs_ISubGroup VARCHAR,
+        bs_PE DOUBLE, bs_PB DOUBLE, bs_ROE DOUBLE, bs_EPS DOUBLE, bs_OPM DOUBLE, bs_NPM DOUBLE)""",
+    """CREATE TABLE IF NOT EXISTS e_bs_indices_nse (
+        bs_key VARCHAR, bs_index VARCHAR, bs_indexSymbol VARCHAR, bs_last DOUBLE, bs_percentChange DOUBLE)""",
+]
+
+
+class EmbeddedStorage(Storage):
+    """
+    Storage over a local DuckDB database holding the same tables as MySQL.
+    Used for offline benchmarks, CI and columnar backtests; fill it with `mirror()`.
+    """
+
+    def __init__(self, path=":memory:"):
+        import duckdb
+        self.path = path
+        self.con = duckdb.connect(path)
+        for ddl in EMBEDDED_SCHEMA:
+            self.con.execute(ddl)
+
+    @property
+    def source_key(self):
+        return id(self) if self.path == ":memory:" else f"duckdb:{self.path}"
+
+    def _fetchall(self, query, params=None, dict_rows=True):
+        cur = self.con.execute(query, params or [])
+        rows = cur.fetchall()
+        if not dict_rows:
+            return rows
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in rows]
+
+    def _executemany(self, query, rows):
+        if rows:
+            self.con.executemany(query, [list(r) for r in rows])
+
+    def _upsert_frame(self, table, columns, key_columns, rows, update=True, track=None):
+        """
+        Bulk path: registers rows as a DataFrame and merges them with one INSERT ... SELECT.
+        With `track` (a subset of the key columns), returns the distinct `track` tuples of
+        rows that are new or differ from what is stored.
+        """
+        if not rows:
+            return set()
+        frame = pd.DataFrame([tuple(r) for r in rows], columns=list(columns))
+        # DuckDB refuses to touch the same key twice in one statement
+        frame = frame.drop_duplicates(subset=list(key_columns), keep='last')
+        cols = ', '.join(columns)
+        if update:
+            updates = ', '.join(f"{c}=EXCLUDED.{c}" for c in columns if c not in key_columns)
+            conflict = f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET {updates}"
+        else:
+            conflict = "ON CONFLICT DO NOTHING"
+        changed = set()
+        self.con.register('_incoming', frame)
+        try:
+            if track:
+                on = ' AND '.join(f"t.{c} = i.{c}" for c in key_columns)
+                differs = ' OR '.join(f"t.{c} IS DISTINCT FROM i.{c}" for c in columns if c not in key_columns)
+                changed = {tuple(r) for r in self.con.execute(f"""
+                    SELECT DISTINCT {', '.join(f'i.{c}' for c in track)} FROM _incoming i
+                    LEFT JOIN {table} t ON {on}
+                    WHERE t.{key_columns[0]} IS NULL OR {differs}
+                """).fetchall()}
+            self.con.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM _incoming {conflict}")
+        finally:
+            self.con.unregister('_incoming')
+        return changed
+
+    # --- Universe ---
+    async def get_holdings_isins(self):
+        return {r[0] for r in self._fetchall("SELECT DISTINCT isin FROM tb_app_sf_holdings", dict_rows=False) if r[0]}
+
+    async def get_active_universe(self, target_dim):
+        return self._fetchall("""
+            SELECT a.bs_ISIN as isin, a.bs_SYMBOL as symbol, a.bs_Available_ON as exchange, f.dim_favourites
+            FROM vw_e_bs_companies_all a
+            LEFT JOIN vw_e_bs_companies_favourite_indices f ON a.bs_SYMBOL = f.bs_symbol AND f.dim_favourites = ?
+            WHERE a.bs_Status = 'Active'
+        """, [target_dim])
+
+    async def get_symbol_map(self, active_only=True):
+        query = "SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all"
+        if active_only:
+            query += " WHERE bs_Status = 'Active'"
+        return {r[0]: r[1] for r in self._fetchall(query, dict_rows=False)}
+
+    async def resolve_symbols(self, symbols=None):
+        if symbols:
+            format_strings = ','.join(['?'] * len(symbols))
+            rows = self._fetchall(f"SELECT bs_ISIN, bs_SYMBOL FROM vw_e_bs_companies_all WHERE bs_SYMBOL IN ({format_strings})", list(symbols), dict_rows=False)
+        else:
+            rows = self._fetchall("SELECT bs_ISIN, bs_symbol FROM vw_e_bs_companies_favourite_indices", dict_rows=False)
+        return {r[0]: r[1] for r in rows}
+
+    async def get_fundamentals(self):
+        return {r['bs_ISIN']: r for r in self._fetchall("SELECT * FROM e_bs_header_info_bse")}
+
+    async def get_companies(self):
+        return self._fetchall("""
+            SELECT bs_ISIN as isin, bs_SYMBOL as symbol, bs_Available_ON as exchange, (bs_Status = 'Active') as is_active
+            FROM vw_e_bs_companies_all
+        """)
+
+    async def get_favourite_rows(self):
+        return self._fetchall("SELECT bs_ISIN as isin, bs_symbol as symbol, dim_favourites FROM vw_e_bs_companies_favourite_indices")
+
+    # --- Settings ---
+    async def get_settings_rows(self, profile_id):
+        return self._fetchall(
+            "SELECT indicator_key, is_enabled, params_json FROM app_sg_indicator_settings WHERE profile_id = ?",
+            [profile_id]
+        )
+
+    async def get_settings_version(self, profile_id):
+        rows = self._fetchall("SELECT version FROM app_sg_settings_version WHERE profile_id = ?", [profile_id], dict_rows=False)
+        return int(rows[0][0]) if rows else 0
+
+    async def bump_settings_version(self, profile_id):
+        self._executemany(
+            "INSERT INTO app_sg_settings_version VALUES (?, 1) ON CONFLICT (profile_id) DO UPDATE SET version = version + 1",
+            [(profile_id,)]
+        )
+
+    # --- OHLCV ---
+    async def get_ohlcv_isins(self, timeframe):
+        return {r[0] for r in self._fetchall("SELECT DISTINCT isin FROM app_sg_ohlcv_prices WHERE timeframe = ?", [timeframe], dict_rows=False)}
+
+    async def fetch_ohlcv_matrix(self, isins, timeframe, limit=None, start=None, end=None):
+        if not isins:
+            return np.empty((0, 7))
+        format_strings = ','.join(['?'] * len(isins))
+        where = ["timeframe = ?", f"isin IN ({format_strings})"]
+        params = [timeframe, *isins]
+        if start is not None:
+            where.append("timestamp >= ?"); params.append(start)
+        if end is not None:
+            where.append("timestamp <= ?"); params.append(end)
+        source = f"SELECT * FROM app_sg_ohlcv_prices WHERE {' AND '.join(where)}"
+        if limit is not None:
+            source = f"""
+                SELECT * FROM (
+                    SELECT p.*, ROW_NUMBER() OVER (PARTITION BY isin ORDER BY timestamp DESC) AS rn
+                    FROM app_sg_ohlcv_prices p WHERE {' AND '.join(where)}
+                ) latest WHERE rn <= ?
+            """
+            params.append(limit)
+        # Columnar fetch straight into NumPy
+        cols = self.con.execute(f"""
+            SELECT list_position(?, isin) - 1, epoch(timestamp), open, high, low, close, CAST(volume AS DOUBLE)
+            FROM ({source}) src
+        """, [list(isins), *params]).fetchnumpy()
+        return np.column_stack([np.asarray(c, dtype=np.float64) for c in cols.values()]).reshape(-1, 7)
+
+    async def fetch_ohlcv_range(self, isin, timeframe, start, end):
+        return self._fetchall("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM app_sg_ohlcv_prices
+            WHERE isin = ? AND timeframe = ? AND timestamp >= ? AND timestamp <= ?
+            ORDER BY timestamp ASC
+        """, [isin, timeframe, start, end])
+
+    async def get_latest_timestamp(self, isin, timeframe):
+        rows = self._fetchall("SELECT MAX(timestamp) FROM app_sg_ohlcv_prices WHERE isin = ? AND timeframe = ?", [isin, timeframe], dict_rows=False)
+        return rows[0][0] if rows else None
+
+    async def fetch_session_bars(self, isin, timeframe, session_date):
+        return self._fetchall("""
+            SELECT timestamp, open, high, low, close, volume
+            FROM app_sg_ohlcv_prices
+            WHERE isin = ? AND timeframe = ? AND CAST(timestamp AS DATE) = CAST(? AS DATE)
+            ORDER BY timestamp ASC
+        """, [isin, timeframe, session_date])
+
+    async def fetch_closes(self, isin, timeframe, limit):
+        return self._fetchall(
+            "SELECT close FROM app_sg_ohlcv_prices WHERE isin = ? AND timeframe = ? ORDER BY timestamp DESC LIMIT ?",
+            [isin, timeframe, limit]
+        )
+
+    async def get_latest_timestamps(self, isins, timeframe):
+        if not isins:
+            return {}
+        rows = self._fetchall(
+            "SELECT isin, MAX(timestamp) FROM app_sg_ohlcv_prices WHERE timeframe = ? AND list_contains(?, isin) GROUP BY isin",
+            [timeframe, list(isins)], dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def fetch_live_sessions(self, isins, timeframe='5m'):
+        if not isins:
+            return {}
+        format_strings = ','.join(['?'] * len(isins))
+        rows = self._fetchall(LIVE_SESSION_SQL.format(p='?', isins=format_strings), [timeframe, *isins, timeframe])
+        return {r['isin']: r for r in rows}
+
+    async def upsert_ohlcv(self, rows):
+        changed = self._upsert_frame('app_sg_ohlcv_prices', OHLCV_COLUMNS, ('isin', 'timeframe', 'timestamp'), rows,
+                                     track=('isin', 'timeframe'))
+        self._executemany(
+            "INSERT INTO app_sg_ohlcv_changes VALUES (?, ?, CAST(current_timestamp AS TIMESTAMP)) "
+            "ON CONFLICT (isin, timeframe) DO UPDATE SET changed_at = EXCLUDED.changed_at",
+            sorted(changed)
+        )
+        return changed
+
+    # --- Change Tracking ---
+    async def get_db_time(self):
+        return self._fetchall("SELECT CAST(current_timestamp AS TIMESTAMP)", dict_rows=False)[0][0]
+
+    async def get_change_times(self, isins, timeframe):
+        if not isins:
+            return {}
+        rows = self._fetchall(
+            "SELECT isin, changed_at FROM app_sg_ohlcv_changes WHERE timeframe = ? AND list_contains(?, isin)",
+            [timeframe, list(isins)], dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def get_changed_isins(self, timeframes, since):
+        rows = self._fetchall(
+            "SELECT DISTINCT isin FROM app_sg_ohlcv_changes WHERE list_contains(?, timeframe) AND changed_at >= ?",
+            [list(timeframes), since], dict_rows=False
+        )
+        return {r[0] for r in rows}
+
+    async def get_calc_watermarks(self, profile_id):
+        rows = self._fetchall(
+            "SELECT timeframe, settings_version, settings_key, calc_started_at FROM app_sg_calc_watermark WHERE profile_id = ?",
+            [profile_id]
+        )
+        return {r['timeframe']: r for r in rows}
+
+    async def save_calc_watermarks(self, rows):
+        self._upsert_frame('app_sg_calc_watermark', WATERMARK_COLUMNS, WATERMARK_KEY_COLUMNS, rows)
+
+    # --- Signals ---
+    async def get_signal_meta(self, isin, timeframe, profile_id):
+        rows = self._fetchall(
+            "SELECT candlestick_pattern, pattern_score, supertrend_dir, confluence_rank FROM app_sg_calculated_signals WHERE isin = ? AND timeframe = ? AND profile_id = ?",
+            [isin, timeframe, profile_id]
+        )
+        return rows[0] if rows else None
+
+    async def get_signal_isins(self, profile_id, timeframe):
+        rows = self._fetchall("SELECT isin FROM app_sg_calculated_signals WHERE profile_id = ? AND timeframe = ?", [profile_id, timeframe], dict_rows=False)
+        return {r[0] for r in rows}
+
+    async def upsert_signals(self, rows):
+        self._upsert_frame('app_sg_calculated_signals', SIGNAL_COLUMNS, SIGNAL_KEY_COLUMNS, rows)
+
+    async def insert_signal_history(self, rows):
+        self._upsert_frame('app_sg_signal_history', HISTORY_COLUMNS, ('isin', 'profile_id', 'timeframe', 'timestamp'), rows, update=False)
+
+    async def merge_signals(self, rows):
+        if not rows:
+            return
+        # The registered DataFrame is the stage; both merges read it
+        frame = pd.DataFrame([tuple(r) for r in rows], columns=list(STAGE_COLUMNS))
+        frame = frame.drop_duplicates(subset=list(SIGNAL_KEY_COLUMNS), keep='last')
+        cols = ', '.join(SIGNAL_COLUMNS)
+        updates = ', '.join(f"{c}=EXCLUDED.{c}" for c in SIGNAL_COLUMNS if c not in SIGNAL_KEY_COLUMNS)
+        self.con.register('_stage', frame)
+        try:
+            self.con.execute(f"INSERT INTO app_sg_calculated_signals ({cols}) SELECT {cols} FROM _stage "
+                             f"ON CONFLICT ({', '.join(SIGNAL_KEY_COLUMNS)}) DO UPDATE SET {updates}")
+            self.con.execute(f"INSERT INTO app_sg_signal_history ({', '.join(HISTORY_COLUMNS)}) "
+                             f"SELECT {', '.join(HISTORY_COLUMNS)} FROM _stage WHERE abs(confluence_rank) >= ? ON CONFLICT DO NOTHING",
+                             [HISTORY_MIN_RANK])
+        finally:
+            self.con.unregister('_stage')
+
+    async def get_signal_columns(self, profile_id, timeframe, columns):
+        cols = ', '.join(['isin'] + [c for c in columns if c in SIGNAL_COLUMNS and c != 'isin'])
+        return self._fetchall(f"SELECT {cols} FROM app_sg_calculated_signals WHERE profile_id = ? AND timeframe = ?", [profile_id, timeframe])
+
+    async def update_signal_features(self, rows):
+        if not rows:
+            return
+        frame = pd.DataFrame([tuple(r) for r in rows], columns=list(SIGNAL_KEY_COLUMNS + FEATURE_COLUMNS))
+        frame = frame.drop_duplicates(subset=list(SIGNAL_KEY_COLUMNS), keep='last')
+        on = ' AND '.join(f"t.{c} = s.{c}" for c in SIGNAL_KEY_COLUMNS)
+        self.con.register('_features', frame)
+        try:
+            self.con.execute(f"UPDATE app_sg_calculated_signals t SET {', '.join(f'{c} = s.{c}' for c in FEATURE_COLUMNS)} "
+                             f"FROM _features s WHERE {on}")
+        finally:
+            self.con.unregister('_features')
+
+    async def get_index_change(self, index_name):
+        rows = self._fetchall("SELECT bs_percentChange FROM e_bs_indices_nse WHERE bs_index = ? OR bs_indexSymbol = ? LIMIT 1",
+                              [index_name, index_name], dict_rows=False)
+        return float(rows[0][0]) if rows and rows[0][0] is not None else None
+
+    # --- Indicator State ---
+    async def get_indicator_states(self, isins, timeframe, settings_hash):
+        if not isins:
+            return {}
+        rows = self._fetchall(
+            "SELECT isin, state_json FROM app_sg_indicator_state WHERE timeframe = ? AND settings_hash = ? AND list_contains(?, isin)",
+            [timeframe, settings_hash, list(isins)], dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows}
+
+    async def save_indicator_states(self, rows):
+        self._upsert_frame('app_sg_indicator_state', STATE_COLUMNS, STATE_KEY_COLUMNS, rows)
+
+    async def get_node_outputs(self, isins, timeframe, node_ids):
+        if not isins or not node_ids:
+            return []
+        return self._fetchall(
+            "SELECT isin, node_id, data_version, output_json FROM app_sg_node_memo "
+            "WHERE timeframe = ? AND list_contains(?, isin) AND list_contains(?, node_id)",
+            [timeframe, list(isins), list(node_ids)], dict_rows=False
+        )
+
+    async def save_node_outputs(self, rows):
+        self._upsert_frame('app_sg_node_memo', NODE_MEMO_COLUMNS, NODE_MEMO_KEY_COLUMNS, rows)
+
+    # --- DMA Store ---
+    async def get_latest_dma(self, isins):
+        if not isins:
+            return {}
+        rows = self._fetchall("""
+            SELECT isin, period, as_of, value, computed_at FROM app_sg_dma
+            WHERE list_contains(?, isin)
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY isin, period ORDER BY as_of DESC) = 1
+        """, [list(isins)])
+        out = {}
+        for r in rows:
+            out.setdefault(r['isin'], {})[r['period']] = r
+        return out
+
+    async def save_dma(self, rows):
+        self._upsert_frame('app_sg_dma', DMA_COLUMNS, DMA_KEY_COLUMNS, rows)
+
+    # --- Time-of-Day Volume ---
+    async def get_tod_volume(self, isins):
+        if not isins:
+            return {}
+        rows = self._fetchall(f"SELECT {', '.join(TOD_VOLUME_COLUMNS)} FROM app_sg_tod_volume WHERE list_contains(?, isin)", [list(isins)])
+        return {r['isin']: r for r in rows}
+
+    async def save_tod_volume(self, rows):
+        self._upsert_frame('app_sg_tod_volume', TOD_VOLUME_COLUMNS, ('isin',), rows)
+
+    # --- Volume Profile ---
+    async def get_vpvr_states(self, isins, timeframe):
+        if not isins:
+            return {}
+        rows = self._fetchall(
+            "SELECT isin, state_json FROM app_sg_vpvr WHERE timeframe = ? AND list_contains(?, isin)",
+            [timeframe, list(isins)], dict_rows=False
+        )
+        return {r[0]: r[1] for r in rows if r[1]}
+
+    async def get_vpvr(self, isin, timeframe):
+        rows = self._fetchall("SELECT bins, last_bar_ts, levels_json FROM app_sg_vpvr WHERE isin = ? AND timeframe = ?", [isin, timeframe])
+        return rows[0] if rows else None
+
+    async def save_vpvr(self, rows):
+        self._upsert_frame('app_sg_vpvr', VPVR_COLUMNS, VPVR_KEY_COLUMNS, rows)
+
+    async def close(self):
+        self.con.close()
+
+
+def as_storage(pool, datamart_pool=None):
+    """Accepts either a Storage or raw aiomysql pools (legacy call sites)."""
+    if isinstance(pool, Storage):
+        return pool
+    return MySQLStorage(pool, datamart_pool)
+
+
+async def mirror(source, target, profile_ids=('swing', 'intraday'), timeframes=('1d', '5m'), days=1095):
+    """
+    Copies universe, settings and recent OHLCV from one storage into another.
+    Typical use: snapshot MySQL into an EmbeddedStorage file for offline runs.
+    """
+    symbol_map = await source.get_symbol_map(active_only=False)
+    active = {}
+    favourites = []
+    for dim in (1, 2):
+        for c in await source.get_active_universe(dim):
+            active[c['isin']] = c
+            if c['dim_favourites'] == dim:
+                favourites.append((c['isin'], c['symbol'], dim))
+    target._executemany(
+        "INSERT OR REPLACE INTO vw_e_bs_companies_all VALUES (?, ?, ?, ?)",
+        [(isin, sym, 'Active' if isin in active else 'Inactive', (active.get(isin) or {}).get('exchange'))
+         for isin, sym in symbol_map.items()]
+    )
+    # Keyless tables: replace their contents so a repeated mirror neither duplicates nor keeps stale rows
+    target.con.execute("DELETE FROM vw_e_bs_companies_favourite_indices")
+    target.con.execute("DELETE FROM tb_app_sf_holdings")
+    target._executemany("INSERT INTO vw_e_bs_companies_favourite_indices VALUES (?, ?, ?)", favourites)
+    target._executemany("INSERT INTO tb_app_sf_holdings VALUES (?, ?)",
+                        [(isin, symbol_map.get(isin)) for isin in await source.get_holdings_isins()])
+
+    fund_cols = ('bs_ISIN', 'bs_SecurityId', 'bs_Sector', 'bs_IndustryNew', 'bs_IGroup', 'bs_ISubGroup',
+                 'bs_PE', 'bs_PB', 'bs_ROE', 'bs_EPS', 'bs_OPM', 'bs_NPM')
+    target._executemany(
+        f"INSERT OR REPLACE INTO e_bs_header_info_bse ({', '.join(fund_cols)}) VALUES ({', '.join(['?'] * len(fund_cols))})",
+        [tuple(r.get(c) for c in fund_cols) for r in (await source.get_fundamentals()).values()]
+    )
+
+    for profile_id in profile_ids:
+        target._executemany(
+            "INSERT OR REPLACE INTO app_sg_indicator_settings VALUES (?, ?, ?, ?)",
+            [(profile_id, r['indicator_key'], bool(r['is_enabled']), r['params_json'])
+             for r in await source.get_settings_rows(profile_id)]
+        )
+
+    start = datetime.now() - timedelta(days=days)
+    end = datetime.now() + timedelta(days=1)
+    for tf in timeframes:
+        isins = sorted(await source.get_ohlcv_isins(tf))
+        for i in range(0, len(isins), Config.OHLCV_BATCH_SIZE):
+            chunk = isins[i:i + Config.OHLCV_BATCH_SIZE]
+            matrix = await source.fetch_ohlcv_matrix(chunk, tf, start=start, end=end)
+            rows = []
+            for isin, arrays in split_by_isin(matrix, chunk).items():
+                rows.extend(
+                    (isin, tf, ts, o, h, l, c, int(v))
+                    for ts, o, h, l, c, v in zip(pd.DatetimeIndex(arrays['timestamp']).to_pydatetime(),
+                                                 arrays['open'].tolist(), arrays['high'].tolist(), arrays['low'].tolist(),
+                                                 arrays['close'].tolist(), np.nan_to_num(arrays['volume']).tolist())
+                )
+            await target.upsert_ohlcv(rows)
+        logging.info(f"Mirrored {len(isins)} ISINs for timeframe {tf}.")
@@ -0,0 +1,131 @@
+import json
+import numpy as np
+import pandas as pd
+from config import Config
+from lookback import MINUTES, SESSION_BARS
+from ohlcv_loader import iter_latest_bars
+
+# Time-of-day volume baseline.
+# Intraday volume is U-shaped: against a rolling mean the opening and closing bars always look
+# like spikes and mid-day bars never do. app_sg_tod_volume keeps, per ISIN, the median volume
+# of each 5m session slot (09:15 ... 15:25) over the last TOD_VOLUME_SESSIONS completed
+# sessions. A session still in progress is left out ("forming"), and an ISIN is recomputed only
+# once a session has completed since its row was written: a lookup mid-session reads the stored
+# row only. Revised bars of past sessions are picked up at the next recompute. Intraday signals
+# divide a bar's volume by the summed baselines of the 5m slots it covers, up to the last 5m
+# bar for a forming bar. Prefix sums make that O(1) per bar. Bars touching a slot with fewer
+# than TOD_VOLUME_MIN_SESSIONS samples keep the rolling VOLUME period ratio.
+
+SESSION_OPEN = 9 * 60 + 15  # minutes after midnight of the first 5m slot
+
+def slots(ts):
+    """Session slot (0 ... SESSION_BARS - 1) of each timestamp, -1 outside the session."""
+    ts = pd.DatetimeIndex(ts)
+    slot = ((ts.hour * 60 + ts.minute - SESSION_OPEN) // 5).to_numpy()
+    return np.where((slot >= 0) & (slot < SESSION_BARS), slot, -1)
+
+def _complete(last_ts):
+    return slots([last_ts])[0] == SESSION_BARS - 1
+
+def session_profile(ts, volume, include_last):
+    """(median volume per slot, sessions used, last session used) over the latest sessions of 5m bars."""
+    days = ts.astype('datetime64[D]')
+    sessions = np.unique(days)
+    if not include_last:
+        sessions = sessions[:-1]
+    sessions = sessions[-Config.TOD_VOLUME_SESSIONS:]
+    profile = np.full(SESSION_BARS, np.nan)
+    if not len(sessions):
+        return profile, 0, None
+    grid = np.full((len(sessions), SESSION_BARS), np.nan)
+    row = np.searchsorted(sessions, days)
+    slot = slots(ts)
+    ok = (row < len(sessions)) & (slot >= 0)
+    ok[ok] = sessions[row[ok]] == days[ok]
+    grid[row[ok], slot[ok]] = volume[ok]
+    enough = np.isfinite(grid).sum(axis=0) >= max(1, Config.TOD_VOLUME_MIN_SESSIONS)
+    if enough.any():
+        profile[enough] = np.nanmedian(grid[:, enough], axis=0)
+    return profile, len(sessions), pd.Timestamp(sessions[-1]).date()
+
+def _stale(row, last_ts):
+    if row is None:
+        return True
+    if last_ts is None:
+        return False
+    last_ts = pd.Timestamp(last_ts)
+    day = last_ts.date()
+    if row['through'] is not None and day <= pd.Timestamp(row['through']).date():
+        return False
+    # A newer session exists: only the forming session seen last time, still open, keeps the row
+    forming = row['forming']
+    return forming is None or pd.Timestamp(forming).date() != day or _complete(last_ts)
+
+def _parse(slots_json):
+    return np.array([np.nan if v is None else v for v in json.loads(slots_json)], dtype=float)
+
+async def refresh(storage, isins):
+    """Recomputes and stores the baselines of `isins`. Returns {isin: per-slot array}."""
+    computed_at = await storage.get_db_time()
+    rows, out = [], {}
+    async for isin, bars in iter_latest_bars(storage, isins, '5m', (Config.TOD_VOLUME_SESSIONS + 1) * SESSION_BARS):
+        ts = bars['timestamp']
+        if not len(ts):
+            continue
+        complete = _complete(ts[-1])
+        profile, sessions, through = session_profile(ts, bars['volume'].astype(float), complete)
+        forming = None if complete else pd.Timestamp(ts[-1]).date()
+        rows.append((isin, sessions, through, forming,
+                     json.dumps([None if np.isnan(v) else float(v) for v in profile]), computed_at))
+        out[isin] = profile
+    await storage.save_tod_volume(rows)
+    return out
+
+async def tod_profiles(storage, isins):
+    """
+    Per-slot baselines ({isin: array of SESSION_BARS medians, NaN = too few samples}),
+    refreshing ISINs with a newly completed session first. Empty when TOD_VOLUME_SESSIONS is 0.
+    """
+    isins = list(isins)
+    if Config.TOD_VOLUME_SESSIONS <= 0 or not isins:
+        return {}
+    stored = await storage.get_tod_volume(isins)
+    last_bars = await storage.get_latest_timestamps(isins, '5m')
+    stale = [isin for isin in isins if _stale(stored.get(isin), last_bars.get(isin))]
+    out = {isin: _parse(row['slots_json']) for isin, row in stored.items()}
+    if stale:
+        out.update(await refresh(storage, stale))
+    return out
+
+def expected_volume(starts, timeframe, last_ts, profile):
+    """
+    Baseline volume of intraday bars starting at `starts`: the summed slot baselines of the 5m
+    slots each bar covers (for the bar holding `last_ts`, up to that 5m bar). NaN where a bar
+    lies outside the session or touches a slot without a baseline.
+    """
+    first = slots(starts)
+    last = np.minimum(first + MINUTES[timeframe] // 5 - 1, SESSION_BARS - 1)
+    last_ts = pd.Timestamp(last_ts)
+    last_slot = slots([last_ts])[0]
+    if last_slot >= 0:
+        same_day = pd.DatetimeIndex(starts).normalize() == last_ts.normalize()
+        last = np.where(same_day, np.minimum(last, last_slot), last)
+    gaps = np.concatenate([[0], np.cumsum(np.isnan(profile))])
+    total = np.concatenate([[0.0], np.cumsum(np.nan_to_num(profile))])
+    ok = (first >= 0) & (last >= first)
+    first, last = np.where(ok, first, 0), np.where(ok, last, 0)
+    expected = total[last + 1] - total[first]
+    return np.where(ok & (gaps[last + 1] == gaps[first]) & (expected > 0), expected, np.nan)
+
+def apply_baseline(latest, df, profile, last_ts, settings, timeframe):
+    """`latest` with vol_ratio / vol_signal against the time-of-day baseline (as is without one)."""
+    if profile is None or latest is None or not settings.get('VOLUME', {}).get('enabled'):
+        return latest
+    expected = expected_volume(df['timestamp'].iloc[-1:], timeframe, last_ts, profile)[0]
+    if not np.isfinite(expected):
+        return latest
+    o, c, v = (float(df[f].iloc[-1]) for f in ('open', 'close', 'volume'))
+    vol_ratio = v / expected
+    spike = vol_ratio > settings['VOLUME']['threshold']
+    vol_signal = 'BULL_SPIKE' if spike and c > o else ('BEAR_SPIKE' if spike and c < o else 'NORMAL')
+    return {**latest, 'vol_ratio': vol_ratio, 'vol_signal': vol_signal}
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import logging
+from config import Config
+from settings_cache import FrozenDict
+from storage import MySQLStorage
+
+# Shared universe snapshot.
+# The company list, favourite sets, portfolio holdings and fundamentals are loaded together
+# (concurrently, across the App DB and Datamart) into one read-only UniverseSnapshot that the
+# engine, the fetchers, the signals API and the chat tools all read from. A snapshot is reused
+# for UNIVERSE_TTL seconds, or until invalidate() / get(refresh=True) is called.
+
+class UniverseSnapshot:
+    """Read-only view of the universe at load time."""
+
+    def __init__(self, companies, favourite_rows, holdings, fundamentals):
+        companies = [FrozenDict(isin=c['isin'], symbol=c['symbol'], exchange=c.get('exchange'), is_active=bool(c['is_active']))
+                     for c in companies if c['isin']]
+        favourites = {1: set(), 2: set()}
+        for f in favourite_rows:
+            favourites.setdefault(f['dim_favourites'], set()).add(f['symbol'])
+
+        set_ = object.__setattr__
+        set_(self, 'loaded_at', time.time())
+        set_(self, 'companies', tuple(companies))
+        set_(self, 'favourites', FrozenDict({dim: frozenset(s) for dim, s in favourites.items()}))
+        set_(self, 'holdings', frozenset(holdings))
+        set_(self, 'fundamentals', FrozenDict({isin: FrozenDict(row) for isin, row in fundamentals.items()}))
+        set_(self, '_symbols', FrozenDict({c['isin']: c['symbol'] for c in companies}))
+        set_(self, '_active_symbols', FrozenDict({c['isin']: c['symbol'] for c in companies if c['is_active']}))
+        isin_by_symbol = {}
+        for c in companies:
+            isin_by_symbol.setdefault(c['symbol'], c['isin'])
+        set_(self, '_isin_by_symbol', FrozenDict(isin_by_symbol))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UniverseSnapshot is read-only")
+
+    def symbol_map(self, active_only=True):
+        """{isin: symbol} for active (or all) companies."""
+        return self._active_symbols if active_only else self._symbols
+
+    def isin_for_symbol(self, symbol):
+        return self._isin_by_symbol.get(symbol)
+
+    def target_companies(self, profile_id):
+        """
+        Active companies a profile works on:
+        Intraday: Only Predefined Favorites
+        Swing: Predefined Favorites OR Holdings
+        All: either profile's favourites OR Holdings
+        """
+        intraday_favs = self.favourites.get(1, frozenset())
+        swing_favs = self.favourites.get(2, frozenset())
+        targets = []
+        for c in self.companies:
+            if not c['is_active']:
+                continue
+            is_holding = c['isin'] in self.holdings
+            if profile_id == 'intraday':
+                is_fav = c['symbol'] in intraday_favs
+                include = is_fav
+            elif profile_id == 'all':
+                is_fav = c['symbol'] in intraday_favs or c['symbol'] in swing_favs
+                include = is_fav or is_holding
+            else:
+                is_fav = c['symbol'] in swing_favs
+                include = is_fav or is_holding
+            if include:
+                targets.append(FrozenDict(c, is_fav=is_fav, is_holding=is_holding))
+        return targets
+
+async def load_snapshot(storage):
+    """Loads every part of a snapshot concurrently. Holdings/fundamentals failures degrade to empty."""
+    async def optional(coro, what, default):
+        try:
+            return await coro
+        except Exception as e:
+            logging.warning(f"Universe snapshot: failed to load {what}: {e}")
+            return default
+
+    start = time.perf_counter()
+    companies, favourite_rows, holdings, fundamentals = await asyncio.gather(
+        storage.get_companies(),
+        storage.get_favourite_rows(),
+        optional(storage.get_holdings_isins(), 'holdings', set()),
+        optional(storage.get_fundamentals(), 'fundamentals', {}),
+    )
+    snapshot = UniverseSnapshot(companies, favourite_rows, holdings, fundamentals)
+    logging.info(f"Universe snapshot loaded in {time.perf_counter() - start:.2f}s "
+                 f"({len(snapshot.companies)} companies, {len(snapshot.holdings)} holdings, {len(snapshot.fundamentals)} fundamentals).")
+    return snapshot
+
+class UniverseService:
+    def __init__(self, ttl=None):
+        self.ttl = Config.UNIVERSE_TTL if ttl is None else ttl
+        self._snapshots = {}  # storage.source_key -> (monotonic load time, snapshot)
+        self._pending = {}    # storage.source_key -> in-flight load task
+
+    async def get(self, storage=None, refresh=False):
+        """
+        Current snapshot for the storage's database. Without a storage, a MySQL
+        connection is opened only if the cached snapshot needs (re)loading.
+        """
+        key = storage.source_key if storage is not None else MySQLStorage.source_key
+        entry = self._snapshots.get(key)
+        if not refresh and entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        # Concurrent callers share one load
+        task = self._pending.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(self._load(key, storage))
+            self._pending[key] = task
+        return await task
+
+    async def _load(self, key, storage):
+        owned = storage is None
+        if owned:
+            storage = await MySQLStorage.connect()
+        try:
+            snapshot = await load_snapshot(storage)
+        finally:
+            if owned:
+                await storage.close()
+        self._snapshots[key] = (time.monotonic(), snapshot)
+        return snapshot
+
+    def invalidate(self):
+        """Change signal: the next get() reloads."""
+        self._snapshots.clear()
+
+universe = UniverseService()
@@ -0,0 +1,99 @@
+import json
+import numpy as np
+from config import Config
+
+# Volume profile (VPVR).
+# Volume is bucketed by close price into equal-width bins spanning the window's lowest low
+# to highest high, in a single searchsorted + bincount pass. The calc run stores each
+# ISIN/timeframe profile in app_sg_vpvr together with the profile of the window's closed
+# bars, so the next run only adds the bars that entered the window and subtracts the ones
+# that left it. The forming (last) bar is always added on top without being stored.
+
+VPVR_VERSION = 1
+
+def bin_volumes(close, volume, lo, hi, bins):
+    """Volume per bin; bin i covers closes in [lo + i*size, lo + i*size + size)."""
+    close = np.asarray(close, dtype=float)
+    volume = np.nan_to_num(np.asarray(volume, dtype=float))
+    size = (hi - lo) / bins
+    starts = lo + np.arange(bins) * size
+    idx = np.searchsorted(starts, close, side='right') - 1
+    ok = (idx >= 0) & (close < starts[np.clip(idx, 0, bins - 1)] + size)
+    return np.bincount(idx[ok], weights=volume[ok], minlength=bins)
+
+def profile_levels(lo, hi, volumes):
+    """[{price, volume}] rows as charts draw them (price = bin start)."""
+    size = (hi - lo) / len(volumes)
+    return [{"price": float(np.round(lo + i * size, 2)), "volume": float(v)} for i, v in enumerate(volumes)]
+
+def volume_profile(high, low, close, volume, bins=None):
+    """Profile of the given bars in one pass. Returns [] when the bars have no price range."""
+    bins = bins or Config.VPVR_BINS
+    if len(close) == 0:
+        return []
+    lo, hi = np.nanmin(low), np.nanmax(high)
+    if not hi > lo:
+        return []
+    return profile_levels(lo, hi, bin_volumes(close, volume, lo, hi, bins))
+
+def frame_profile(df, bins=None, lookback=None):
+    """volume_profile() over the last `lookback` bars of an OHLCV DataFrame (0 = all)."""
+    lookback = Config.VPVR_LOOKBACK if lookback is None else lookback
+    if lookback:
+        df = df.tail(lookback)
+    return volume_profile(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy(), df['volume'].to_numpy(), bins)
+
+def advance_profile(ts, high, low, close, volume, blob=None, bins=None, lookback=None):
+    """
+    Profile of the last `lookback` bars (0 = all), reusing the closed-bar profile in `blob`
+    when its window still lines up with these bars (same price range, last closed bar
+    unchanged, dropped bars still present and complete).
+    Returns (levels, new_blob, recomputed); new_blob is None when there is nothing to keep.
+    """
+    bins = bins or Config.VPVR_BINS
+    lookback = Config.VPVR_LOOKBACK if lookback is None else lookback
+    ts, high, low, close, volume = (np.asarray(x) for x in (ts, high, low, close, volume))
+    n = len(close)
+    start = max(0, n - lookback) if lookback else 0
+    end = n - 1  # closed bars are [start, end); the bar at `end` is still forming
+    if end - start < 1:
+        return volume_profile(high[start:], low[start:], close[start:], volume[start:], bins), None, True
+
+    lo_c, hi_c = float(np.nanmin(low[start:end])), float(np.nanmax(high[start:end]))
+    state = json.loads(blob) if blob else None
+    closed = None
+    if (state and state['v'] == VPVR_VERSION and state['bins'] == bins and state['lookback'] == lookback
+            and state['lo'] == lo_c and state['hi'] == hi_c and hi_c > lo_c):
+        last = np.flatnonzero(ts == np.datetime64(state['last_ts'], 'ns'))
+        first = np.flatnonzero(ts == np.datetime64(state['first_ts'], 'ns'))
+        if (len(last) and len(first) and first[0] >= 1 and first[0] <= start and last[0] < end
+                and close[last[0]] == state['last_close'] and volume[last[0]] == state['last_volume']):
+            p, q = last[0], first[0]
+            closed = (np.asarray(state['vol'])
+                      + bin_volumes(close[p + 1:end], volume[p + 1:end], lo_c, hi_c, bins)
+                      - bin_volumes(close[q:start], volume[q:start], lo_c, hi_c, bins))
+    recomputed = closed is None
+    if recomputed and hi_c > lo_c:
+        closed = bin_volumes(close[start:end], volume[start:end], lo_c, hi_c, bins)
+
+    new_blob = None
+    if closed is not None:
+        new_blob = json.dumps({
+            'v': VPVR_VERSION, 'bins': bins, 'lookback': lookback, 'lo': lo_c, 'hi': hi_c,
+            'first_ts': str(ts[start]), 'last_ts': str(ts[end - 1]),
+            'last_close': float(close[end - 1]), 'last_volume': float(volume[end - 1]),
+            'vol': closed.tolist()
+        })
+
+    # Forming bar on top; if it stretches the price range the whole window is re-binned
+    lo, hi = min(lo_c, float(low[end])), max(hi_c, float(high[end]))
+    if closed is not None and lo == lo_c and hi == hi_c:
+        levels = profile_levels(lo, hi, closed + bin_volumes(close[end:], volume[end:], lo, hi, bins))
+    else:
+        levels = volume_profile(high[start:], low[start:], close[start:], volume[start:], bins)
+    return levels, new_blob, recomputed
+
+def frame_advance(df, blob=None):
+    """advance_profile() over an OHLCV DataFrame."""
+    return advance_profile(df['timestamp'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy(),
+                           df['close'].to_numpy(), df['volume'].to_numpy(), blob)